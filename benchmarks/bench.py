@@ -0,0 +1,625 @@
+"""Бенчмарк основных операций окна задач на синтетических базах.
+
+Запуск из корня репозитория:
+    python benchmarks/bench.py                      # 1k и 100k строк, сравнение с baseline.json
+    python benchmarks/bench.py --sizes 1000000      # 1M строк (первая генерация базы - до получаса)
+    python benchmarks/bench.py --save-baseline      # записать результаты как новый baseline
+
+Базы генерируются один раз (с фиксированным seed) и кэшируются в benchmarks/data/,
+каждый прогон работает с копией. Операции выполняются через настоящий SecondWindow
+(QT_QPA_PLATFORM=offscreen): время считается от вызова до прихода результата из
+потока БД. Для каждой операции выводятся перцентили задержки и пиковый прирост
+RSS процесса (на Linux через сброс VmHWM). Код возврата 1 - есть регрессия
+относительно baseline сверх порогов из того же файла.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import gc
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'code'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import Qt, QEventLoop, QTimer
+from PyQt6.QtWidgets import QApplication, QMessageBox
+import exporter
+import morphology
+import trend_view
+from task_store import TaskStore, PRIORITIES, archive_path
+from dates import today_day
+
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_SIZES = [1000, 100000]
+DEFAULT_THRESHOLDS = {
+    # Регрессия: p95 больше baseline в latency_ratio раз и больше чем на latency_slack_ms
+    "latency_ratio": 1.5,
+    "latency_slack_ms": 5.0,
+    "memory_ratio": 1.5,
+    "memory_slack_mb": 10.0,
+}
+TIMEOUT = 600
+
+WORDS = ("отчёт квартальный бюджет встреча клиент договор презентация звонок письмо счёт оплата "
+         "ремонт покупка продукты молоко хлеб врач анализы школа домашнее задание проект релиз "
+         "тесты сервер база данных резервная копия обновление документы паспорт налог декларация "
+         "аренда квартира машина страховка подарок день рождения отпуск билеты гостиница "
+         "тренировка бассейн книга курс экзамен собеседование резюме код ревью баг исправление "
+         "дизайн макет сайт реклама склад поставка инвентаризация совещание план").split()
+RARE_WORD = "инвентаризация"
+# Сколько задач меняет массовое действие
+BULK_SIZE = 5000
+# Повторяющиеся задачи для вкладки «Повторяющиеся»: ежедневные серии на десять лет
+SERIES_COUNT = 200
+
+
+# Генерация баз
+
+def random_text(rnd, lo, hi):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(lo, hi)))
+
+
+def random_task(rnd, today):
+    """Задача с правдоподобным распределением статусов, приоритетов и дат"""
+    until = today + rnd.randint(-400, 120) if rnd.random() < 0.85 else None
+    alert = None
+    if until is None or until >= today:
+        status = rnd.choices(['Не начата', 'В работе', 'Выполнена'], [40, 50, 10])[0]
+        if until is not None and rnd.random() < 0.4:
+            alert = max(today, until - rnd.randint(0, 7))
+    else:
+        # Прошедшие дедлайны приложение уже обработало
+        status = rnd.choices(['Выполнена', 'Отменена', 'Просрочена'], [55, 5, 40])[0]
+    priority = rnd.choices(PRIORITIES, [30, 50, 20])[0]
+    return random_text(rnd, 2, 4), random_text(rnd, 5, 15), until, alert, status, priority
+
+
+def generate(path, size, seed=0):
+    """Синтетическая tasks.db на size задач"""
+    rnd = random.Random(seed)
+    today = today_day()
+    store = TaskStore(path, durability='OFF')
+    # Большой кэш страниц: иначе вставка пачками упирается в вытеснение страниц FTS и индексов
+    store.conn.execute("PRAGMA cache_size=-262144")
+    try:
+        left = size
+        while left:
+            batch = [random_task(rnd, today) for _ in range(min(left, 50000))]
+            with store.transaction():
+                store.add_many(batch)
+            left -= len(batch)
+        # Леммы для поиска по словоформам - как у базы, где фоновая лемматизация уже прошла
+        morphology.backfill(store)
+        # Журнал изменений - как у базы после обслуживания, а не на всю вставку
+        store.trim_changes()
+        store.conn.execute("ANALYZE")
+        store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        store.close()
+    # Пустой архив, созданный при открытии; при замерах он создаётся рядом с копией базы
+    os.remove(archive_path(path))
+
+
+def dataset(size, seed):
+    """Путь к закэшированной базе на size задач, генерирует её при необходимости.
+
+    Даты в базе отсчитываются от дня генерации, поэтому кэш действует один день.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"tasks-{size}-{seed}-{today_day()}.db")
+    if not os.path.exists(path):
+        for name in os.listdir(DATA_DIR):
+            if name.startswith(f"tasks-{size}-{seed}-"):
+                os.remove(os.path.join(DATA_DIR, name))
+        print(f"генерация базы на {size} задач...", file=sys.stderr, flush=True)
+        started = time.perf_counter()
+        generate(path + '.tmp', size, seed)
+        os.replace(path + '.tmp', path)
+        print(f"готово за {time.perf_counter() - started:.1f} с", file=sys.stderr, flush=True)
+    return path
+
+
+# Измерения
+
+def rss_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak():
+    """Сброс пикового RSS (VmHWM); без /proc пик считается от начала процесса"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def wait_until(app, done):
+    """Обработка событий Qt, пока done() не станет истинным"""
+    deadline = time.perf_counter() + TIMEOUT
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("операция не завершилась")
+        app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class Bench:
+    """Окно задач поверх копии базы и набор измеряемых операций"""
+
+    def __init__(self, app, db_path):
+        from second_window import SecondWindow
+        self.app = app
+        self.db_path = db_path
+        self.window_class = SecondWindow
+        self.w = None
+        self.calls = []
+
+    def idle(self):
+        return not self.w.model.loading and not self.w.db.callbacks
+
+    def settle(self):
+        # Сначала отложенная до возврата в цикл событий работа (например, подгрузка соседних диапазонов)
+        self.app.processEvents()
+        # Затем ответы на запросы и фоновые шаги (Database.submit_batches): шаги ждут паузы в работе
+        # с окном и не должны начаться во время замера
+        wait_until(self.app, lambda: self.idle() and not self.w.db.waiting_batches)
+        # Перерисовка после подготовки ждёт таймер платформы (около 5 мс) и иначе попала бы в замер
+        self.w.repaint()
+
+    def track(self, obj, name):
+        """Подмена метода-обработчика, чтобы знать, когда пришёл результат"""
+        original = getattr(obj, name)
+
+        def wrapper(*args):
+            original(*args)
+            self.calls.append(name)
+        setattr(obj, name, wrapper)
+
+    def create(self):
+        self.w = self.window_class(db_path=self.db_path)
+        for name in ('show_stats', 'on_bulk_done', 'show_occurrences'):
+            self.track(self.w, name)
+        for name in ('on_due_checked', 'on_scheduled_events', 'on_task_saved', 'on_compacted'):
+            self.track(self.w.reminders, name)
+        self.track(self.w.calendar, 'show_cells')
+        self.track(self.w.trends, 'show_history')
+
+    def open(self):
+        """Окно с завершённым фоновым обслуживанием и снимком (Reminders.maintain): замеры не делят с ними БД"""
+        self.create()
+        wait_until(self.app, lambda: 'on_compacted' in self.calls and self.w.reminders.backup_job is None)
+        self.settle()
+
+    def close(self):
+        self.w.shutdown()
+        self.w.deleteLater()
+        self.w = None
+        self.app.processEvents()
+
+    def called(self, name):
+        return lambda: name in self.calls and self.idle()
+
+    def reset_filters(self):
+        """Все задачи без фильтров и поиска; список перезагружается"""
+        self.w.filter_status.setCurrentText("Все")
+        self.w.filter_priority.setCurrentText("Все")
+        self.w.search_bar.clear()
+        self.w.search_morph.setChecked(False)
+        self.w.search_archive.setChecked(False)
+        self.w.search_timer.stop()
+        self.w.load_tasks()
+        self.settle()
+
+    # Операции: (подготовка без замера, действие, условие завершения)
+
+    def op_startup(self):
+        def setup():
+            if self.w is not None:
+                self.close()
+        return setup, self.create, lambda: self.w is not None and self.idle()
+
+    def op_load_tasks(self):
+        return self.settle, self.w.load_tasks, self.idle
+
+    def op_fetch_more(self):
+        def setup():
+            if not self.w.model.canFetchMore():
+                self.w.load_tasks()
+                self.settle()
+        return setup, self.w.model.fetchMore, self.idle
+
+    def op_sort(self, column, order):
+        def setup():
+            self.reset_filters()
+            self.w.table.sortByColumn(-1, Qt.SortOrder.AscendingOrder)
+            self.settle()
+        return setup, lambda: self.w.table.sortByColumn(column, order), self.idle
+
+    def op_fetch_more_sorted(self):
+        def setup():
+            if self.w.model.sort_field != 'until' or not self.w.model.canFetchMore():
+                self.reset_filters()
+                self.w.table.sortByColumn(2, Qt.SortOrder.DescendingOrder)
+                self.settle()
+
+        def action():
+            self.w.model.fetchMore()
+        return setup, action, self.idle
+
+    def op_filter_status(self):
+        def setup():
+            self.w.filter_status.setCurrentText("Все")
+            self.settle()
+        return setup, lambda: self.w.filter_status.setCurrentText("Выполнена"), self.idle
+
+    def op_filter_status_priority(self):
+        def setup():
+            self.w.filter_status.setCurrentText("Все")
+            self.w.filter_priority.setCurrentText("Все")
+            self.settle()
+
+        def action():
+            self.w.filter_priority.setCurrentText("Высокий")
+            self.w.filter_status.setCurrentText("В работе")
+        return setup, action, self.idle
+
+    def op_filter_sorted(self):
+        """Смена фильтров в списке, отсортированном по дедлайну"""
+        def setup():
+            self.reset_filters()
+            if self.w.model.sort_field != 'until':
+                self.w.table.sortByColumn(2, Qt.SortOrder.AscendingOrder)
+                self.settle()
+
+        def action():
+            self.w.filter_priority.setCurrentText("Высокий")
+            self.w.filter_status.setCurrentText("В работе")
+        return setup, action, self.idle
+
+    def op_search(self, text, morph=False, archive=False):
+        def action():
+            for box, checked in ((self.w.search_morph, morph), (self.w.search_archive, archive)):
+                box.blockSignals(True)
+                box.setChecked(checked)
+                box.blockSignals(False)
+            self.w.search_bar.setText(text)
+            # Без задержки ввода: замеряется сам запрос
+            self.w.search_timer.stop()
+            self.w.load_tasks()
+        return self.reset_filters, action, self.idle
+
+    def op_update_stats(self):
+        def setup():
+            if not self.w.isVisible():
+                self.w.show()
+            self.w.tabs.setCurrentWidget(self.w.tab_stats)
+            self.settle()
+            self.calls.clear()
+        return setup, self.w.update_stats, self.called('show_stats')
+
+    def op_check_until_alert_date(self):
+        def setup():
+            self.settle()
+            self.calls.clear()
+        return setup, self.w.reminders.check_until_alert_date, self.called('on_due_checked')
+
+    def op_schedule_all(self):
+        def setup():
+            self.settle()
+            self.calls.clear()
+        return setup, self.w.reminders.schedule_all, self.called('on_scheduled_events')
+
+    def op_add_task(self):
+        def setup():
+            self.settle()
+            self.calls.clear()
+
+        def action():
+            self.w.add_row("бенчмарк", "новая задача", "", "", "В работе", "Средний")
+        return setup, action, self.called('on_task_saved')
+
+    def op_edit_task(self):
+        """Изменение задачи из середины загруженного списка: строка переезжает в другое место"""
+        state = {"n": 0}
+
+        def setup():
+            self.reset_filters()
+            self.w.table.sortByColumn(0, Qt.SortOrder.AscendingOrder)
+            self.settle()
+            self.calls.clear()
+
+        def action():
+            state["n"] += 1
+            task_id = self.w.model.task_at(len(self.w.model.rows) // 2)[0]
+            self.w.save_task(task_id, f"бенчмарк {state['n']}", "изменённая задача", "", "",
+                             "В работе", "Средний")
+        return setup, action, self.called('on_task_saved')
+
+    def op_bulk_status(self):
+        """Смена статуса BULK_SIZE задач одной транзакцией до обновления списка"""
+        statuses = ["Выполнена", "В работе"]
+
+        def setup():
+            self.reset_filters()
+            self.calls.clear()
+
+        def action():
+            statuses.reverse()
+            ids = list(range(1, BULK_SIZE + 1))
+            self.w.run_bulk("бенчмарк", TaskStore.bulk_edit, ids, statuses[0])
+        return setup, action, lambda: 'on_bulk_done' in self.calls and not self.w.model.loading
+
+    def op_series_window(self):
+        """Повторения SERIES_COUNT десятилетних ежедневных серий за видимые дни вкладки"""
+        def setup():
+            store = TaskStore(self.db_path)
+            if not store.all_series():
+                with store.transaction():
+                    for i in range(SERIES_COUNT):
+                        store.add_series(f"серия {i}", "повтор", "2020-01-01", "daily", 1 + i % 3, "2030-01-01",
+                                         None, 1, PRIORITIES[i % 3])
+            store.close()
+            if not self.w.isVisible():
+                self.w.show()
+            self.w.tabs.setCurrentWidget(self.w.tab_series)
+            self.settle()
+            self.calls.clear()
+        return setup, self.w.load_series, self.called('show_occurrences')
+
+    def op_calendar_month(self, cached):
+        """Переход на следующий месяц календаря: cached - соседний месяц уже подгружен заранее"""
+        calendar = self.w.calendar
+
+        def setup():
+            if not self.w.isVisible():
+                self.w.show()
+            self.w.tabs.setCurrentWidget(calendar)
+            # Подгрузка соседей после прошлого замера - до сброса кэша, а не после
+            self.settle()
+            if not cached:
+                calendar.loader.invalidate()
+            self.settle()
+            self.calls.clear()
+        return setup, lambda: calendar.move(1), lambda: 'show_cells' in self.calls
+
+    def op_stats_trends(self):
+        """Графики истории за год по сводке daily_stats (год сводки дописывается перед первым замером)"""
+        trends = self.w.trends
+
+        def setup():
+            store = TaskStore(self.db_path)
+            today = today_day()
+            if store.conn.execute("SELECT COUNT(*) FROM daily_stats").fetchone()[0] < 365:
+                rnd = random.Random(0)
+                with store.transaction():
+                    store.conn.executemany("""INSERT OR IGNORE INTO daily_stats (day, created, done, open_delta,
+                                                  overdue_delta) VALUES (?, ?, ?, ?, ?)""",
+                                           [(day, rnd.randint(0, 40), rnd.randint(0, 30), rnd.randint(-20, 20),
+                                             rnd.randint(-5, 5)) for day in range(today - 400, today)])
+            store.close()
+            if not self.w.isVisible():
+                self.w.show()
+            self.w.tabs.setCurrentWidget(self.w.tab_stats)
+            trends.period.setCurrentIndex(len(trend_view.PERIODS) - 1)
+            self.settle()
+            self.calls.clear()
+        return setup, trends.refresh, self.called('show_history')
+
+    def op_export_csv(self):
+        from db_worker import JobThread
+        path = os.path.join(os.path.dirname(self.db_path), 'export.csv')
+        result = []
+
+        def setup():
+            self.reset_filters()
+            result.clear()
+
+        def action():
+            job = JobThread(self.db_path, exporter.export_tasks, path, 'csv', self.w.model.spec, parent=self.w)
+            job.done.connect(result.append)
+            job.failed.connect(result.append)
+            job.finished.connect(job.deleteLater)
+            job.start()
+        return setup, action, lambda: bool(result)
+
+    def op_external_edit(self):
+        """Изменение первой задачи списка другим соединением (второй экземпляр приложения, cli.py):
+        от опроса журнала изменений до обновления строки"""
+        state = {"n": 0}
+
+        def setup():
+            self.reset_filters()
+            # Замеряется обновление строки списка; видимый календарь или графики перечитывались бы вместе с ней
+            self.w.tabs.setCurrentWidget(self.w.tab_tasks)
+            # Опрос по таймеру не должен успеть раньше замера; свои изменения журнала уже пропущены
+            self.w.reminders.changes_timer.stop()
+            self.w.reminders.poll_changes()
+            self.settle()
+            state["n"] += 1
+            store = TaskStore(self.db_path)
+            try:
+                store.update_task(self.w.model.task_at(0)[0], f"извне {state['n']}", "изменена другим соединением",
+                                  "", "", "В работе", "Средний")
+            finally:
+                store.close()
+            self.calls.clear()
+        return setup, self.w.reminders.poll_changes, self.called('on_task_saved')
+
+    def operations(self):
+        return [
+            ('startup', self.op_startup),
+            ('load_tasks', self.op_load_tasks),
+            ('fetch_more', self.op_fetch_more),
+            ('filter_status', self.op_filter_status),
+            ('filter_status_priority', self.op_filter_status_priority),
+            ('search_common', lambda: self.op_search("отчёт")),
+            ('search_rare', lambda: self.op_search(RARE_WORD + " бюджет")),
+            ('update_stats', self.op_update_stats),
+            ('check_until_alert_date', self.op_check_until_alert_date),
+            ('schedule_all', self.op_schedule_all),
+            ('add_task', self.op_add_task),
+            ('export_csv', self.op_export_csv),
+            # Сортировка в конце: остальные операции идут в исходном порядке, как в baseline
+            ('sort_priority_desc', lambda: self.op_sort(5, Qt.SortOrder.DescendingOrder)),
+            ('sort_until', lambda: self.op_sort(2, Qt.SortOrder.AscendingOrder)),
+            ('fetch_more_sorted', self.op_fetch_more_sorted),
+            ('edit_task', self.op_edit_task),
+            ('bulk_status', self.op_bulk_status),
+            ('series_window', self.op_series_window),
+            ('calendar_month', lambda: self.op_calendar_month(False)),
+            ('calendar_month_cached', lambda: self.op_calendar_month(True)),
+            ('search_morph_common', lambda: self.op_search("отчёты", morph=True)),
+            ('search_morph_rare', lambda: self.op_search(RARE_WORD + " бюджета", morph=True)),
+            ('search_archive', lambda: self.op_search("отчёт", archive=True)),
+            ('external_edit', self.op_external_edit),
+            ('stats_trends', self.op_stats_trends),
+            ('filter_sorted', self.op_filter_sorted),
+        ]
+
+    def measure(self, make_op, repeat):
+        """Один прогрев и repeat замеров операции"""
+        setup, action, done = make_op()
+        times = []
+        peak = 0
+        for i in range(repeat + 1):
+            setup()
+            reset_peak()
+            base = rss_kb('VmRSS')
+            # Сборщик мусора на время замера выключен, как в timeit: полная сборка (на этой машине
+            # 10-25 мс) запускается по числу накопленных объектов и попадала в случайный замер из 15.
+            # Сборки идут между замерами, в подготовке следующего
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                action()
+                wait_until(self.app, done)
+                elapsed = time.perf_counter() - started
+            finally:
+                gc.enable()
+            if i:
+                times.append(elapsed * 1000)
+                peak = max(peak, rss_kb('VmHWM') - base)
+        return {
+            "p50_ms": round(percentile(times, 50), 2),
+            "p95_ms": round(percentile(times, 95), 2),
+            "p99_ms": round(percentile(times, 99), 2),
+            "max_ms": round(max(times), 2),
+            "peak_rss_mb": round(peak / 1024, 1),
+        }
+
+
+def run_size(app, size, seed, repeat, only):
+    tmp = tempfile.mkdtemp(prefix='taskplanner-bench-')
+    db_path = os.path.join(tmp, 'tasks.db')
+    shutil.copy(dataset(size, seed), db_path)
+    bench = Bench(app, db_path)
+    results = {}
+    try:
+        bench.open()
+        for name, make_op in bench.operations():
+            if only and name not in only:
+                continue
+            results[name] = bench.measure(make_op, repeat)
+            print(f"{size:>9} {name:<24} p50 {results[name]['p50_ms']:>9.2f} мс  "
+                  f"p95 {results[name]['p95_ms']:>9.2f} мс  "
+                  f"пик RSS +{results[name]['peak_rss_mb']:.1f} МБ", file=sys.stderr, flush=True)
+    finally:
+        if bench.w is not None:
+            bench.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline):
+    """Список регрессий относительно baseline"""
+    limits = dict(DEFAULT_THRESHOLDS, **baseline.get("thresholds", {}))
+    problems = []
+    for size, ops in results.items():
+        for name, cur in ops.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            if cur["p95_ms"] > max(base["p95_ms"] * limits["latency_ratio"],
+                                   base["p95_ms"] + limits["latency_slack_ms"]):
+                problems.append(f"{size} {name}: p95 {cur['p95_ms']} мс, в baseline {base['p95_ms']} мс")
+            if cur["peak_rss_mb"] > max(base["peak_rss_mb"] * limits["memory_ratio"],
+                                        base["peak_rss_mb"] + limits["memory_slack_mb"]):
+                problems.append(f"{size} {name}: пик RSS +{cur['peak_rss_mb']} МБ, "
+                                f"в baseline +{base['peak_rss_mb']} МБ")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=15, help="замеров на операцию (плюс один прогрев)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="только указанные операции")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="записать результаты в baseline")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Напоминания о задачах не должны останавливать замеры модальными окнами
+    QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+    QMessageBox.warning = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+    # Страховочный таймер: ожидание событий просыпается хотя бы раз в 100 мс
+    wakeup = QTimer()
+    wakeup.timeout.connect(lambda: None)
+    wakeup.start(100)
+
+    results = {str(size): run_size(app, size, args.seed, args.repeat, args.only) for size in args.sizes}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        merged = dict(baseline.get("results", {}))
+        for size, ops in results.items():
+            # С --only перезаписываются только замеренные операции
+            merged[size] = dict(merged.get(size, {}), **ops)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"thresholds": baseline.get("thresholds", DEFAULT_THRESHOLDS), "results": merged},
+                      f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"baseline записан в {args.baseline}")
+        return 0
+
+    problems = compare(results, baseline)
+    for problem in problems:
+        print("РЕГРЕССИЯ:", problem)
+    if not baseline:
+        print("baseline не найден, сравнение пропущено")
+    elif not problems:
+        print("регрессий нет")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Замер холодного старта приложения: время до первого окна, память и разбивка импортов.
+
+Запуск из корня репозитория:
+    python benchmarks/startup.py                 # обычный запуск и запуск в трей
+    python benchmarks/startup.py --runs 5 --top 20
+
+Каждый прогон - отдельный процесс python -X importtime с QT_QPA_PLATFORM=offscreen.
+Время до первого окна считается от старта процесса до отрисовки формы ввода
+(в режиме трея - до готовности иконки). RSS снимается сразу после этого и ещё раз
+через --settle секунд, когда отработали отложенные загрузки.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'code')
+
+CHILD = r'''
+import os, sys, time, json
+started = time.perf_counter()
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+import main_window
+tray_only = sys.argv[1] == 'tray'
+w = main_window.MainWindow(tray_only=tray_only)
+if not tray_only:
+    w.show()
+app.processEvents()
+first_window = time.perf_counter() - started
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+result = {"first_window_ms": first_window * 1000, "rss_first_mb": rss_mb(),
+          "modules_first": len(sys.modules)}
+
+def finish():
+    result["rss_settled_mb"] = rss_mb()
+    result["second_window_built"] = w.w is not None
+    result["charts_imported"] = "PyQt6.QtCharts" in sys.modules
+    print(json.dumps(result), flush=True)
+    w.full_exit()
+
+QTimer.singleShot(int(float(sys.argv[2]) * 1000), finish)
+app.exec()
+'''
+
+
+def run_once(mode, settle, db_dir):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', TASKPLANNER_DB=os.path.join(db_dir, 'tasks.db'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, mode, str(settle)],
+                          cwd=CODE_DIR, env=env, capture_output=True, text=True, timeout=300)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(proc.stderr[-2000:])
+    return json.loads(lines[-1]), parse_importtime(proc.stderr)
+
+
+def parse_importtime(text):
+    """Суммарное время импорта модулей верхнего уровня (мс) из вывода -X importtime"""
+    totals = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Отступ в имени - вложенный импорт, его время уже учтено у родителя
+        if name.startswith('  '):
+            continue
+        name = name.strip()
+        totals[name] = totals.get(name, 0) + int(cumulative) / 1000
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['window', 'tray'], choices=['window', 'tray'])
+    parser.add_argument('--settle', type=float, default=3.0, help="секунд до второго замера памяти")
+    parser.add_argument('--top', type=int, default=15, help="сколько самых долгих импортов показать")
+    parser.add_argument('--json', help="сохранить результаты в файл")
+    args = parser.parse_args(argv)
+
+    import tempfile
+    report = {}
+    for mode in args.modes:
+        runs = []
+        imports = {}
+        with tempfile.TemporaryDirectory(prefix='taskplanner-startup-') as db_dir:
+            # Первый прогон создаёт базу и не учитывается
+            run_once(mode, 0.5, db_dir)
+            for _ in range(args.runs):
+                result, totals = run_once(mode, args.settle, db_dir)
+                runs.append(result)
+                for name, ms in totals.items():
+                    imports.setdefault(name, []).append(ms)
+        summary = {key: round(statistics.median(r[key] for r in runs), 1)
+                   for key in ('first_window_ms', 'rss_first_mb', 'rss_settled_mb', 'modules_first')}
+        summary["second_window_built"] = runs[-1]["second_window_built"]
+        summary["charts_imported"] = runs[-1]["charts_imported"]
+        summary["imports_ms"] = {name: round(statistics.median(v), 1) for name, v in
+                                 sorted(imports.items(), key=lambda item: -statistics.median(item[1]))}
+        report[mode] = summary
+
+        print(f"== {mode}: первое окно {summary['first_window_ms']} мс, "
+              f"RSS {summary['rss_first_mb']} МБ -> {summary['rss_settled_mb']} МБ через {args.settle} с, "
+              f"модулей {int(summary['modules_first'])}, окно задач: {summary['second_window_built']}, "
+              f"QtCharts: {summary['charts_imported']}")
+        for name, ms in list(summary["imports_ms"].items())[:args.top]:
+            print(f"   {ms:>8.1f} мс  {name}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
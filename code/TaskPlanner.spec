@@ -1,6 +1,6 @@
 # -*- mode: python ; coding: utf-8 -*-
 import os
-from PyInstaller.utils.hooks import collect_submodules
+from PyInstaller.utils.hooks import collect_data_files, copy_metadata
 
 # Текущая папка проекта
 project_dir = os.getcwd()
@@ -9,13 +9,17 @@ project_dir = os.getcwd()
 datas = [
     (os.path.join(project_dir, 'icon.ico'), '.')  # <-- DEST_DIR теперь относительный
 ]
+# Словари pymorphy3 для морфологического поиска: данные пакетов и метаданные,
+# по точкам входа которых pymorphy3 находит словарь русского языка
+datas += collect_data_files('pymorphy3') + collect_data_files('pymorphy3_dicts_ru')
+datas += copy_metadata('pymorphy3_dicts_ru')
 
 # Добавляем иконку если она есть
 icon_path = os.path.join(project_dir, 'icon.ico')
 
-# Добавляем все скрытые библиотеки и модули
-hiddenimports = collect_submodules('PyQt6')
-hiddenimports += ['PyQt6.QtCharts']
+# Только используемые модули Qt: collect_submodules('PyQt6') тянул в сборку все модули PyQt6.
+# QtCharts, exporter, importer и pymorphy3 импортируются внутри функций, поэтому указаны явно.
+hiddenimports = ['PyQt6.QtCharts', 'second_window', 'exporter', 'importer', 'pymorphy3', 'pymorphy3_dicts_ru']
 
 # Анализ проекта
 a = Analysis(
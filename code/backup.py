@@ -0,0 +1,188 @@
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from task_store import archive_path
+
+# Резервные копии: снимок tasks.db вместе с архивом делается backup API SQLite в фоновом потоке
+# (JobThread), по BACKUP_PAGES страниц за шаг. Все шаги читают одно и то же состояние базы - одну
+# транзакцию чтения, а в режиме WAL чтение не мешает записи: приложение работает как обычно.
+# Простая копия файла во время записи могла бы получиться рваной (часть страниц до записи, часть после).
+
+# Сколько последних снимков хранится; 0 - снимки по расписанию не делаются, старые не удаляются
+BACKUP_KEEP = int(os.environ.get('TASKPLANNER_BACKUP_KEEP', '7'))
+# Через сколько часов после последнего снимка обслуживание БД (при запуске и в полночь) делает новый
+BACKUP_EVERY_HOURS = 24
+# Сколько страниц копируется за шаг: между шагами проверяется отмена и обновляется прогресс
+BACKUP_PAGES = 1024
+STAMP = '%Y%m%d-%H%M%S'
+
+
+class Cancelled(Exception):
+    """Снимок отменён (бросается из функции прогресса backup API и прерывает копирование)"""
+
+
+def backup_dir(db_path):
+    """Папка снимков рядом с файлом БД"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+
+def snapshot_pattern(db_path):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return re.compile(re.escape(base) + r'-(\d{8}-\d{6})\.db$')
+
+
+def snapshots(db_path):
+    """Снимки базы db_path от новых к старым: список (время, путь); файл архива снимка - archive_path(путь)"""
+    directory = backup_dir(db_path)
+    if not os.path.isdir(directory):
+        return []
+    pattern = snapshot_pattern(db_path)
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append((datetime.strptime(match.group(1), STAMP), os.path.join(directory, name)))
+    return sorted(found, reverse=True)
+
+
+def due(db_path, now=None):
+    """Пора ли делать снимок по расписанию"""
+    if BACKUP_KEEP <= 0:
+        return False
+    found = snapshots(db_path)
+    now = now or datetime.now()
+    return not found or now - found[0][0] >= timedelta(hours=BACKUP_EVERY_HOURS)
+
+
+def pin(store):
+    """Начало транзакции чтения store сразу на обоих файлах, с одним и тем же их состоянием.
+
+    Перенос в архив и возврат из него меняют файлы разными транзакциями, и снимок, начатый
+    между ними, мог бы не застать задачу ни в одном файле. Поэтому на время начала чтения
+    отдельное соединение приостанавливает запись: BEGIN IMMEDIATE блокирует все подключённые файлы.
+    """
+    lock = sqlite3.connect(store.db_path, isolation_level=None)
+    try:
+        lock.execute("PRAGMA busy_timeout=5000")
+        lock.execute("ATTACH DATABASE ? AS archive", (archive_path(store.db_path),))
+        lock.execute("BEGIN IMMEDIATE")
+        store.conn.execute("BEGIN")
+        for schema in ('main', 'archive'):
+            store.conn.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+        lock.rollback()
+    finally:
+        lock.close()
+
+
+def copy(conn, schema, path, step):
+    """Копия схемы schema соединения conn в новый файл path; step(status, remaining, total) - после каждого шага"""
+    if os.path.exists(path):
+        os.remove(path)
+    target = sqlite3.connect(path)
+    try:
+        conn.backup(target, pages=BACKUP_PAGES, progress=step, name=schema)
+        # Снимок - один файл: в режиме WAL к нему прилагались бы -wal и -shm
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+
+
+def take_snapshot(store, keep=BACKUP_KEEP, progress=None, cancelled=None):
+    """Снимок базы и архива в backup_dir, возвращает путь снимка (None - отменён).
+
+    Файлы пишутся под временными именами и переименовываются в конце, файл базы - последним:
+    снимок из списка snapshots всегда полный. После снимка остаются keep последних (rotate).
+    """
+    directory = backup_dir(store.db_path)
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.splitext(os.path.basename(store.db_path))[0]
+    path = os.path.join(directory, f"{base}-{datetime.now().strftime(STAMP)}.db")
+    files = [('archive', archive_path(path)), ('main', path)]
+    pin(store)
+    try:
+        total = sum(store.conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0] for schema, _ in files)
+        done = 0
+        for schema, target in files:
+            def step(status, remaining, pages):
+                if cancelled is not None and cancelled():
+                    raise Cancelled()
+                if progress is not None:
+                    progress(done + pages - remaining, total)
+            copy(store.conn, schema, target + '.tmp', step)
+            done += store.conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+    except Cancelled:
+        for _, target in files:
+            if os.path.exists(target + '.tmp'):
+                os.remove(target + '.tmp')
+        return None
+    finally:
+        store.conn.rollback()
+    for _, target in files:
+        os.replace(target + '.tmp', target)
+    rotate(store.db_path, keep)
+    return path
+
+
+def rotate(db_path, keep=BACKUP_KEEP):
+    """Удаление снимков, кроме keep последних, и недописанных файлов прерванных снимков; возвращает число снимков"""
+    directory = backup_dir(db_path)
+    base = os.path.splitext(os.path.basename(db_path))[0] + '-'
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.startswith(base) and name.endswith('.tmp'):
+            os.remove(os.path.join(directory, name))
+    if keep <= 0:
+        return 0
+    old = snapshots(db_path)[keep:]
+    for _, path in old:
+        for name in (path, archive_path(path)):
+            if os.path.exists(name):
+                os.remove(name)
+    return len(old)
+
+
+def check(path):
+    """Проверка файла снимка перед восстановлением (ValueError - файла нет или он повреждён)"""
+    if not os.path.exists(path):
+        raise ValueError(f"нет файла снимка: {path}")
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"файл {path} не база SQLite: {e}")
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise ValueError(f"снимок повреждён: {path}: {result}")
+
+
+def restore_snapshot(store, path):
+    """Замена задач (и архива) содержимым снимка path, возвращает число задач после восстановления.
+
+    Выполняется в потоке БД (Database.submit_standalone). Файлы не подменяются под открытыми
+    соединениями: страницы снимка пишутся в рабочие файлы тем же backup API, одной транзакцией
+    на файл, и все соединения - этот поток, второй экземпляр приложения, cli.py - видят
+    восстановленную базу без переоткрытия.
+    """
+    pairs = [(archive_path(path), archive_path(store.db_path)), (path, store.db_path)]
+    for source, _ in pairs:
+        check(source)
+    last = store.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+    for source, target in pairs:
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(target, isolation_level=None)
+        try:
+            dst.execute("PRAGMA busy_timeout=5000")
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    # Снимок мог сделать прежний выпуск приложения
+    store.migrate()
+    with store.transaction():
+        # Задача, которую снимок застал посреди переноса в архив или обратно, остаётся в tasks
+        store.conn.execute("DELETE FROM archive.tasks WHERE id IN (SELECT id FROM main.tasks)")
+        # Разрыв в журнале изменений: другие экземпляры приложения перечитают список целиком
+        store.conn.execute("DELETE FROM change_log")
+        store.conn.execute("INSERT INTO change_log (seq, task_id) VALUES (?, 0)", (last + 2,))
+    return sum(store.status_counts().values())
@@ -0,0 +1,341 @@
+from collections import OrderedDict
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox,
+    QTableWidget, QTableWidgetItem, QTableView, QHeaderView
+)
+from PyQt6.QtCore import Qt, QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor
+from task_model import TimelineModel
+from task_store import TaskStore
+from recurrence import add_months
+import dates
+
+# Календарь (месяц/неделя) и лента событий по дням. Из БД читается только видимый диапазон
+# дней (TaskStore.day_range), соседние диапазоны подгружаются заранее, а готовые к показу
+# диапазоны хранятся в кэше: листание месяцев не ждёт БД и не зависит от числа задач.
+
+# Сколько диапазонов держит кэш каждого вида (по 3 на шаг листания: видимый и два соседних)
+CACHE_SIZE = 24
+# Сколько событий показывается в дне: в ячейке месяца, недели и в ленте
+MONTH_ITEMS = 3
+WEEK_ITEMS = 12
+TIMELINE_ITEMS = 50
+TIMELINE_DAYS = 14
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+MONTHS = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+          'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+MARKS = {'until': '•', 'alert': '!', 'series': '↻'}
+
+
+class RangeCache:
+    """Последние показанные диапазоны: при переполнении вытесняется давно не запрошенный (LRU)"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+    def drop(self, keys):
+        for key in keys:
+            del self.items[key]
+
+
+class RangeLoader(QObject):
+    """Диапазоны дней из кэша или из потока БД; render превращает результат day_range в данные для показа.
+
+    Видимый диапазон запрашивается в канале channel, соседние - каждый в своём канале:
+    быстрое листание отменяет устаревшие запросы, а не копит их в очереди потока БД.
+    """
+
+    def __init__(self, db, render, channel, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.render = render
+        self.channel = channel
+        self.cache = RangeCache()
+        self.visible = None
+        # Результаты запросов, отправленных до invalidate, в кэш не попадают
+        self.generation = 0
+
+    def load(self, first, last, per_day, callback, neighbours=()):
+        """Показ [first, last] через callback(value) - сразу, если диапазон в кэше; соседние - в кэш заранее.
+
+        Соседние запрашиваются после показа видимого: поток БД не отнимает у отрисовки время
+        (и GIL), пока видимый диапазон не на экране.
+        """
+        key = (first, last, per_day)
+        self.visible = key
+        near = [(near_first, near_last, per_day) for near_first, near_last in neighbours]
+        value = self.cache.get(key)
+        if value is not None:
+            callback(value)
+            # После возврата в цикл событий, то есть после отрисовки
+            QTimer.singleShot(0, lambda: self.prefetch(key, near))
+        else:
+            self.fetch(key, callback, self.channel, near)
+
+    def prefetch(self, key, near):
+        if key != self.visible:
+            # Уже перелистнули дальше, соседи теперь другие
+            return
+        for i, near_key in enumerate(near):
+            if near_key not in self.cache:
+                self.fetch(near_key, None, f"{self.channel}_{i}")
+
+    def fetch(self, key, callback, channel, near=()):
+        generation = self.generation
+        self.db.submit(TaskStore.day_range, *key, dates.today_day(),
+                       callback=lambda days: self.on_loaded(key, generation, callback, near, days), channel=channel)
+
+    def on_loaded(self, key, generation, callback, near, days):
+        value = self.render(key[0], key[1], key[2], days)
+        if generation == self.generation:
+            self.cache.put(key, value)
+        # Пока шёл запрос, могли перелистнуть на диапазон из кэша
+        if callback is not None and key == self.visible:
+            callback(value)
+            QTimer.singleShot(0, lambda: self.prefetch(key, near))
+
+    def invalidate(self):
+        """Серии изменились (или неизвестно, что изменилось): кэш устарел целиком"""
+        self.generation += 1
+        self.cache.clear()
+
+    def drop_days(self, days):
+        """Изменились события дней days: из кэша убираются только диапазоны с этими днями.
+
+        Запросы, выполненные в потоке БД до изменения, возвращаются раньше, чем список его дней
+        (TaskStore.changed_days), поэтому их устаревшие результаты успевают попасть в кэш и тоже
+        убираются. Возвращает, убрано ли что-нибудь.
+        """
+        stale = [key for key in self.cache.items if any(key[0] <= day <= key[1] for day in days)]
+        self.cache.drop(stale)
+        return bool(stale)
+
+
+def day_items(entry, per_day):
+    """Не больше per_day событий дня (дедлайны, оповещения, повторения - в этом порядке) и сколько не вошло"""
+    count, items = entry
+    items = items[:per_day]
+    return items, count - len(items)
+
+
+def calendar_cells(first, last, per_day, days):
+    """Тексты ячеек календаря по дням [first, last]: число месяца и заголовки событий"""
+    cells = []
+    for day in range(first, last + 1):
+        lines = [str(dates.day_to_date(day).day)]
+        entry = days.get(day)
+        if entry is not None:
+            items, rest = day_items(entry, per_day)
+            lines += [f"{MARKS[kind]} {title}" for kind, _id, title, status, priority in items]
+            if rest:
+                lines.append(f"ещё {rest}")
+        cells.append("\n".join(lines))
+    return cells
+
+
+def timeline_rows(first, last, per_day, days):
+    """Строки ленты (day, kind, title, status, priority) по дням [first, last]"""
+    rows = []
+    for day in range(first, last + 1):
+        entry = days.get(day)
+        if entry is None:
+            continue
+        items, rest = day_items(entry, per_day)
+        rows += [(day, kind, title, status or '', priority or '') for kind, _id, title, status, priority in items]
+        if rest:
+            rows.append((day, None, f"... ещё {rest}", '', ''))
+    return rows
+
+
+def navigation(parent, move):
+    """Кнопки < Сегодня > и подпись диапазона; move(step) - шаг назад/вперёд, None - к сегодняшнему дню"""
+    layout = QHBoxLayout()
+    label = QLabel()
+    for text, step in (("<", -1), ("Сегодня", None), (">", 1)):
+        button = QPushButton(text, parent)
+        button.clicked.connect(lambda _checked=False, step=step: move(step))
+        layout.addWidget(button)
+    layout.addWidget(label)
+    layout.addStretch()
+    return layout, label
+
+
+class CalendarView(QWidget):
+    """Календарь на месяц (6 недель) или неделю; в ячейке - первые события дня и сколько ещё"""
+    # Двойной щелчок по дню
+    day_activated = pyqtSignal(int)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.loader = RangeLoader(db, calendar_cells, 'calendar', self)
+        self.week_mode = False
+        self.anchor = dates.today_day()
+        self.first = None
+        self.dirty = True
+
+        nav_layout, self.range_label = navigation(self, self.move)
+        self.mode = QComboBox()
+        self.mode.addItems(["Месяц", "Неделя"])
+        self.mode.currentIndexChanged.connect(self.on_mode_changed)
+        nav_layout.insertWidget(0, self.mode)
+
+        self.grid = QTableWidget(6, 7)
+        self.grid.setHorizontalHeaderLabels(WEEKDAYS)
+        self.grid.verticalHeader().setVisible(False)
+        self.grid.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.grid.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.grid.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.grid.setStyleSheet("QTableWidget { color: white; }")
+        self.grid.cellDoubleClicked.connect(self.on_cell_activated)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(nav_layout)
+        layout.addWidget(self.grid)
+
+    def range_at(self, step):
+        """Дни [first, last] диапазона через step шагов от текущего; месяц - с понедельника недели 1-го числа"""
+        if self.week_mode:
+            monday = self.anchor - dates.day_to_date(self.anchor).weekday() + 7 * step
+            return monday, monday + 6
+        month = add_months(dates.day_to_date(self.anchor).replace(day=1), step)
+        first = (month - dates.EPOCH).days - month.weekday()
+        return first, first + 41
+
+    def move(self, step):
+        if step is None:
+            self.anchor = dates.today_day()
+        elif self.week_mode:
+            self.anchor += 7 * step
+        else:
+            month = add_months(dates.day_to_date(self.anchor).replace(day=1), step)
+            self.anchor = (month - dates.EPOCH).days
+        self.refresh()
+
+    def on_mode_changed(self, index):
+        self.week_mode = index == 1
+        self.grid.setRowCount(1 if self.week_mode else 6)
+        self.refresh()
+
+    def refresh(self):
+        """Показ текущего диапазона; на скрытой вкладке - при следующем показе"""
+        if not self.isVisible():
+            self.dirty = True
+            return
+        self.dirty = False
+        self.first, last = self.range_at(0)
+        per_day = WEEK_ITEMS if self.week_mode else MONTH_ITEMS
+        self.loader.load(self.first, last, per_day, self.show_cells, (self.range_at(-1), self.range_at(1)))
+
+    def show_cells(self, cells):
+        # Подпись меняется вместе с ячейками: пока диапазон грузится, на экране прежние подпись и дни
+        anchor = dates.day_to_date(self.anchor)
+        if self.week_mode:
+            self.range_label.setText(f"{dates.format_day(self.first)} - {dates.format_day(self.first + 6)}")
+        else:
+            self.range_label.setText(f"{MONTHS[anchor.month - 1]} {anchor.year}")
+        today = dates.today_day()
+        month = anchor.month
+        for i, text in enumerate(cells):
+            day = self.first + i
+            item = QTableWidgetItem(text)
+            item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+            if day == today:
+                item.setBackground(QColor('#601010'))
+            if not self.week_mode and dates.day_to_date(day).month != month:
+                item.setForeground(QColor('gray'))
+            self.grid.setItem(i // 7, i % 7, item)
+
+    def on_cell_activated(self, row, column):
+        if self.first is not None:
+            self.day_activated.emit(self.first + row * 7 + column)
+
+    def invalidate(self):
+        self.loader.invalidate()
+        self.refresh()
+
+    def drop_days(self, days):
+        """Изменились события дней days (None - неизвестно каких дней)"""
+        if days is None:
+            self.invalidate()
+        elif self.loader.drop_days(days):
+            self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.refresh()
+
+
+class TimelineView(QWidget):
+    """Лента событий за TIMELINE_DAYS дней: дедлайны, оповещения и повторения серий по порядку дней"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.loader = RangeLoader(db, timeline_rows, 'timeline', self)
+        self.first = dates.today_day()
+        self.dirty = True
+
+        nav_layout, self.range_label = navigation(self, self.move)
+        self.model = TimelineModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(nav_layout)
+        layout.addWidget(self.table)
+
+    def move(self, step):
+        self.go_to(dates.today_day() if step is None else self.first + step * TIMELINE_DAYS)
+
+    def go_to(self, day):
+        """Лента с дня day"""
+        self.first = day
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            self.dirty = True
+            return
+        self.dirty = False
+        last = self.first + TIMELINE_DAYS - 1
+        self.range_label.setText(f"{dates.format_day(self.first)} - {dates.format_day(last)}")
+        neighbours = ((self.first - TIMELINE_DAYS, self.first - 1), (last + 1, last + TIMELINE_DAYS))
+        self.loader.load(self.first, last, TIMELINE_ITEMS, self.model.set_rows, neighbours)
+
+    def invalidate(self):
+        self.loader.invalidate()
+        self.refresh()
+
+    def drop_days(self, days):
+        """Изменились события дней days (None - неизвестно каких дней)"""
+        if days is None:
+            self.invalidate()
+        elif self.loader.drop_days(days):
+            self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.refresh()
@@ -0,0 +1,302 @@
+import os
+import sys
+import argparse
+import task_store
+import backup
+from task_store import TaskStore
+from dates import format_day, parse_day, today_day
+from recurrence import FREQUENCIES
+
+# Консольный доступ к задачам без Qt: работает с той же tasks.db, что и приложение.
+# Пример: python cli.py list --status "В работе"
+
+
+def default_db_path():
+    return os.environ.get('TASKPLANNER_DB') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasks.db')
+
+
+def cmd_add(store, args):
+    if args.repeat:
+        # Серия: первое повторение - в день дедлайна (или сегодня)
+        start = args.until or format_day(today_day())
+        alert_offset = parse_day(start) - parse_day(args.alert) if args.alert else None
+        with store.transaction():
+            series = store.add_series(args.title, args.task, start, args.repeat, args.every, args.end,
+                                      args.count, alert_offset, args.priority)
+        print(f"серия {series.id}")
+        return
+    with store.transaction():
+        task = store.add_task(args.title, args.task, args.until, args.alert, args.status, args.priority)
+    print(task.id)
+
+
+def cmd_list(store, args):
+    spec = task_store.filter_spec(args.status, args.priority, args.search, sort=args.sort, descending=args.desc,
+                                  morph=args.morph, archive=args.archive)
+    for row in store.select(spec):
+        task = task_store.Task._make(row)
+        print("\t".join([str(task.id), task.title, task.task, format_day(task.until),
+                         format_day(task.alert), task.status or '', task.priority or '']))
+
+
+def cmd_bulk_update(store, args):
+    if args.set_status is None and args.set_priority is None and not args.shift_days:
+        sys.exit("Нужно указать --set-status, --set-priority и/или --shift-days")
+    spec = task_store.filter_spec(args.status, args.priority, args.search, morph=args.morph)
+    with store.transaction():
+        count = store.bulk_update(spec, args.set_status, args.set_priority, args.shift_days)
+    print(f"Изменено задач: {count}")
+
+
+def cmd_occurrences(store, args):
+    first = parse_day(args.date_from) if args.date_from else today_day()
+    last = parse_day(args.date_to) if args.date_to else first + 13
+    for row in store.occurrences(first, last, today_day()):
+        print("\t".join([str(row.series_id), format_day(row.day), row.title, row.task, row.rule,
+                         row.status, row.priority or '']))
+
+
+def cmd_edit_series(store, args):
+    with store.transaction():
+        series = store.get_series(args.series_id)
+        if series is None:
+            sys.exit(f"Нет серии {args.series_id}")
+        # Не указанные поля - как были
+        end = args.end if args.end is not None else format_day(series.end_day)
+        series = store.update_series(series.id, args.title or series.title, args.task or series.task,
+                                     args.start or format_day(series.start), args.repeat or series.freq,
+                                     args.every or series.interval, end,
+                                     args.count if args.count is not None else series.count,
+                                     series.alert_offset, args.priority or series.priority)
+    print(f"серия {series.id}")
+
+
+def cmd_mark_occurrence(store, args):
+    status = None if args.status == 'нет' else args.status
+    with store.transaction():
+        store.set_occurrences([(args.series_id, parse_day(args.day))], status)
+
+
+def cmd_delete(store, args):
+    with store.transaction():
+        snapshot = store.bulk_delete(args.ids)
+    print(f"Удалено задач: {len(snapshot.rows)}")
+
+
+def cmd_stats(store, args):
+    for status, count in sorted(store.status_counts().items()):
+        print(f"{status}\t{count}")
+
+
+def cmd_history(store, args):
+    today = today_day()
+    for row in store.daily_history(today - args.days + 1, today):
+        print("\t".join([format_day(row.day)] + [str(value) for value in row[1:]]))
+
+
+def cmd_check_due(store, args):
+    with store.transaction():
+        titles, changed = store.check_due(today_day())
+    for title in titles:
+        print(f"Напоминание: {title}")
+    print(f"Изменено задач: {changed}")
+
+
+def cmd_index_lemmas(store, args):
+    import morphology
+    done = morphology.backfill(store, progress=progress_printer())
+    print(file=sys.stderr)
+    print(f"Лемматизировано задач: {done}")
+
+
+def cmd_archive(store, args):
+    before = today_day() - args.days
+    done = 0
+    while True:
+        count = store.archive_closed(before)
+        if not count:
+            break
+        done += count
+        print(f"\r{done}", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    print(f"Перенесено в архив задач: {done}")
+
+
+def cmd_unarchive(store, args):
+    print(f"Возвращено из архива задач: {store.unarchive(args.ids, today_day())}")
+
+
+def cmd_compact(store, args):
+    store.trim_changes()
+    store.vacuum()
+
+
+def cmd_backup(store, args):
+    if args.list:
+        for stamp, path in backup.snapshots(store.db_path):
+            print(f"{stamp:%Y-%m-%d %H:%M:%S}\t{path}")
+        return
+    path = backup.take_snapshot(store, args.keep, progress=progress_printer(' стр.'))
+    print(file=sys.stderr)
+    print(path)
+
+
+def cmd_restore(store, args):
+    print(f"Восстановлено из {args.path}, задач: {backup.restore_snapshot(store, args.path)}")
+
+
+def progress_printer(unit=''):
+    def progress(done, total):
+        print(f"\r{done}/{total}{unit}", end='', file=sys.stderr, flush=True)
+    return progress
+
+
+def cmd_export(store, args):
+    import exporter
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip('.').lower()
+    if fmt not in exporter.FORMATS:
+        sys.exit(f"Неподдерживаемый формат: {fmt}")
+    spec = task_store.filter_spec(args.status, args.priority, args.search, morph=args.morph, archive=args.archive)
+    exporter.export_tasks(store, args.path, fmt, spec, progress=progress_printer())
+    print(file=sys.stderr)
+
+
+def cmd_import(store, args):
+    import importer
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip('.').lower()
+    if fmt not in importer.READERS:
+        sys.exit(f"Неподдерживаемый формат: {fmt}")
+    imported, rejected_count, rejected = importer.import_tasks(store, args.path, fmt,
+                                                               progress=progress_printer(' КБ'))
+    print(file=sys.stderr)
+    print(f"Импортировано задач: {imported}, отклонено строк: {rejected_count}")
+    for line_no, reason in rejected[:20]:
+        print(f"строка {line_no}: {reason}")
+
+
+def add_filters(parser, archive=True):
+    parser.add_argument('--status', default="Все", choices=["Все"] + task_store.STATUSES)
+    parser.add_argument('--priority', default="Все", choices=["Все"] + task_store.PRIORITIES)
+    parser.add_argument('--search', default="", help="полнотекстовый поиск по заголовку и описанию")
+    parser.add_argument('--morph', action='store_true', help="искать по словоформам (купил - купить)")
+    if archive:
+        parser.add_argument('--archive', action='store_true', help="задачи архива вместо основного списка")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='taskplanner', description="Планировщик задач из командной строки")
+    parser.add_argument('--db', default=default_db_path(), help="путь к tasks.db")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('add', help="добавить задачу")
+    p.add_argument('title')
+    p.add_argument('task')
+    p.add_argument('--until', default='', help="дедлайн YYYY-MM-DD")
+    p.add_argument('--alert', default='', help="дата оповещения YYYY-MM-DD")
+    p.add_argument('--status', default='В работе', choices=task_store.STATUSES)
+    p.add_argument('--priority', default='Средний', choices=task_store.PRIORITIES)
+    p.add_argument('--repeat', choices=list(FREQUENCIES), help="повторять: серия вместо одной задачи")
+    p.add_argument('--every', type=int, default=1, help="интервал повтора (каждые N дней/недель/месяцев)")
+    p.add_argument('--end', default='', help="последний день повторов YYYY-MM-DD")
+    p.add_argument('--count', type=int, help="число повторов")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser('list', help="вывести задачи (через табуляцию)")
+    add_filters(p)
+    p.add_argument('--sort', choices=list(task_store.SORT_KEYS), help="поле сортировки (по умолчанию - id)")
+    p.add_argument('--desc', action='store_true', help="по убыванию")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser('bulk-update', help="сменить статус/приоритет или сдвинуть дедлайн всех задач выборки")
+    add_filters(p, archive=False)
+    p.add_argument('--set-status', choices=task_store.STATUSES)
+    p.add_argument('--set-priority', choices=task_store.PRIORITIES)
+    p.add_argument('--shift-days', type=int, default=0, help="сдвинуть дедлайн на N дней (можно отрицательное)")
+    p.set_defaults(func=cmd_bulk_update)
+
+    p = sub.add_parser('occurrences', help="повторения серий за диапазон дней (по умолчанию - 14 дней с сегодня)")
+    p.add_argument('--from', dest='date_from', help="первый день YYYY-MM-DD")
+    p.add_argument('--to', dest='date_to', help="последний день YYYY-MM-DD")
+    p.set_defaults(func=cmd_occurrences)
+
+    p = sub.add_parser('edit-series', help="изменить серию; отметки повторений, выпавших из правила, снимаются")
+    p.add_argument('series_id', type=int)
+    p.add_argument('--title')
+    p.add_argument('--task')
+    p.add_argument('--start', help="день первого повторения YYYY-MM-DD")
+    p.add_argument('--repeat', choices=list(FREQUENCIES))
+    p.add_argument('--every', type=int, help="интервал повтора (каждые N дней/недель/месяцев)")
+    p.add_argument('--end', help="последний день повторов YYYY-MM-DD, пустая строка - без него")
+    p.add_argument('--count', type=int, help="число повторов, 0 - без ограничения")
+    p.add_argument('--priority', choices=task_store.PRIORITIES)
+    p.set_defaults(func=cmd_edit_series)
+
+    p = sub.add_parser('mark-occurrence', help="отметить повторение серии")
+    p.add_argument('series_id', type=int)
+    p.add_argument('day', help="день повторения YYYY-MM-DD")
+    p.add_argument('status', choices=task_store.STATUSES + ['нет'], help="статус или «нет» - снять отметку")
+    p.set_defaults(func=cmd_mark_occurrence)
+
+    p = sub.add_parser('delete', help="удалить задачи по id")
+    p.add_argument('ids', nargs='+', type=int)
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser('stats', help="количество задач по статусам")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('history', help="по дням: создано, выполнено, открытых и просроченных задач на конец дня")
+    p.add_argument('--days', type=int, default=30)
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser('check-due', help="обработать сегодняшние оповещения и просроченные задачи")
+    p.set_defaults(func=cmd_check_due)
+
+    p = sub.add_parser('index-lemmas', help="лемматизировать задачи для поиска по словоформам (--morph)")
+    p.set_defaults(func=cmd_index_lemmas)
+
+    p = sub.add_parser('archive', help="перенести в архив задачи, закрытые больше --days дней назад")
+    p.add_argument('--days', type=int, default=task_store.ARCHIVE_AFTER_DAYS or 90)
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('unarchive', help="вернуть задачи из архива по id")
+    p.add_argument('ids', nargs='+', type=int)
+    p.set_defaults(func=cmd_unarchive)
+
+    p = sub.add_parser('compact', help="сжать файлы БД и архива (VACUUM); приложение на это время лучше закрыть")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser('backup', help="снимок базы и архива в папку backups рядом с tasks.db")
+    p.add_argument('--keep', type=int, default=backup.BACKUP_KEEP, help="сколько последних снимков хранить (0 - все)")
+    p.add_argument('--list', action='store_true', help="вывести снимки вместо нового")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser('restore', help="заменить задачи и архив содержимым снимка")
+    p.add_argument('path', help="файл снимка (см. backup --list)")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser('export', help="экспорт задач в csv, jsonl или xlsx")
+    add_filters(p)
+    p.add_argument('path')
+    p.add_argument('--format', choices=['csv', 'jsonl', 'xlsx'])
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('import', help="импорт задач из csv или jsonl")
+    p.add_argument('path')
+    p.add_argument('--format', choices=['csv', 'jsonl'])
+    p.set_defaults(func=cmd_import)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = TaskStore(args.db)
+    try:
+        args.func(store, args)
+    except ValueError as e:
+        sys.exit(f"Ошибка: {e}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
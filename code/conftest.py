@@ -0,0 +1,10 @@
+import pytest
+from task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Хранилище над новым файлом БД во временном каталоге (архив создаётся рядом)"""
+    store = TaskStore(str(tmp_path / 'tasks.db'))
+    yield store
+    store.close()
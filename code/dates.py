@@ -0,0 +1,38 @@
+from datetime import date, datetime, timedelta
+
+# Даты дедлайна и оповещения хранятся в БД как число дней от 1970-01-01 (INTEGER),
+# в интерфейсе и файлах экспорта показываются как YYYY-MM-DD.
+EPOCH = date(1970, 1, 1)
+
+
+def parse_day(s):
+    """Номер дня из строки YYYY-MM-DD; None для пустой строки, ValueError для неверной"""
+    s = (s or '').strip()
+    if not s:
+        return None
+    return (datetime.strptime(s, '%Y-%m-%d').date() - EPOCH).days
+
+
+def format_day(day):
+    """Строка YYYY-MM-DD из номера дня; пустая строка для None"""
+    if day is None:
+        return ''
+    return (EPOCH + timedelta(days=day)).isoformat()
+
+
+def day_to_date(day):
+    return EPOCH + timedelta(days=day)
+
+
+def today_day():
+    """Номер сегодняшнего дня"""
+    return (date.today() - EPOCH).days
+
+
+def is_valid_date(s):
+    """Проверка даты на валидность (пустая строка допустима)"""
+    try:
+        parse_day(s)
+        return True
+    except ValueError:
+        return False
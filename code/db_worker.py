@@ -0,0 +1,327 @@
+import time
+import itertools
+import traceback
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+from task_store import TaskStore
+import profiler
+
+# Сколько ждать следующих изменений перед коммитом и сколько изменений коммитить разом
+FLUSH_DELAY_MS = 50
+MAX_BATCH = 1000
+# Шаги фоновой работы (submit_batches) ждут, пока интерфейс столько не присылает запросов
+BATCH_PAUSE_MS = 300
+
+
+class DbWorker(QObject):
+    """Исполнитель запросов в отдельном потоке, владеет своим TaskStore (и соединением с БД)"""
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    flushed = pyqtSignal()
+
+    def __init__(self, db_path, latest):
+        super().__init__()
+        self.db_path = db_path
+        self.store = None
+        self.conn = None
+        # Общий с Database словарь: канал -> id последнего запроса в нём
+        self.latest = latest
+        # Изменения из открытой транзакции, результаты которых отдаются после коммита
+        self.pending = []
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(FLUSH_DELAY_MS)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def open(self):
+        """Открытие хранилища в потоке БД (соединение создаётся в том потоке, где используется)"""
+        if self.store is not None:
+            return
+        self.store = TaskStore(self.db_path)
+        self.conn = self.store.conn
+
+    @pyqtSlot(int, object, object, object)
+    def run(self, request_id, channel, func, args):
+        """Выполнение func(store, *args) и отправка результата обратно"""
+        if channel is not None and self.latest.get(channel) != request_id:
+            # Запрос уже заменён более новым, выполнять его незачем
+            self.finished.emit(request_id, None)
+            return
+        try:
+            self.open()
+            result = self.call(func, args)
+        except Exception:
+            self.failed.emit(request_id, traceback.format_exc())
+            return
+        self.finished.emit(request_id, result)
+
+    def call(self, func, args):
+        """func(store, *args); при включённом профилировании - с замером"""
+        if not profiler.ENABLED:
+            return func(self.store, *args)
+        started = time.perf_counter()
+        try:
+            return func(self.store, *args)
+        finally:
+            profiler.record('db', func_name(func), time.perf_counter() - started)
+
+    @pyqtSlot(int, object, object)
+    def run_standalone(self, request_id, func, args):
+        """Выполнение func вне общей транзакции: накопленные изменения сначала коммитятся"""
+        self.flush()
+        self.run(request_id, None, func, args)
+
+    @pyqtSlot(int, object, object)
+    def write(self, request_id, func, args):
+        """Выполнение изменения в общей транзакции; коммит откладывается до flush"""
+        try:
+            self.open()
+            if not self.conn.in_transaction:
+                # Сразу с блокировкой записи, как TaskStore.transaction
+                self.conn.execute("BEGIN IMMEDIATE")
+            # Точка сохранения, чтобы ошибка одного изменения не откатывала остальные
+            self.conn.execute("SAVEPOINT write")
+        except Exception:
+            self.failed.emit(request_id, traceback.format_exc())
+            return
+        try:
+            result = self.call(func, args)
+        except Exception:
+            self.conn.execute("ROLLBACK TO write")
+            self.conn.execute("RELEASE write")
+            # Кэш колонок мог прочитать отменённые изменения
+            self.store.discard_cache()
+            self.failed.emit(request_id, traceback.format_exc())
+            return
+        self.conn.execute("RELEASE write")
+        self.pending.append((request_id, result))
+        if len(self.pending) >= MAX_BATCH:
+            self.flush()
+        elif not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    @pyqtSlot()
+    def flush(self):
+        """Коммит накопленных изменений и отправка их результатов"""
+        self.flush_timer.stop()
+        if self.conn is None or not self.conn.in_transaction:
+            return
+        pending, self.pending = self.pending, []
+        started = time.perf_counter()
+        try:
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.store.discard_cache()
+            message = traceback.format_exc()
+            for request_id, _ in pending:
+                self.failed.emit(request_id, message)
+            return
+        if profiler.ENABLED:
+            profiler.record('db', 'commit', time.perf_counter() - started)
+        for request_id, result in pending:
+            self.finished.emit(request_id, result)
+        self.flushed.emit()
+
+    @pyqtSlot()
+    def stop(self):
+        """Коммит, закрытие соединения и остановка потока (после всех ранее отправленных запросов)"""
+        self.flush()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+            self.conn = None
+        QThread.currentThread().quit()
+
+
+class Database(QObject):
+    """Асинхронный доступ к БД из GUI-потока.
+
+    Запросы выполняются по очереди в потоке DbWorker, результат передаётся в callback
+    в GUI-потоке. Для запросов с одним каналом (например, поиск) учитывается только
+    последний: более старые пропускаются, а их результаты отбрасываются.
+
+    Изменения (submit_write) группируются в короткие транзакции; их результаты приходят
+    в callback после коммита, затем - один сигнал committed на весь пакет.
+    """
+    request = pyqtSignal(int, object, object, object)
+    standalone_request = pyqtSignal(int, object, object)
+    write_request = pyqtSignal(int, object, object)
+    flush_requested = pyqtSignal()
+    stop_requested = pyqtSignal()
+    committed = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.ids = itertools.count(1)
+        self.callbacks = {}
+        self.latest = {}
+        # Время последнего запроса интерфейса и отложенные до паузы шаги фоновой работы
+        self.last_request = 0.0
+        self.waiting_batches = []
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.timeout.connect(self.run_batches)
+
+        self.thread = QThread()
+        self.worker = DbWorker(db_path, self.latest)
+        self.worker.moveToThread(self.thread)
+        self.request.connect(self.worker.run)
+        self.standalone_request.connect(self.worker.run_standalone)
+        self.write_request.connect(self.worker.write)
+        self.flush_requested.connect(self.worker.flush)
+        self.stop_requested.connect(self.worker.stop)
+        self.worker.finished.connect(self.on_finished)
+        self.worker.failed.connect(self.on_failed)
+        self.worker.flushed.connect(self.committed)
+        self.thread.start()
+
+    def submit(self, func, *args, callback=None, channel=None):
+        """Постановка запроса func(store, *args) в очередь потока БД, обычно func - метод TaskStore"""
+        request_id = next(self.ids)
+        self.last_request = time.perf_counter()
+        self.callbacks[request_id] = (callback, channel)
+        if channel is not None:
+            self.latest[channel] = request_id
+        self.request.emit(request_id, channel, func, args)
+        return request_id
+
+    def submit_write(self, func, *args, callback=None):
+        """Постановка изменения func(store, *args); callback вызывается после коммита"""
+        request_id = next(self.ids)
+        self.last_request = time.perf_counter()
+        self.callbacks[request_id] = (callback, None)
+        self.write_request.emit(request_id, func, args)
+        return request_id
+
+    def submit_standalone(self, func, *args, callback=None):
+        """Запрос func(store, *args), который сам открывает свои транзакции (например, по одной
+        на каждый файл БД): накопленные изменения коммитятся до него, сигнала committed нет"""
+        self.last_request = time.perf_counter()
+        return self.post_standalone(func, args, callback)
+
+    def post_standalone(self, func, args, callback):
+        request_id = next(self.ids)
+        self.callbacks[request_id] = (callback, None)
+        self.standalone_request.emit(request_id, func, args)
+        return request_id
+
+    def submit_batches(self, func, *args, callback=None):
+        """Долгая фоновая работа по шагам: func(store, *args) повторяется, пока не вернёт 0.
+
+        Следующий шаг ставится в очередь после результата предыдущего и только когда интерфейс
+        BATCH_PAUSE_MS не присылал запросов: пока с окном работают, фоновая работа стоит,
+        а запросы интерфейса ждут не больше одного уже начатого шага. Шаги выполняются как
+        submit_standalone. callback(total) вызывается после последнего шага, total - сумма
+        результатов всех шагов.
+        """
+        total = 0
+
+        def next_batch(count):
+            nonlocal total
+            total += count
+            if count:
+                self.queue_batch(step)
+            elif callback is not None:
+                callback(total)
+
+        def step():
+            self.post_standalone(func, args, next_batch)
+        self.queue_batch(step)
+
+    def queue_batch(self, step):
+        self.waiting_batches.append(step)
+        if not self.batch_timer.isActive():
+            self.run_batches()
+
+    def run_batches(self):
+        """Отложенные шаги фоновой работы - в очередь потока БД, если интерфейс затих"""
+        quiet = (time.perf_counter() - self.last_request) * 1000
+        if quiet < BATCH_PAUSE_MS:
+            self.batch_timer.start(int(BATCH_PAUSE_MS - quiet) + 1)
+            return
+        steps, self.waiting_batches = self.waiting_batches, []
+        for step in steps:
+            step()
+
+    def flush(self):
+        """Закоммитить накопленные изменения, не дожидаясь задержки"""
+        self.flush_requested.emit()
+
+    def is_stale(self, request_id, channel):
+        """Результат устарел: после него в том же канале был отправлен новый запрос"""
+        return channel is not None and self.latest.get(channel) != request_id
+
+    def on_finished(self, request_id, result):
+        callback, channel = self.callbacks.pop(request_id)
+        if callback is None or self.is_stale(request_id, channel):
+            return
+        if not profiler.ENABLED:
+            callback(result)
+            return
+        # Обработка результата в GUI-потоке: обновление модели, диаграммы, планировщика
+        started = time.perf_counter()
+        try:
+            callback(result)
+        finally:
+            profiler.record('ui', func_name(callback), time.perf_counter() - started)
+
+    def on_failed(self, request_id, message):
+        self.callbacks.pop(request_id, None)
+        self.error.emit(message)
+
+    def close(self):
+        """Дождаться выполнения очереди, закоммитить изменения и остановить поток БД"""
+        if not self.thread.isRunning():
+            return
+        self.batch_timer.stop()
+        self.waiting_batches = []
+        self.stop_requested.emit()
+        self.thread.wait()
+
+
+class JobThread(QThread):
+    """Долгая операция (экспорт, импорт) в своём потоке и со своим TaskStore.
+
+    Не занимает очередь DbWorker: в режиме WAL чтение не мешает его записям.
+    func вызывается как func(store, *args, progress=..., cancelled=...).
+    """
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, func, *args, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.func = func
+        self.args = args
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def is_cancelled(self):
+        return self.cancel_requested
+
+    def run(self):
+        try:
+            store = TaskStore(self.db_path)
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+            return
+        started = time.perf_counter()
+        try:
+            result = self.func(store, *self.args, progress=self.progress.emit, cancelled=self.is_cancelled)
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+            return
+        finally:
+            store.close()
+            if profiler.ENABLED:
+                profiler.record('db', func_name(self.func), time.perf_counter() - started)
+        self.done.emit(result)
+
+
+def func_name(func):
+    return getattr(func, '__qualname__', None) or repr(func)
@@ -0,0 +1,99 @@
+import os
+import csv
+import json
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+HEADER = ["Заголовок", "Задача", "До", "Оповещение", "Статус", "Приоритет"]
+# Имена полей в JSON Lines совпадают с колонками таблицы tasks
+FIELDS = ["title", "task", "until", "alert", "status", "priority"]
+# Даты переводятся из номеров дней в YYYY-MM-DD прямо в запросе
+EXPORT_COLUMNS = ("t.title, t.task, IFNULL(date(t.until * 86400, 'unixepoch'), ''), "
+                  "IFNULL(date(t.alert * 86400, 'unixepoch'), ''), t.status, t.priority")
+# Сколько строк читается из курсора за раз: память не зависит от размера БД
+CHUNK_SIZE = 1000
+# Ограничение Excel на число строк листа
+XLSX_MAX_ROWS = 1048576
+
+
+class CsvExport:
+    def __init__(self, path):
+        self.file = open(path, "w", newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADER)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlExport:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding='utf-8')
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxExport:
+    def __init__(self, path):
+        # constant_memory: строки сбрасываются на диск сразу, в памяти держится одна строка
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.sheet = None
+        self.row = XLSX_MAX_ROWS
+
+    def write(self, rows):
+        for values in rows:
+            if self.row == XLSX_MAX_ROWS:
+                # Лист заполнен, продолжаем на следующем
+                self.sheet = self.workbook.add_worksheet()
+                self.sheet.write_row(0, 0, HEADER)
+                self.row = 1
+            self.sheet.write_row(self.row, 0, values)
+            self.row += 1
+
+    def close(self):
+        self.workbook.close()
+
+
+FORMATS = {'csv': CsvExport, 'jsonl': JsonlExport}
+if xlsxwriter is not None:
+    FORMATS['xlsx'] = XlsxExport
+
+
+def export_tasks(store, path, fmt, spec, progress=None, cancelled=None):
+    """Потоковый экспорт задач выборки spec в файл формата fmt (csv, jsonl, xlsx).
+
+    progress(done, total) вызывается после каждой порции строк, cancelled() проверяется
+    перед каждой порцией. При отмене недописанный файл удаляется и возвращается None.
+    """
+    total = store.count(spec)
+    cur = store.select(spec, EXPORT_COLUMNS)
+    out = FORMATS[fmt](path)
+    done = 0
+    try:
+        while True:
+            if cancelled is not None and cancelled():
+                out.close()
+                os.remove(path)
+                return None
+            rows = cur.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            out.write(rows)
+            done += len(rows)
+            if progress is not None:
+                progress(done, total)
+    except Exception:
+        out.close()
+        raise
+    out.close()
+    return path
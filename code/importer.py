@@ -0,0 +1,133 @@
+import os
+import csv
+import json
+from exporter import HEADER, FIELDS
+from dates import parse_day
+from task_store import STATUSES, PRIORITIES
+
+# Сколько строк вставляется одним executemany и одной транзакцией
+BATCH_SIZE = 5000
+# Сколько отклонённых строк запоминается для отчёта (остальные только считаются)
+MAX_REJECTED = 1000
+
+
+def read_lines(f, counter):
+    """Строки бинарного файла как текст, с подсчётом прочитанных байт для прогресса"""
+    encoding = 'utf-8-sig'
+    for raw in f:
+        counter[0] += len(raw)
+        yield raw.decode(encoding, errors='replace')
+        # BOM (его добавляет Excel) может быть только в начале файла
+        encoding = 'utf-8'
+
+
+def read_csv(lines):
+    """Записи CSV в формате экспорта: (номер строки, словарь полей)"""
+    reader = csv.reader(lines)
+    fields = FIELDS
+    for values in reader:
+        if reader.line_num == 1:
+            names = [v.strip() for v in values]
+            if names == HEADER or names == FIELDS:
+                continue
+        yield reader.line_num, dict(zip(fields, values))
+
+
+def read_jsonl(lines):
+    """Записи JSON Lines: (номер строки, словарь полей); пустые строки пропускаются"""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_no, record
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def check_date(value, name):
+    """Номер дня из даты YYYY-MM-DD, None для пустого значения"""
+    try:
+        return parse_day(str(value or ''))
+    except ValueError:
+        raise ValueError(f"неверная дата в поле {name}: {value}")
+
+
+def validate(record):
+    """Проверка записи, возвращает значения для вставки или бросает ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("строка не разобрана")
+    title = str(record.get('title') or '').strip()
+    task = str(record.get('task') or '').strip()
+    if not title or not task:
+        raise ValueError("пустой заголовок или описание")
+    until = check_date(record.get('until'), 'until')
+    alert = check_date(record.get('alert'), 'alert')
+    status = str(record.get('status') or 'В работе').strip()
+    if status not in STATUSES:
+        raise ValueError(f"неизвестный статус: {status}")
+    priority = str(record.get('priority') or 'Средний').strip()
+    if priority not in PRIORITIES:
+        raise ValueError(f"неизвестный приоритет: {priority}")
+    return title, task, until, alert, status, priority
+
+
+def import_tasks(store, path, fmt, progress=None, cancelled=None):
+    """Потоковый импорт задач из CSV (формат экспорта) или JSON Lines.
+
+    Строки проверяются по мере чтения и вставляются пачками по BATCH_SIZE, каждая
+    пачка в своей транзакции. Возвращает (число импортированных, число отклонённых,
+    список (номер строки, причина) для первых MAX_REJECTED отклонённых).
+    cancelled() проверяется перед каждой пачкой; при отмене уже вставленные пачки
+    удаляются и возвращается None.
+    """
+    size = os.path.getsize(path)
+    counter = [0]
+    imported = 0
+    rejected_count = 0
+    rejected = []
+    batch = []
+    # id задач каждой вставленной пачки (первый, последний)
+    added = []
+
+    def insert_batch():
+        with store.transaction():
+            added.append(store.add_many(batch))
+            # Леммы новых задач для поиска по словоформам - в той же транзакции (импорт и так идёт в фоне)
+            store.lemmatize_queued(len(batch))
+
+    def discard():
+        # Отменённый импорт не оставляет задач: пачки, уже вставленные своими транзакциями, удаляются
+        with store.transaction():
+            for first, last in added:
+                store.discard_added(first, last)
+
+    with open(path, 'rb') as f:
+        for line_no, record in READERS[fmt](read_lines(f, counter)):
+            try:
+                batch.append(validate(record))
+            except ValueError as e:
+                rejected_count += 1
+                if len(rejected) < MAX_REJECTED:
+                    rejected.append((line_no, str(e)))
+                continue
+            if len(batch) >= BATCH_SIZE:
+                if cancelled is not None and cancelled():
+                    discard()
+                    return None
+                insert_batch()
+                imported += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(counter[0] // 1024, size // 1024)
+    if cancelled is not None and cancelled():
+        discard()
+        return None
+    if batch:
+        insert_batch()
+        imported += len(batch)
+    return imported, rejected_count, rejected
+
@@ -1,25 +1,39 @@
 import sys
 import os
-from datetime import datetime
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
-    QLabel, QLineEdit, QPushButton, QGroupBox, QSystemTrayIcon, QMenu, QMessageBox, QComboBox
+    QLabel, QLineEdit, QPushButton, QGroupBox, QSystemTrayIcon, QMenu, QMessageBox, QComboBox, QSpinBox
 )
 from PyQt6.QtGui import QIcon, QAction
-from second_window import SecondWindow
+from PyQt6.QtCore import QTimer
+from db_worker import Database
+from reminders import Reminders
+from task_store import TaskStore
+from recurrence import FREQUENCIES
+import dates
+
+# Через сколько после показа формы окно «Все задачи» строится в фоне (кроме запуска в трей)
+PRELOAD_DELAY_MS = 2000
 
 
 class MainWindow(QWidget):
-    def __init__(self):
+    def __init__(self, tray_only=False):
         super().__init__()
         self.w = None
-        self.db_path = os.path.join(os.path.dirname(__file__), 'tasks.db')
+        self.db_path = os.environ.get('TASKPLANNER_DB') or os.path.join(os.path.dirname(__file__), 'tasks.db')
         self.tray_icon = None
         self.initUI()
         self.init_tray()
 
-        self.w = SecondWindow(db_path=self.db_path)
-        self.w.hide()
+        # Поток БД и напоминания нужны сразу, окно задач (таблица, диаграмма) - только по запросу
+        self.db = Database(self.db_path, self)
+        self.db.error.connect(self.on_db_error)
+        self.reminders = Reminders(self.db, self)
+        self.reminders.start()
+        # Леммы для поиска по словоформам, перенос закрытых задач в архив и сжатие файлов - в фоне
+        self.reminders.maintain()
+        if not tray_only:
+            QTimer.singleShot(PRELOAD_DELAY_MS, self.preload)
 
     def initUI(self):
         """Инициализация интерфейса"""
@@ -43,11 +57,32 @@ class MainWindow(QWidget):
 
         self.status = 'В работе'
 
+        # Повтор: задача хранится один раз как серия, повторения вычисляются
+        self.repeat_combo = QComboBox()
+        self.repeat_combo.addItem("Нет", None)
+        for freq, name in FREQUENCIES.items():
+            self.repeat_combo.addItem(name, freq)
+        self.repeat_interval = QSpinBox()
+        self.repeat_interval.setRange(1, 365)
+        self.repeat_interval.setPrefix("интервал ")
+        self.repeat_end = QLineEdit()
+        self.repeat_end.setPlaceholderText("До даты (необязательно)")
+        self.repeat_count = QSpinBox()
+        self.repeat_count.setRange(0, 100000)
+        self.repeat_count.setSpecialValueText("без ограничения")
+        self.repeat_count.setSuffix(" раз")
+        repeat_layout = QHBoxLayout()
+        for widget in (self.repeat_combo, self.repeat_interval, self.repeat_end, self.repeat_count):
+            repeat_layout.addWidget(widget)
+        self.repeat_combo.currentIndexChanged.connect(self.on_repeat_changed)
+        self.on_repeat_changed()
+
         gb_layout.addRow(QLabel("Заголовок"), self.title)
         gb_layout.addRow(QLabel("Задача"), self.task)
         gb_layout.addRow(QLabel("Дата дедлайна"), self.until)
         gb_layout.addRow(QLabel("Оповещение (дата)"), self.alert)
         gb_layout.addRow(QLabel("Приоритет"), self.priority_combo)
+        gb_layout.addRow(QLabel("Повтор"), repeat_layout)
         gb.setLayout(gb_layout)
 
         button_add = QPushButton("Добавить")
@@ -76,7 +111,7 @@ class MainWindow(QWidget):
         QLabel { color: white; }
         QGroupBox { font-weight: bold; 
                     color: white; }
-        QLineEdit, QComboBox {
+        QLineEdit, QComboBox, QSpinBox {
             background: #140303; color: white;
             padding: 6px; border: 1px solid #cfd8e3; border-radius: 4px;
             }
@@ -117,23 +152,38 @@ class MainWindow(QWidget):
         self.raise_()
         self.activateWindow()
 
+    def on_db_error(self, message):
+        """Ошибка запроса в потоке БД"""
+        QMessageBox.warning(self.w or self, "Ошибка БД", message.strip().splitlines()[-1])
+
+    def second_window(self):
+        """Окно «Все задачи», создаётся при первом обращении"""
+        if not self.w:
+            from second_window import SecondWindow
+            self.w = SecondWindow(db_path=self.db_path, tray=self.tray_icon, db=self.db, reminders=self.reminders)
+        return self.w
+
+    def preload(self):
+        """Фоновое создание окна задач, пока пользователь заполняет форму"""
+        if not self.w:
+            self.second_window()
+
     def show_new_window(self):
         """Открытие second_window"""
-        if not self.w:
-            self.w = SecondWindow(db_path=self.db_path, tray=self.tray_icon)
+        self.second_window()
         self.w.show()
         self.w.raise_()
         self.w.activateWindow()
 
     def is_valid_date(self, date_str):
         """Проверка на валидность даты"""
-        if not date_str:
-            return True
-        try:
-            datetime.strptime(date_str, "%Y-%m-%d")
-            return True
-        except ValueError:
-            return False
+        return dates.is_valid_date(date_str)
+
+    def on_repeat_changed(self):
+        """Поля повтора доступны, только если повтор выбран"""
+        repeat = self.repeat_combo.currentData() is not None
+        for widget in (self.repeat_interval, self.repeat_end, self.repeat_count):
+            widget.setEnabled(repeat)
 
     def on_add(self):
         """Добавление новой задачи"""
@@ -142,8 +192,10 @@ class MainWindow(QWidget):
         until = self.until.text().strip()
         alert = self.alert.text().strip()
         priority = self.priority_combo.currentText()
+        freq = self.repeat_combo.currentData()
+        end_day = self.repeat_end.text().strip() if freq else ''
 
-        if not self.is_valid_date(until) or not self.is_valid_date(alert):
+        if not self.is_valid_date(until) or not self.is_valid_date(alert) or not self.is_valid_date(end_day):
             QMessageBox.warning(self, "Ошибка формата даты", "Формат даты должен быть: YYYY-MM-DD")
             return
 
@@ -151,27 +203,45 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, "Пустые поля", "Введите заголовок и описание задачи.")
             return
 
-        if not self.w:
-            self.w = SecondWindow(db_path=self.db_path, tray=self.tray_icon)
-
-        self.w.add_row(title, task, until, alert, self.status, priority)
+        if freq:
+            # Первое повторение - в день дедлайна (или сегодня), оповещение - за столько же дней до каждого
+            start = until or dates.format_day(dates.today_day())
+            alert_offset = dates.parse_day(start) - dates.parse_day(alert) if alert else None
+            if alert_offset is not None and alert_offset < 0:
+                QMessageBox.warning(self, "Ошибка даты", "Оповещение должно быть не позже дедлайна.")
+                return
+            self.db.submit_write(TaskStore.add_series, title, task, start, freq, self.repeat_interval.value(),
+                                 end_day, self.repeat_count.value(), alert_offset, priority,
+                                 callback=self.reminders.on_series_changed)
+        else:
+            # Окно задач для этого не нужно: если оно уже создано, строка добавится по Reminders.task_saved
+            self.db.submit_write(TaskStore.add_task, title, task, until, alert, self.status, priority,
+                                 callback=self.reminders.on_task_saved)
 
         self.title.clear()
         self.task.clear()
         self.until.clear()
         self.alert.clear()
         self.priority_combo.setCurrentIndex(1)
+        self.repeat_combo.setCurrentIndex(0)
+        self.repeat_interval.setValue(1)
+        self.repeat_end.clear()
+        self.repeat_count.setValue(0)
 
     def closeEvent(self, event):
         """Скрытие приложения при нажатии на крестик"""
         event.ignore()
         self.hide()
-        self.w.hide()
+        if self.w:
+            self.w.hide()
 
     def full_exit(self):
         """Полный выход из приложения при нажатии на кнопку Stop"""
         if self.w:
             self.w.close()
+            self.w.shutdown()
+        self.reminders.stop()
+        self.db.close()
         self.tray_icon.hide()
         QApplication.quit()
 
@@ -185,6 +255,9 @@ db_path = os.path.join(BASE_DIR, 'tasks.db')
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    w = MainWindow()
-    w.show()
+    # --tray: запуск свёрнутым в трей, окна создаются только по запросу
+    tray_only = "--tray" in sys.argv
+    w = MainWindow(tray_only=tray_only)
+    if not tray_only:
+        w.show()
     sys.exit(app.exec())
\ No newline at end of file
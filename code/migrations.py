@@ -0,0 +1,461 @@
+# Миграции схемы БД. Номер последней применённой миграции хранится в PRAGMA user_version,
+# поэтому старые файлы tasks.db обновляются на месте при запуске.
+
+
+def create_tasks(cur):
+    """Основная таблица задач"""
+    cur.execute("""CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        task TEXT NOT NULL,
+        until TEXT,
+        alert TEXT,
+        status TEXT,
+        priority TEXT
+    )""")
+
+
+def create_fts(cur):
+    """Полнотекстовый индекс по заголовку и описанию, синхронизируется триггерами"""
+    cur.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, task, content='tasks', content_rowid='id', tokenize='unicode61'
+    )""")
+    create_fts_triggers(cur)
+    cur.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def create_fts_triggers(cur):
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, task) VALUES (new.id, new.title, new.task);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, task) VALUES ('delete', old.id, old.title, old.task);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, task ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, task) VALUES ('delete', old.id, old.title, old.task);
+        INSERT INTO tasks_fts(rowid, title, task) VALUES (new.id, new.title, new.task);
+    END""")
+
+
+def create_indexes(cur):
+    """Индексы под фильтры списка задач и проверку дедлайнов/оповещений"""
+    # Фильтры по статусу и/или приоритету; rowid в конце индекса сохраняет ORDER BY id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_priority ON tasks(status, priority)")
+    # Только открытые задачи: закрытые не просрочиваются и не напоминают о себе
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_open_until ON tasks(until)
+        WHERE status NOT IN ('Выполнена', 'Отменена')""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_open_alert ON tasks(alert)
+        WHERE status NOT IN ('Выполнена', 'Отменена')""")
+
+
+def create_stats(cur):
+    """Счётчики задач по статусам, поддерживаются триггерами"""
+    cur.execute("""CREATE TABLE IF NOT EXISTS task_stats (
+        status TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )""")
+    create_stats_triggers(cur)
+    cur.execute("DELETE FROM task_stats")
+    cur.execute("""INSERT INTO task_stats(status, count)
+        SELECT IFNULL(status, ''), COUNT(*) FROM tasks GROUP BY IFNULL(status, '')""")
+
+
+def create_stats_triggers(cur):
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS task_stats_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_stats(status, count) VALUES (IFNULL(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS task_stats_ad AFTER DELETE ON tasks BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE status = IFNULL(old.status, '');
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS task_stats_au AFTER UPDATE OF status ON tasks
+        WHEN old.status IS NOT new.status BEGIN
+        UPDATE task_stats SET count = count - 1 WHERE status = IFNULL(old.status, '');
+        INSERT INTO task_stats(status, count) VALUES (IFNULL(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+    END""")
+
+
+def day_column(name):
+    """SQL-выражение: номер дня из строки YYYY-MM-DD, NULL для пустой или неверной даты"""
+    # Модификатор '+0 days' нормализует дату, поэтому 2025-02-30 не совпадёт с исходной строкой
+    return (f"CASE WHEN date({name}, '+0 days') = {name} "
+            f"THEN CAST(julianday({name}) - 2440587.5 AS INTEGER) END")
+
+
+def typed_dates(cur):
+    """Даты until/alert как INTEGER (дни от 1970-01-01) вместо свободного текста.
+
+    SQLite не меняет тип колонки, поэтому таблица пересоздаётся с теми же id,
+    после чего заново создаются её триггеры и индексы.
+    """
+    seq = cur.execute("SELECT seq FROM sqlite_sequence WHERE name='tasks'").fetchone()
+    cur.execute("""CREATE TABLE tasks_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        task TEXT NOT NULL,
+        until INTEGER,
+        alert INTEGER,
+        status TEXT,
+        priority TEXT
+    )""")
+    cur.execute(f"""INSERT INTO tasks_new (id, title, task, until, alert, status, priority)
+        SELECT id, title, task, {day_column('until')}, {day_column('alert')}, status, priority
+        FROM tasks""")
+    cur.execute("DROP TABLE tasks")
+    cur.execute("ALTER TABLE tasks_new RENAME TO tasks")
+    if seq:
+        cur.execute("UPDATE sqlite_sequence SET seq=? WHERE name='tasks'", seq)
+    create_fts_triggers(cur)
+    create_stats_triggers(cur)
+    create_indexes(cur)
+
+
+def sort_indexes(cur):
+    """Индексы под сортировку списка по колонкам (выражения совпадают с task_store.SORT_KEYS).
+
+    Пустые даты идут в конце, приоритет сортируется по рангу, а не по алфавиту.
+    rowid в конце индекса даёт второй ключ сортировки для постраничной загрузки.
+    """
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_title ON tasks(title)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_until_key ON tasks(IFNULL(until, 2147483647))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_alert_key ON tasks(IFNULL(alert, 2147483647))")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_key ON tasks(IFNULL(status, 'В работе'))")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_tasks_priority_rank ON tasks(
+        CASE priority WHEN 'Низкий' THEN 1 WHEN 'Высокий' THEN 3 ELSE 2 END)""")
+
+
+def recurring_series(cur):
+    """Повторяющиеся задачи: правило серии и редкие отметки отдельных повторений (см. recurrence.py)"""
+    cur.execute("""CREATE TABLE IF NOT EXISTS series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        task TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        freq TEXT NOT NULL CHECK (freq IN ('daily', 'weekly', 'monthly')),
+        interval INTEGER NOT NULL DEFAULT 1 CHECK (interval > 0),
+        end_day INTEGER,
+        count INTEGER,
+        alert_offset INTEGER,
+        priority TEXT,
+        alerted_through INTEGER
+    )""")
+    # Строка только у повторений, отмеченных вручную; просрочка вычисляется по дате
+    cur.execute("""CREATE TABLE IF NOT EXISTS series_overrides (
+        series_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        PRIMARY KEY (series_id, day)
+    ) WITHOUT ROWID""")
+
+
+def lemma_index(cur):
+    """Индекс словоформ для поиска (см. morphology.py): леммы задач и очередь задач без лемм.
+
+    Леммы вычисляются в Python, поэтому триггеры только ставят новые и изменённые задачи
+    в очередь; её разбирают TaskStore.lemmatize (при записи) и фоновая обработка.
+    Уже существующие задачи попадают в очередь здесь же.
+    """
+    cur.execute("""CREATE TABLE IF NOT EXISTS task_lemmas (
+        lemma TEXT NOT NULL,
+        task_id INTEGER NOT NULL,
+        PRIMARY KEY (lemma, task_id)
+    ) WITHOUT ROWID""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_task_lemmas_task ON task_lemmas(task_id)")
+    cur.execute("CREATE TABLE IF NOT EXISTS lemma_queue (id INTEGER PRIMARY KEY)")
+    create_lemma_triggers(cur)
+    cur.execute("INSERT OR IGNORE INTO lemma_queue (id) SELECT id FROM tasks")
+
+
+def create_lemma_triggers(cur):
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS lemma_queue_ai AFTER INSERT ON tasks BEGIN
+        INSERT OR IGNORE INTO lemma_queue (id) VALUES (new.id);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS lemma_queue_au AFTER UPDATE OF title, task ON tasks BEGIN
+        INSERT OR IGNORE INTO lemma_queue (id) VALUES (new.id);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS task_lemmas_ad AFTER DELETE ON tasks BEGIN
+        DELETE FROM task_lemmas WHERE task_id = old.id;
+        DELETE FROM lemma_queue WHERE id = old.id;
+    END""")
+
+
+# Номер сегодняшнего дня (как dates.today_day) для триггеров
+TODAY = "CAST(julianday('now', 'localtime') - 2440587.5 AS INTEGER)"
+CLOSED = "('Выполнена', 'Отменена')"
+
+
+def closed_day(cur):
+    """День закрытия задачи (closed): с него отсчитывается срок переноса в архив.
+
+    Ставится и снимается триггерами при смене статуса. Для уже закрытых задач дня
+    закрытия нет, вместо него берётся дедлайн, если он уже прошёл.
+    """
+    cur.execute("ALTER TABLE tasks ADD COLUMN closed INTEGER")
+    cur.execute(f"UPDATE tasks SET closed = MIN(IFNULL(until, {TODAY}), {TODAY}) WHERE status IN {CLOSED}")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_closed ON tasks(closed) WHERE closed IS NOT NULL")
+    create_closed_triggers(cur)
+
+
+def create_closed_triggers(cur):
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS tasks_closed_ai AFTER INSERT ON tasks
+        WHEN new.status IN {CLOSED} AND new.closed IS NULL BEGIN
+        UPDATE tasks SET closed = {TODAY} WHERE id = new.id;
+    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS tasks_closed_au AFTER UPDATE OF status ON tasks
+        WHEN (IFNULL(new.status, '') IN {CLOSED}) != (IFNULL(old.status, '') IN {CLOSED}) BEGIN
+        UPDATE tasks SET closed = CASE WHEN new.status IN {CLOSED} THEN {TODAY} END WHERE id = new.id;
+    END""")
+
+
+def change_log(cur):
+    """Журнал изменений задач: по нему другие экземпляры приложения (и окна поверх той же
+    базы) узнают, какие задачи перечитать (TaskStore.changes_since).
+
+    seq растёт монотонно: записи удаляются только с начала журнала и никогда не все
+    (TaskStore.trim_changes), поэтому ROWID не переиспользуется и без AUTOINCREMENT.
+    """
+    cur.execute("""CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY,
+        task_id INTEGER NOT NULL
+    )""")
+    create_change_triggers(cur)
+
+
+def create_change_triggers(cur):
+    # Первый вид триггеров журнала, с миграции change_days их заменяет create_change_day_triggers
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO change_log (task_id) VALUES (new.id);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO change_log (task_id) VALUES (old.id);
+    END""")
+    # Только видимые поля: день закрытия (closed) меняется вместе со статусом
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_au
+        AFTER UPDATE OF title, task, until, alert, status, priority ON tasks BEGIN
+        INSERT INTO change_log (task_id) VALUES (new.id);
+    END""")
+
+
+def is_open(row):
+    """SQL-выражение: 1, если задача row (new или old в триггере) не закрыта"""
+    return f"(IFNULL({row}.status, '') NOT IN {CLOSED})"
+
+
+def is_overdue(row):
+    return f"(IFNULL({row}.status, '') = 'Просрочена')"
+
+
+def is_done(row):
+    return f"(IFNULL({row}.status, '') = 'Выполнена')"
+
+
+def task_history(cur):
+    """История задач для графиков на вкладке статистики.
+
+    У задачи - день создания (created) и день последней смены статуса (changed), день
+    закрытия уже есть (closed). Сводка по дням daily_stats ведётся триггерами при каждом
+    изменении: сколько задач создано и выполнено за день и на сколько изменилось число
+    открытых и просроченных. Число открытых задач на любой прошедший день - сегодняшнее
+    минус изменения после него (TaskStore.daily_history), поэтому графики за год читают
+    не больше 366 строк сводки, а не все задачи. Для уже существующих задач прошлое
+    неизвестно: история начинается с дня миграции.
+    """
+    cur.execute("ALTER TABLE tasks ADD COLUMN created INTEGER")
+    cur.execute("ALTER TABLE tasks ADD COLUMN changed INTEGER")
+    cur.execute("""CREATE TABLE IF NOT EXISTS daily_stats (
+        day INTEGER PRIMARY KEY,
+        created INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        open_delta INTEGER NOT NULL DEFAULT 0,
+        overdue_delta INTEGER NOT NULL DEFAULT 0
+    )""")
+    create_history_triggers(cur)
+    cur.execute(f"INSERT OR IGNORE INTO daily_stats (day) VALUES ({TODAY})")
+
+
+def add_to_day(created, done, open_delta, overdue_delta):
+    """SQL: прибавление к сегодняшней строке daily_stats"""
+    return f"""INSERT INTO daily_stats (day, created, done, open_delta, overdue_delta)
+        VALUES ({TODAY}, {created}, {done}, {open_delta}, {overdue_delta})
+        ON CONFLICT(day) DO UPDATE SET created = created + excluded.created, done = done + excluded.done,
+            open_delta = open_delta + excluded.open_delta, overdue_delta = overdue_delta + excluded.overdue_delta;"""
+
+
+def create_history_triggers(cur):
+    # Задачи, вставленные с готовым днём создания (отмена удаления, возврат из архива), - не новые
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS tasks_created_ai AFTER INSERT ON tasks
+        WHEN new.created IS NULL BEGIN
+        UPDATE tasks SET created = {TODAY}, changed = {TODAY} WHERE id = new.id;
+    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS daily_stats_ai AFTER INSERT ON tasks BEGIN
+        {add_to_day('new.created IS NULL', 0, is_open('new'), is_overdue('new'))}
+    END""")
+    # Первый вид: выполненные только прибавляются, его заменяют миграции done_reopened и done_on_closed_day
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS daily_stats_au AFTER UPDATE OF status ON tasks
+        WHEN old.status IS NOT new.status BEGIN
+        UPDATE tasks SET changed = {TODAY} WHERE id = new.id;
+        {add_to_day(0, "IFNULL(new.status, '') = 'Выполнена'", f"{is_open('new')} - {is_open('old')}",
+                    f"{is_overdue('new')} - {is_overdue('old')}")}
+    END""")
+    # Перенос в архив удаляет только закрытые задачи и сводку не меняет
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS daily_stats_ad AFTER DELETE ON tasks
+        WHEN {is_open('old')} BEGIN
+        {add_to_day(0, 0, -1, f"-{is_overdue('old')}")}
+    END""")
+
+
+def change_days(cur):
+    """Дни дедлайна и оповещения изменённой задачи в журнале изменений: до и после изменения.
+
+    По ним календарь и лента убирают из кэша только диапазоны с этими днями
+    (TaskStore.changed_days); изменения задач без дат кэш не трогают.
+    """
+    for column in ('until', 'alert', 'old_until', 'old_alert'):
+        cur.execute(f"ALTER TABLE change_log ADD COLUMN {column} INTEGER")
+    for name in ('change_log_ai', 'change_log_ad', 'change_log_au'):
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    create_change_day_triggers(cur)
+
+
+def create_change_day_triggers(cur):
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO change_log (task_id, until, alert) VALUES (new.id, new.until, new.alert);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO change_log (task_id, old_until, old_alert) VALUES (old.id, old.until, old.alert);
+    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS change_log_au
+        AFTER UPDATE OF title, task, until, alert, status, priority ON tasks BEGIN
+        INSERT INTO change_log (task_id, until, alert, old_until, old_alert)
+        VALUES (new.id, new.until, new.alert, old.until, old.alert);
+    END""")
+
+
+def done_reopened(cur):
+    """Выполненные за день в сводке daily_stats уменьшаются, когда выполненную задачу снова открывают
+    (в том числе отменой массовой смены статуса): смена статуса туда и обратно сводку не меняет.
+    Вычитает из сегодняшнего дня, миграция done_on_closed_day заменяет триггер.
+    """
+    cur.execute("DROP TRIGGER IF EXISTS daily_stats_au")
+    cur.execute(f"""CREATE TRIGGER daily_stats_au AFTER UPDATE OF status ON tasks
+        WHEN old.status IS NOT new.status BEGIN
+        UPDATE tasks SET changed = {TODAY} WHERE id = new.id;
+        {add_to_day(0, f"{is_done('new')} - {is_done('old')}", f"{is_open('new')} - {is_open('old')}",
+                    f"{is_overdue('new')} - {is_overdue('old')}")}
+    END""")
+
+
+def done_on_closed_day(cur):
+    """Снова открытая выполненная задача вычитается из выполненных в день, когда её выполнили
+    (old.changed), а не сегодня: выполненные за день в сводке - задачи, выполненные в этот день
+    и так и оставшиеся выполненными. У задач, выполненных до начала истории, строки сводки нет.
+    """
+    cur.execute("DROP TRIGGER IF EXISTS daily_stats_au")
+    cur.execute(f"""CREATE TRIGGER daily_stats_au AFTER UPDATE OF status ON tasks
+        WHEN old.status IS NOT new.status BEGIN
+        UPDATE tasks SET changed = {TODAY} WHERE id = new.id;
+        UPDATE daily_stats SET done = done - 1 WHERE day = old.changed AND {is_done('old')};
+        {add_to_day(0, is_done('new'), f"{is_open('new')} - {is_open('old')}",
+                    f"{is_overdue('new')} - {is_overdue('old')}")}
+    END""")
+
+
+# Порядок менять нельзя, новые миграции добавляются только в конец
+MIGRATIONS = [
+    create_tasks,
+    create_fts,
+    create_indexes,
+    create_stats,
+    typed_dates,
+    sort_indexes,
+    recurring_series,
+    lemma_index,
+    closed_day,
+    change_log,
+    task_history,
+    change_days,
+    done_reopened,
+    done_on_closed_day,
+]
+
+
+def archive_schema(cur):
+    """Архив закрытых задач (отдельный файл, подключается через ATTACH, см. TaskStore.archive_closed).
+
+    Задачи хранятся с теми же id, что были в tasks; полнотекстовый индекс, счётчики
+    по статусам, индексы сортировки и леммы - как у основной таблицы.
+    """
+    cur.execute("""CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        task TEXT NOT NULL,
+        until INTEGER,
+        alert INTEGER,
+        status TEXT,
+        priority TEXT,
+        closed INTEGER
+    )""")
+    create_fts(cur)
+    create_indexes(cur)
+    create_stats(cur)
+    sort_indexes(cur)
+    cur.execute("""CREATE TABLE IF NOT EXISTS task_lemmas (
+        lemma TEXT NOT NULL,
+        task_id INTEGER NOT NULL,
+        PRIMARY KEY (lemma, task_id)
+    ) WITHOUT ROWID""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_task_lemmas_task ON task_lemmas(task_id)")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS task_lemmas_ad AFTER DELETE ON tasks BEGIN
+        DELETE FROM task_lemmas WHERE task_id = old.id;
+    END""")
+
+
+def archive_history(cur):
+    """Дни создания и смены статуса у задач архива (см. task_history)"""
+    cur.execute("ALTER TABLE tasks ADD COLUMN created INTEGER")
+    cur.execute("ALTER TABLE tasks ADD COLUMN changed INTEGER")
+
+
+def archive_moves(cur):
+    """Задачи, переносимые между файлами (TaskStore.archive_closed и unarchive): запись о переносе
+    фиксируется вместе с копией в архиве, по ней после сбоя находятся задачи, оставшиеся в обоих файлах
+    """
+    cur.execute("CREATE TABLE IF NOT EXISTS moving (id INTEGER PRIMARY KEY)")
+
+
+# Миграции файла архива, версия - в его собственном user_version
+ARCHIVE_MIGRATIONS = [
+    archive_schema,
+    archive_history,
+    archive_moves,
+]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Применение всех ещё не применённых миграций, каждая в своей транзакции.
+
+    Версия перечитывается внутри BEGIN IMMEDIATE, поэтому два соединения,
+    открытые одновременно (например, окно и cli.py), не применят миграцию дважды.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(migrations):
+        return
+    while True:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(migrations):
+            conn.rollback()
+            break
+        try:
+            migrations[version](cur)
+            cur.execute(f"PRAGMA user_version = {version + 1}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    # Статистика для планировщика запросов, чтобы он выбирал новые индексы
+    conn.execute("ANALYZE")
+    conn.commit()
@@ -0,0 +1,76 @@
+import re
+import json
+from functools import lru_cache
+
+# Поиск по словоформам: заголовок и описание задачи раскладываются на леммы (начальные формы слов)
+# один раз при записи, леммы лежат в индексированной таблице task_lemmas. «купил», «куплю» и
+# «купить» дают одну лемму «купить». Однокоренные слова других частей речи («покупка»)
+# - отдельные леммы, их поиск по словоформам не объединяет.
+
+WORD = re.compile(r'\w+')
+# Сколько задач лемматизируется за один шаг фоновой обработки (и одну транзакцию): ~10 мс
+# в потоке БД, поэтому запросы интерфейса между шагами почти не ждут
+BACKFILL_BATCH = 200
+# Сколько разных слов помнит кэш лемм
+CACHE_SIZE = 65536
+
+_analyzer = None
+
+
+def analyzer():
+    """Морфологический анализатор pymorphy3; словари загружаются при первом обращении (~0.2 с)"""
+    global _analyzer
+    if _analyzer is None:
+        import pymorphy3
+        _analyzer = pymorphy3.MorphAnalyzer()
+    return _analyzer
+
+
+def normalize(word):
+    """Слово в нижнем регистре и с «е» вместо «ё»: так его пишут не всегда"""
+    return word.lower().replace('ё', 'е')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def word_lemmas(word):
+    """Все возможные леммы слова: при неоднозначном разборе («стали» - «сталь» и «стать») - каждая"""
+    word = normalize(word)
+    if not word.isalpha():
+        return (word,)
+    return tuple(sorted({normalize(parse.normal_form) for parse in analyzer().parse(word)}))
+
+
+def text_lemmas(*texts):
+    """Множество лемм всех слов текстов"""
+    lemmas = set()
+    for text in texts:
+        for word in WORD.findall(text or ''):
+            lemmas.update(word_lemmas(word))
+    return lemmas
+
+
+def lemmas_json(word):
+    """Леммы слова JSON-массивом: SQL-функция word_lemmas(), её результат читается через json_each()"""
+    return json.dumps(word_lemmas(word), ensure_ascii=False)
+
+
+def query_words(text):
+    """Слова поискового запроса в нормальном виде"""
+    return [normalize(word) for word in WORD.findall(text)]
+
+
+def backfill(store, progress=None):
+    """Лемматизация всей очереди lemma_queue за один вызов (консольная утилита), возвращает число задач.
+
+    Приложение разбирает очередь по шагам в потоке БД (Database.submit_batches).
+    """
+    total = store.lemma_backlog()
+    done = 0
+    while done < total:
+        count = store.lemmatize_queued(BACKFILL_BATCH)
+        if not count:
+            break
+        done += count
+        if progress is not None:
+            progress(done, total)
+    return done
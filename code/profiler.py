@@ -0,0 +1,168 @@
+import os
+import re
+import sys
+import math
+import time
+import atexit
+import sqlite3
+import threading
+
+# Профилирование SQL и обновлений интерфейса. Включается переменной окружения
+# TASKPLANNER_PROFILE=1; выключенное ничего не стоит: соединения создаются обычные,
+# а в горячих местах остаётся одна проверка ENABLED.
+ENABLED = os.environ.get('TASKPLANNER_PROFILE', '') not in ('', '0')
+# Запросы дольше SLOW_MS попадают в журнал медленных запросов вместе с планом (EXPLAIN QUERY PLAN)
+SLOW_MS = float(os.environ.get('TASKPLANNER_SLOW_MS', '50'))
+SLOW_LOG = os.environ.get('TASKPLANNER_SLOW_LOG') or os.path.join(os.path.dirname(__file__), 'slow_queries.log')
+# Гистограмма в логарифмических корзинах: 8 корзин на удвоение, погрешность перцентилей ~9%
+BUCKETS_PER_OCTAVE = 8
+PLANNED = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+class Histogram:
+    """Количество, сумма, максимум и распределение длительностей (в памяти - только корзины)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        us = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(us) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, p):
+        """Перцентиль в секундах (верхняя граница корзины, не больше максимума)"""
+        rank = self.count * p / 100
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE) / 1e6, self.max)
+        return self.max
+
+
+class Profiler:
+    """Замеры по категориям: sql (отдельные запросы), db (задачи потока БД), ui (обработка результатов)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.planned = set()
+
+    def record(self, kind, name, seconds):
+        with self.lock:
+            hist = self.stats.get((kind, name))
+            if hist is None:
+                hist = self.stats[(kind, name)] = Histogram()
+            hist.add(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+    def report(self):
+        """Строки (категория, имя, количество, p50, p95, p99, максимум, сумма), время в мс, по убыванию суммы"""
+        with self.lock:
+            items = list(self.stats.items())
+        rows = [(kind, name, hist.count,
+                 hist.percentile(50) * 1000, hist.percentile(95) * 1000, hist.percentile(99) * 1000,
+                 hist.max * 1000, hist.total * 1000)
+                for (kind, name), hist in items]
+        rows.sort(key=lambda row: -row[7])
+        return rows
+
+    def format_report(self):
+        lines = [f"{'тип':<5} {'кол-во':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'макс':>9} {'всего':>10}  имя"]
+        for kind, name, count, p50, p95, p99, top, total in self.report():
+            lines.append(f"{kind:<5} {count:>8} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {top:>9.2f} {total:>10.1f}  {name}")
+        return "\n".join(lines)
+
+    def statement(self, conn, sql, params, seconds):
+        """Учёт выполненного запроса; медленный запрос пишется в журнал"""
+        self.record('sql', normalize(sql), seconds)
+        if seconds * 1000 >= SLOW_MS:
+            self.log_slow(conn, sql, params, seconds)
+
+    def log_slow(self, conn, sql, params, seconds):
+        """Запись медленного запроса; план запроса - только при первой встрече этого текста"""
+        key = normalize(sql)
+        plan = None
+        with self.lock:
+            first = key not in self.planned
+            self.planned.add(key)
+        if first and key.upper().startswith(PLANNED):
+            try:
+                rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                plan = "\n".join("    " + row[-1] for row in rows)
+            except sqlite3.Error as e:
+                plan = f"    (план недоступен: {e})"
+        text = f"{time.strftime('%Y-%m-%d %H:%M:%S')} {seconds * 1000:.1f} мс\n  {key}\n"
+        if params:
+            text += f"  параметры: {str(params)[:200]}\n"
+        if plan:
+            text += plan + "\n"
+        with self.lock:
+            with open(SLOW_LOG, 'a', encoding='utf-8') as f:
+                f.write(text + "\n")
+
+
+def normalize(sql):
+    """Текст запроса в одну строку: одинаковые запросы собираются в одну гистограмму"""
+    return re.sub(r'\s+', ' ', sql).strip()[:300]
+
+
+profiler = Profiler()
+
+
+def record(kind, name, seconds):
+    profiler.record(kind, name, seconds)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор с замером execute/executemany (для SELECT - до первой строки результата)"""
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            profiler.statement(self.connection, sql, params, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_params):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            # Пачки в журнал медленных запросов не пишутся: их время складывается из многих строк
+            profiler.record('sql', normalize(sql) + " [executemany]", time.perf_counter() - started)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def connection_factory():
+    """Класс соединения для sqlite3.connect(factory=...)"""
+    return ProfiledConnection if ENABLED else sqlite3.Connection
+
+
+def dump():
+    if profiler.stats:
+        print(profiler.format_report(), file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(dump)
@@ -0,0 +1,82 @@
+from collections import namedtuple
+from datetime import date
+from dates import EPOCH, day_to_date
+
+# Повторяющиеся задачи: правило хранится одной строкой серии (таблица series),
+# отдельные повторения не хранятся, а вычисляются для нужного диапазона дат.
+# В БД лежат только отметки отдельных повторений (series_overrides): выполнено, отменено.
+
+FREQUENCIES = {'daily': 'Ежедневно', 'weekly': 'Еженедельно', 'monthly': 'Ежемесячно'}
+
+# start - день первого повторения (его дедлайн); end_day - последний допустимый день или None;
+# count - число повторений или None; alert_offset - за сколько дней до повторения оповещать (None - без оповещения);
+# alerted_through - день последнего повторения, оповещение по которому уже показано
+Series = namedtuple('Series', 'id title task start freq interval end_day count alert_offset priority alerted_through')
+SERIES_COLUMNS = "id, title, task, start, freq, interval, end_day, count, alert_offset, priority, alerted_through"
+
+
+def add_months(d, months):
+    """Дата через months месяцев; число месяца ограничивается его длиной (31 января -> 28/29 февраля)"""
+    month = d.month - 1 + months
+    year = d.year + month // 12
+    month = month % 12 + 1
+    for day in (d.day, 30, 29, 28):
+        try:
+            return date(year, month, day)
+        except ValueError:
+            continue
+
+
+def nth(series, n):
+    """День n-го повторения (с нуля)"""
+    if series.freq == 'monthly':
+        return (add_months(day_to_date(series.start), n * series.interval) - EPOCH).days
+    step = series.interval * (7 if series.freq == 'weekly' else 1)
+    return series.start + n * step
+
+
+def first_index(series, first):
+    """Номер первого повторения не раньше дня first - без перебора предыдущих"""
+    if first <= series.start:
+        return 0
+    if series.freq == 'monthly':
+        start, target = day_to_date(series.start), day_to_date(first)
+        months = (target.year - start.year) * 12 + target.month - start.month
+        n = max(months // series.interval - 1, 0)
+        while nth(series, n) < first:
+            n += 1
+        return n
+    step = series.interval * (7 if series.freq == 'weekly' else 1)
+    return -(-(first - series.start) // step)
+
+
+def occurrences(series, first, last):
+    """Дни повторений серии в диапазоне [first, last] (номера дней), по одному по мере запроса"""
+    n = first_index(series, first)
+    if series.freq != 'monthly':
+        # Шаг в днях постоянный: повторения - арифметическая прогрессия, конец - по last, end_day и count
+        step = series.interval * (7 if series.freq == 'weekly' else 1)
+        if series.end_day is not None:
+            last = min(last, series.end_day)
+        if series.count is not None:
+            last = min(last, nth(series, series.count - 1))
+        yield from range(nth(series, n), last + 1, step)
+        return
+    while series.count is None or n < series.count:
+        day = nth(series, n)
+        if day > last or (series.end_day is not None and day > series.end_day):
+            return
+        yield day
+        n += 1
+
+
+def describe(series):
+    """Правило повтора для интерфейса: «Еженедельно», «Каждые 3 дн., 10 раз»"""
+    if series.interval == 1:
+        text = FREQUENCIES[series.freq]
+    else:
+        unit = {'daily': 'дн.', 'weekly': 'нед.', 'monthly': 'мес.'}[series.freq]
+        text = f"Каждые {series.interval} {unit}"
+    if series.count is not None:
+        text += f", {series.count} раз"
+    return text
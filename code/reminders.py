@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QMessageBox
+from scheduler import DeadlineScheduler
+from task_store import TaskStore, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH, COMPACT_PAGES
+from db_worker import JobThread
+import dates
+import morphology
+import backup
+
+# Как часто проверяется, не изменили ли задачи другие соединения с той же базой
+CHANGES_POLL_MS = 1000
+
+
+class Reminders(QObject):
+    """Оповещения и дедлайны задач.
+
+    Живут на уровне приложения, а не окна задач: напоминания приходят, даже если
+    окно «Все задачи» ещё ни разу не открывалось (например, при запуске в трей).
+
+    Через них же проходят результаты изменений задач: по сигналам task_saved и
+    task_deleted окно задач обновляет одну строку, по tasks_changed (проверка сроков
+    изменила задачи, возможно многие) - перезагружает список. series_changed - изменились
+    повторяющиеся задачи или наступил новый день (повторения пересчитываются).
+
+    Изменения из других соединений (второй экземпляр приложения, cli.py) приходят
+    теми же сигналами, перед ними - external_changed: запросы по нему (дни изменений
+    для календаря) выполняются раньше запросов строк и не задерживают их показ.
+
+    При запуске и в полночь они же запускают обслуживание БД (maintain) и, если пора,
+    снимок базы (backup.py).
+    """
+    task_saved = pyqtSignal(object)
+    task_deleted = pyqtSignal(int)
+    tasks_changed = pyqtSignal()
+    series_changed = pyqtSignal()
+    external_changed = pyqtSignal()
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        # Вместо опроса БД по таймеру: один таймер до ближайшего оповещения/дедлайна
+        self.scheduler = DeadlineScheduler(self)
+        self.scheduler.fired.connect(self.on_scheduler_fired)
+        # В полночь: проверка сроков нового дня и оповещения повторений на следующие дни
+        self.day_timer = QTimer(self)
+        self.day_timer.setSingleShot(True)
+        self.day_timer.timeout.connect(self.on_new_day)
+        # Опрос журнала изменений: без коммитов других соединений - одна прагма в потоке БД
+        self.changes_timer = QTimer(self)
+        self.changes_timer.setInterval(CHANGES_POLL_MS)
+        self.changes_timer.timeout.connect(self.poll_changes)
+        self.seen_change = None
+        self.backup_job = None
+        # И сразу после своих коммитов: пока чужих нет, журнал пропускается до конца, а не
+        # перечитывается вместе с ними при следующем чужом коммите
+        self.db.committed.connect(self.poll_changes)
+
+    def start(self):
+        """Проверка сроков на сегодня и постановка будущих событий в планировщик"""
+        self.check_until_alert_date()
+        self.schedule_all()
+        midnight = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+        self.day_timer.start(int((midnight - datetime.now()).total_seconds() * 1000) + 1000)
+        if not self.changes_timer.isActive():
+            self.poll_changes()
+            self.changes_timer.start()
+
+    def stop(self):
+        self.scheduler.clear()
+        self.day_timer.stop()
+        self.changes_timer.stop()
+        if self.backup_job is not None:
+            self.backup_job.cancel()
+            self.backup_job.wait()
+
+    def on_new_day(self):
+        self.start()
+        self.series_changed.emit()
+        self.maintain()
+
+    def maintain(self):
+        """Фоновое обслуживание БД по шагам в потоке БД: леммы задач из очереди, перенос
+        давно закрытых задач в архив, сжатие файлов, затем снимок по расписанию"""
+        self.db.submit_write(TaskStore.trim_changes)
+        # Шаги ниже ждут паузы в работе с окном; проверка сроков и сокращение журнала
+        # коммитятся сразу, а не через FLUSH_DELAY_MS
+        self.db.flush()
+        self.db.submit_batches(TaskStore.lemmatize_queued, morphology.BACKFILL_BATCH)
+        if ARCHIVE_AFTER_DAYS:
+            self.db.submit_batches(TaskStore.archive_closed, dates.today_day() - ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH,
+                                   callback=self.on_archived)
+        else:
+            self.on_archived(0)
+
+    def on_archived(self, count):
+        if count:
+            self.tasks_changed.emit()
+        self.db.submit_batches(TaskStore.compact, COMPACT_PAGES, callback=self.on_compacted)
+
+    def on_compacted(self, _pages):
+        if self.backup_job is None and backup.due(self.db.db_path):
+            # Свой поток и своё соединение: очередь потока БД снимок не занимает
+            self.backup_job = JobThread(self.db.db_path, backup.take_snapshot, parent=self)
+            self.backup_job.finished.connect(self.on_backup_finished)
+            # Ошибка снимка показывается как ошибка запроса к БД
+            self.backup_job.failed.connect(self.db.error)
+            self.backup_job.start()
+
+    def on_backup_finished(self):
+        self.backup_job.deleteLater()
+        self.backup_job = None
+
+    def check_until_alert_date(self):
+        """Проверка на наличие уведомлений, если есть, вывести на экран, а так же проверка на просроченные задания"""
+        today = dates.today_day()
+        self.db.submit_write(TaskStore.check_due, today, callback=self.on_due_checked)
+
+    def on_due_checked(self, result):
+        """Показ напоминаний после проверки сроков"""
+        titles, changed = result
+        if changed:
+            self.tasks_changed.emit()
+        for title in titles:
+            QMessageBox.information(None, 'Напоминание', f'Сегодня оповещение по задаче:\n\n«{title}»')
+
+    def schedule_all(self):
+        """Постановка в планировщик будущих оповещений и дедлайнов открытых задач"""
+        today = dates.today_day()
+        self.db.submit(TaskStore.scheduled_events, today, callback=self.on_scheduled_events)
+
+    def on_scheduled_events(self, rows):
+        self.scheduler.clear()
+        self.scheduler.schedule_many(rows)
+
+    def on_scheduler_fired(self, alerts, overdue):
+        """Обработка наступивших оповещений и дедлайнов (только указанные задачи)"""
+        today = dates.today_day()
+        self.db.submit_write(TaskStore.apply_fired, alerts, overdue, today, callback=self.on_due_checked)
+
+    def on_task_saved(self, row):
+        """Задача создана или изменена: перепланировать её события"""
+        if row is None:
+            # Задачу успели удалить
+            return
+        _id, title, task, until, alert, status, priority = row
+        self.scheduler.schedule(_id, alert, until, status)
+        self.task_saved.emit(row)
+
+    def on_tasks_changed(self, _result=None):
+        """Массовое изменение задач: проверка сроков и перепланирование всех событий"""
+        self.start()
+
+    def on_replaced(self):
+        """Задачи и серии заменены целиком (восстановление из копии): всё перечитывается и перепланируется"""
+        self.start()
+        self.tasks_changed.emit()
+        self.series_changed.emit()
+
+    def on_series_changed(self, _result=None):
+        """Серия создана, удалена или отмечено повторение: перепланировать оповещения"""
+        self.schedule_all()
+        self.series_changed.emit()
+
+    def on_task_deleted(self, task_id):
+        self.scheduler.unschedule(task_id)
+        self.task_deleted.emit(task_id)
+
+    def poll_changes(self):
+        self.db.submit(TaskStore.changes_since, self.seen_change, callback=self.on_changes, channel='changes')
+
+    def on_changes(self, result):
+        """Задачи, изменённые другими соединениями: по одной, как свои, или перезагрузка всего списка"""
+        self.seen_change, changes = result
+        if changes is None:
+            self.schedule_all()
+            self.tasks_changed.emit()
+            return
+        if not changes:
+            return
+        self.external_changed.emit()
+        for task_id, row in changes:
+            if row is None:
+                self.on_task_deleted(task_id)
+            else:
+                self.on_task_saved(row)
@@ -0,0 +1,119 @@
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from dates import day_to_date, today_day
+from task_store import CLOSED_STATUSES
+# QTimer принимает интервал в мс типа int, поэтому дольше суток не спим, а пересчитываем
+MAX_WAIT_MS = 24 * 60 * 60 * 1000
+
+
+class DeadlineScheduler(QObject):
+    """Планировщик оповещений и дедлайнов.
+
+    Хранит кучу ближайших событий и спит на одном однократном таймере до самого раннего из них.
+    Устаревшие записи в куче не удаляются сразу, а пропускаются при извлечении.
+    """
+    # Списки ключей (id задач или task_store.event_key повторений): у которых наступило оповещение
+    # и у которых прошёл дедлайн
+    fired = pyqtSignal(list, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.heap = []
+        self.planned = {}
+        self.live = 0
+        self.counter = itertools.count()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.on_timeout)
+
+    def schedule(self, task_id, alert, until, status):
+        """Постановка или перепостановка событий задачи"""
+        self.plan(task_id, alert, until, status)
+        self.compact()
+        self.arm()
+
+    def schedule_many(self, rows):
+        """Постановка событий для строк (id, alert, until, status) с одним перезапуском таймера"""
+        for task_id, alert, until, status in rows:
+            self.plan(task_id, alert, until, status)
+        self.compact()
+        self.arm()
+
+    def unschedule(self, task_id):
+        """Снятие всех событий задачи"""
+        self.live -= len(self.planned.pop(task_id, {}))
+        self.arm()
+
+    def clear(self):
+        """Снятие всех событий"""
+        self.heap = []
+        self.planned = {}
+        self.live = 0
+        self.timer.stop()
+
+    def plan(self, task_id, alert, until, status):
+        """Расчёт моментов событий задачи (даты - номера дней) и добавление их в кучу"""
+        self.live -= len(self.planned.pop(task_id, {}))
+        if status in CLOSED_STATUSES:
+            return
+        events = {}
+        # Прошедшие оповещения не показываются, как и раньше
+        if alert is not None and alert >= today_day():
+            events['alert'] = datetime.combine(day_to_date(alert), datetime.min.time())
+        if until is not None and status != 'Просрочена':
+            # Задача становится просроченной в полночь следующего дня после дедлайна
+            events['until'] = datetime.combine(day_to_date(until) + timedelta(days=1), datetime.min.time())
+        if not events:
+            return
+        # У события - номер его записи в куче: после возврата к прежнему времени старая запись не оживает
+        for kind, when in events.items():
+            events[kind] = (when, next(self.counter))
+            heapq.heappush(self.heap, events[kind] + (task_id, kind))
+        self.planned[task_id] = events
+        self.live += len(events)
+
+    def is_live(self, entry):
+        """Запись кучи всё ещё актуальна (задачу не меняли и не удаляли)"""
+        when, seq, task_id, kind = entry
+        return self.planned.get(task_id, {}).get(kind) == (when, seq)
+
+    def compact(self):
+        """Пересборка кучи, когда устаревших записей стало больше, чем актуальных"""
+        if len(self.heap) > 2 * self.live + 64:
+            self.heap = [entry for entry in self.heap if self.is_live(entry)]
+            heapq.heapify(self.heap)
+
+    def arm(self):
+        """Перезапуск таймера на время самого раннего актуального события"""
+        while self.heap and not self.is_live(self.heap[0]):
+            heapq.heappop(self.heap)
+        if not self.heap:
+            self.timer.stop()
+            return
+        delay = (self.heap[0][0] - datetime.now()).total_seconds() * 1000
+        self.timer.start(int(min(max(delay, 0), MAX_WAIT_MS)))
+
+    def on_timeout(self):
+        """Извлечение всех наступивших событий одним пакетом"""
+        now = datetime.now()
+        alerts = []
+        overdue = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if not self.is_live(entry):
+                continue
+            _, _, task_id, kind = entry
+            events = self.planned[task_id]
+            del events[kind]
+            self.live -= 1
+            if not events:
+                del self.planned[task_id]
+            if kind == 'alert':
+                alerts.append(task_id)
+            else:
+                overdue.append(task_id)
+        self.arm()
+        if alerts or overdue:
+            self.fired.emit(alerts, overdue)
@@ -1,47 +1,106 @@
-import sqlite3
-import csv
-from datetime import datetime
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QTableWidget, QTableWidgetItem, QMessageBox, QDialog,
-    QLineEdit, QLabel, QHeaderView, QComboBox, QTabWidget, QFileDialog, QProgressBar
+    QTableView, QMessageBox, QDialog,
+    QLineEdit, QLabel, QHeaderView, QComboBox, QTabWidget, QFileDialog, QProgressBar, QProgressDialog,
+    QTableWidget, QTableWidgetItem, QToolButton, QMenu, QInputDialog, QCheckBox
 )
 from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtCharts import QChart, QChartView, QPieSeries
+from PyQt6.QtGui import QKeySequence, QShortcut
+from task_model import TaskTableModel, OccurrenceTableModel
+from calendar_view import CalendarView, TimelineView
+from trend_view import TrendView
+from reminders import Reminders
+from db_worker import Database, JobThread
+from task_store import TaskStore, STATUSES, PRIORITIES, ARCHIVE_AFTER_DAYS
+import dates
+import profiler
+import backup
+
+# QtCharts, exporter и importer (с xlsxwriter) импортируются при первом использовании:
+# окно задач и без них открывается быстрее.
+
+# Сколько массовых изменений можно отменить
+UNDO_LIMIT = 20
+# Сколько дней показывает вкладка повторяющихся задач
+SERIES_WINDOW_DAYS = 14
 
 
 class SecondWindow(QWidget):
-    def __init__(self, db_path='tasks.db', tray=None):
+    def __init__(self, db_path='tasks.db', tray=None, db=None, reminders=None):
         super().__init__()
         self.db_path = db_path
         self.tray = tray
-        self.conn = None
+        self.db = db
+        self.reminders = reminders
+        # Поток БД и напоминания обычно общие с главным окном; без них окно заводит свои
+        self.owns_db = db is None
         self.current_status_filter = "Все"
         self.current_priority_filter = "Все"
+        # Статистика пересчитывается только на видимой вкладке
+        self.stats_dirty = True
+        self.series_dirty = True
+        self.pie = None
+        # Снимки прежних значений для отмены массовых изменений: (название, Snapshot)
+        self.undo_stack = []
+        # Последняя прочитанная запись журнала изменений для календаря и ленты (TaskStore.changed_days)
+        self.seen_days = None
 
         self.init_db()
         self.initUI()
         self.load_tasks()
         self.update_stats()
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.check_notifications)
-        self.timer.start(10000)
+        if self.reminders is None:
+            self.reminders = Reminders(self.db, self)
+            self.reminders.start()
+            # Фоновое обслуживание БД (обычно его запускает главное окно)
+            self.reminders.maintain()
+        # Изменение одной задачи обновляет одну строку таблицы, а не весь список
+        self.reminders.task_saved.connect(self.on_task_saved)
+        self.reminders.task_deleted.connect(self.on_task_deleted)
+        self.reminders.tasks_changed.connect(self.load_tasks)
+        self.reminders.series_changed.connect(self.load_series)
+        # Графики истории показывают сводку до сегодняшнего дня: любая запись или новый день делает её устаревшей
+        self.db.committed.connect(self.trends.invalidate)
+        self.reminders.tasks_changed.connect(self.trends.invalidate)
+        self.reminders.external_changed.connect(self.trends.invalidate)
+        # Календарь и лента кэшируют показанные диапазоны дней: после записи убираются только диапазоны
+        # с днями изменённых задач, изменения задач без дат кэш не трогают; серии и новый день - весь кэш
+        self.db.committed.connect(self.poll_days)
+        # Перенос задач в архив идёт мимо общей транзакции и сигнала committed, как и изменения
+        # из других экземпляров приложения
+        self.reminders.tasks_changed.connect(self.poll_days)
+        self.reminders.external_changed.connect(self.poll_days)
+        for view in (self.calendar, self.timeline, self.trends):
+            self.reminders.series_changed.connect(view.invalidate)
+        self.poll_days()
+
+    def poll_days(self):
+        self.db.submit(TaskStore.changed_days, self.seen_days, callback=self.on_changed_days, channel='days')
+
+    def on_changed_days(self, result):
+        self.seen_days, days = result
+        self.calendar.drop_days(days)
+        self.timeline.drop_days(days)
 
     def init_db(self):
-        """Инициализация и создание новой БД(Если её нет)"""
-        self.conn = sqlite3.connect(self.db_path)
-        cur = self.conn.cursor()
-        cur.execute("""CREATE TABLE IF NOT EXISTS tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            task TEXT NOT NULL,
-            until TEXT,
-            alert TEXT,
-            status TEXT,
-            priority TEXT
-        )""")
-        self.conn.commit()
+        """Подключение к потоку БД; схема обновляется до последней версии при первом запросе"""
+        if self.owns_db:
+            self.db = Database(self.db_path, self)
+            self.db.error.connect(self.on_db_error)
+
+    def on_db_error(self, message):
+        """Ошибка запроса в потоке БД"""
+        QMessageBox.warning(self, "Ошибка БД", message.strip().splitlines()[-1])
+
+    def shutdown(self):
+        """Завершение фоновых операций (и своего потока БД) перед выходом из приложения"""
+        for job in self.findChildren(JobThread):
+            job.cancel()
+            job.wait()
+        if self.owns_db:
+            self.reminders.stop()
+            self.db.close()
 
     def initUI(self):
         """Инициализация интерфейса с вкладками"""
@@ -50,13 +109,29 @@ class SecondWindow(QWidget):
 
         self.tabs = QTabWidget()
         self.tab_tasks = QWidget()
+        self.tab_series = QWidget()
         self.tab_stats = QWidget()
+        # Календарь и лента загружают данные сами при показе своей вкладки
+        self.calendar = CalendarView(self.db)
+        self.timeline = TimelineView(self.db)
+        self.calendar.day_activated.connect(self.show_timeline_day)
 
         self.tabs.addTab(self.tab_tasks, "Задачи")
+        self.tabs.addTab(self.tab_series, "Повторяющиеся")
+        self.tabs.addTab(self.calendar, "Календарь")
+        self.tabs.addTab(self.timeline, "Лента")
         self.tabs.addTab(self.tab_stats, "Статистика")
+        self.tabs.currentChanged.connect(self.on_tab_changed)
 
         self.init_tasks()
+        self.init_series()
         self.init_stats()
+        # Вкладка замеров видна только при TASKPLANNER_PROFILE=1
+        self.tab_perf = None
+        if profiler.ENABLED:
+            self.tab_perf = QWidget()
+            self.tabs.addTab(self.tab_perf, "Производительность")
+            self.init_perf()
 
         main_layout = QVBoxLayout(self)
         main_layout.addWidget(self.tabs)
@@ -65,7 +140,7 @@ class SecondWindow(QWidget):
         # Мини-дизайн
         self.setStyleSheet("""
         QWidget { background: #170909; font-family: Arial; }
-        QLabel { color: white; }
+        QLabel, QCheckBox { color: white; }
         QLineEdit, QComboBox {
             background: #140303; color: white;
             border: 1px solid #cfd8e3; border-radius: 4px; padding: 4px;
@@ -90,25 +165,67 @@ class SecondWindow(QWidget):
 
         self.search_bar = QLineEdit()
         self.search_bar.setPlaceholderText("Поиск по заголовку или описанию...")
-        self.search_bar.textChanged.connect(self.load_tasks)
-
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(['Заголовок', 'Задача', 'До', 'Оповещение', 'Статус', 'Приоритет'])
+        # Поиск запускается, когда пользователь перестал печатать
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.load_tasks)
+        self.search_bar.textChanged.connect(self.search_timer.start)
+        self.search_morph = QCheckBox("Словоформы")
+        self.search_morph.setToolTip("Искать любые формы слов: «купил» найдёт «купить», «отчёты» - «отчёт»")
+        self.search_morph.toggled.connect(self.load_tasks)
+        self.search_archive = QCheckBox("Архив")
+        self.search_archive.setToolTip(f"Показать задачи, закрытые больше {ARCHIVE_AFTER_DAYS} дней назад: "
+                                       "они хранятся в архиве и без этой отметки не ищутся")
+        self.search_archive.toggled.connect(self.load_tasks)
+
+        self.model = TaskTableModel(self.db, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         header = self.table.horizontalHeader()
         for i in range(6):
             header.setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        # Щелчок по заголовку сортирует в БД (TaskTableModel.sort); третий щелчок - исходный порядок
+        header.setSortIndicatorClearable(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        # Выделение строками, в том числе нескольких (Ctrl/Shift) - для массовых действий
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableView.SelectionMode.ExtendedSelection)
 
         button_edit = QPushButton("Редактировать")
         button_delete = QPushButton("Удалить")
         button_refresh = QPushButton("Обновить")
-        button_export = QPushButton("Экспорт в CSV")
+        button_export = QPushButton("Экспорт")
+        button_import = QPushButton("Импорт")
+        button_bulk = QToolButton()
+        button_bulk.setText("Выбранные")
+        button_bulk.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        bulk_menu = QMenu(button_bulk)
+        bulk_menu.addAction("Сменить статус...", self.bulk_set_status)
+        bulk_menu.addAction("Сменить приоритет...", self.bulk_set_priority)
+        bulk_menu.addAction("Сдвинуть дедлайн...", self.bulk_shift_until)
+        bulk_menu.addAction("Удалить", self.delete_selected)
+        bulk_menu.addAction("Вернуть из архива", self.restore_selected)
+        button_bulk.setMenu(bulk_menu)
+        button_backup = QToolButton()
+        button_backup.setText("Копии")
+        button_backup.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        backup_menu = QMenu(button_backup)
+        backup_menu.addAction("Создать копию", self.backup_now)
+        backup_menu.addAction("Восстановить из копии...", self.restore_backup)
+        button_backup.setMenu(backup_menu)
+        self.button_undo = QPushButton("Отменить")
+        self.button_undo.setEnabled(False)
+        self.button_undo.clicked.connect(self.undo)
+        QShortcut(QKeySequence.StandardKey.Undo, self.table, self.undo)
 
         button_edit.clicked.connect(self.edit_selected)
         button_delete.clicked.connect(self.delete_selected)
         button_refresh.clicked.connect(self.load_tasks)
-        button_export.clicked.connect(self.export_csv)
+        button_export.clicked.connect(self.export_tasks)
+        button_import.clicked.connect(self.import_tasks)
 
         filter_layout = QHBoxLayout()
         filter_layout.addWidget(QLabel("Статус:"))
@@ -116,13 +233,19 @@ class SecondWindow(QWidget):
         filter_layout.addWidget(QLabel("Приоритет:"))
         filter_layout.addWidget(self.filter_priority)
         filter_layout.addWidget(self.search_bar)
+        filter_layout.addWidget(self.search_morph)
+        filter_layout.addWidget(self.search_archive)
         filter_layout.addStretch()
 
         buttons_layout = QHBoxLayout()
         buttons_layout.addWidget(button_edit)
         buttons_layout.addWidget(button_delete)
+        buttons_layout.addWidget(button_bulk)
+        buttons_layout.addWidget(self.button_undo)
         buttons_layout.addWidget(button_refresh)
         buttons_layout.addWidget(button_export)
+        buttons_layout.addWidget(button_import)
+        buttons_layout.addWidget(button_backup)
 
         layout.addLayout(filter_layout)
         layout.addWidget(self.table)
@@ -130,9 +253,105 @@ class SecondWindow(QWidget):
 
         self.tab_tasks.setLayout(layout)
 
-    def init_stats(self):
-        """Инициализация и создание круговой диаграммы(статистики)"""
+    def init_series(self):
+        """Инициализация вкладки повторяющихся задач: повторения только за видимые SERIES_WINDOW_DAYS дней"""
         layout = QVBoxLayout()
+        self.series_first = dates.today_day()
+
+        button_prev = QPushButton("<")
+        button_today = QPushButton("Сегодня")
+        button_next = QPushButton(">")
+        self.series_range = QLabel()
+        button_prev.clicked.connect(lambda: self.move_series_window(-SERIES_WINDOW_DAYS))
+        button_today.clicked.connect(lambda: self.move_series_window(None))
+        button_next.clicked.connect(lambda: self.move_series_window(SERIES_WINDOW_DAYS))
+
+        self.series_model = OccurrenceTableModel(self)
+        self.series_table = QTableView()
+        self.series_table.setModel(self.series_model)
+        self.series_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.series_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.series_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
+
+        button_done = QPushButton("Выполнено")
+        button_skip = QPushButton("Пропустить")
+        button_clear = QPushButton("Снять отметку")
+        button_delete = QPushButton("Удалить серию")
+        button_done.clicked.connect(lambda: self.mark_occurrences('Выполнена'))
+        button_skip.clicked.connect(lambda: self.mark_occurrences('Отменена'))
+        button_clear.clicked.connect(lambda: self.mark_occurrences(None))
+        button_delete.clicked.connect(self.delete_series)
+
+        nav_layout = QHBoxLayout()
+        nav_layout.addWidget(button_prev)
+        nav_layout.addWidget(button_today)
+        nav_layout.addWidget(button_next)
+        nav_layout.addWidget(self.series_range)
+        nav_layout.addStretch()
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(button_done)
+        buttons_layout.addWidget(button_skip)
+        buttons_layout.addWidget(button_clear)
+        buttons_layout.addWidget(button_delete)
+        buttons_layout.addStretch()
+
+        layout.addLayout(nav_layout)
+        layout.addWidget(self.series_table)
+        layout.addLayout(buttons_layout)
+        self.tab_series.setLayout(layout)
+
+    def move_series_window(self, days):
+        """Сдвиг видимого диапазона дней; None - с сегодняшнего дня"""
+        self.series_first = dates.today_day() if days is None else self.series_first + days
+        self.load_series()
+
+    def load_series(self):
+        """Повторения за видимые дни; вычисляются в потоке БД, только пока вкладка открыта"""
+        if not self.isVisible() or self.tabs.currentWidget() is not self.tab_series:
+            self.series_dirty = True
+            return
+        self.series_dirty = False
+        last = self.series_first + SERIES_WINDOW_DAYS - 1
+        self.series_range.setText(f"{dates.format_day(self.series_first)} - {dates.format_day(last)}")
+        self.db.submit(TaskStore.occurrences, self.series_first, last, dates.today_day(),
+                       callback=self.show_occurrences, channel='series')
+
+    def show_occurrences(self, rows):
+        self.series_model.set_rows(rows)
+
+    def selected_occurrences(self):
+        """(series_id, day) выделенных повторений"""
+        rows = sorted({index.row() for index in self.series_table.selectionModel().selectedRows()})
+        if not rows:
+            QMessageBox.warning(self, "Ошибка", "Выберите повторение.")
+        return [(self.series_model.rows[i].series_id, self.series_model.rows[i].day) for i in rows]
+
+    def mark_occurrences(self, status):
+        """Отметка выделенных повторений одним изменением: в БД - строка на отмеченное повторение"""
+        keys = self.selected_occurrences()
+        if keys:
+            self.db.submit_write(TaskStore.set_occurrences, keys, status, callback=self.reminders.on_series_changed)
+
+    def delete_series(self):
+        keys = self.selected_occurrences()
+        if not keys:
+            return
+        series_ids = sorted({series_id for series_id, _ in keys})
+        reply = QMessageBox.question(self, "Удаление", f"Удалить серии целиком ({len(series_ids)})?",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.db.submit_write(TaskStore.delete_series, series_ids, callback=self.reminders.on_series_changed)
+
+    def show_timeline_day(self, day):
+        """Переход из календаря к ленте событий с выбранного дня"""
+        self.timeline.go_to(day)
+        self.tabs.setCurrentWidget(self.timeline)
+
+    def init_stats(self):
+        """Инициализация вкладки статистики; диаграммы создаются при первом показе"""
+        self.stats_layout = QVBoxLayout()
+        layout = self.stats_layout
 
         self.stats_label = QLabel()
         self.stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -141,49 +360,87 @@ class SecondWindow(QWidget):
         self.progress.setRange(0, 100)
         self.progress.setTextVisible(True)
 
-        self.chart_view = QChartView()
-        self.chart_view.setRenderHint(self.chart_view.renderHints())
+        # Слева - распределение по статусам, справа - история по дням
+        self.charts_layout = QHBoxLayout()
+        self.trends = TrendView(self.db)
+        self.charts_layout.addWidget(self.trends, 2)
 
         layout.addWidget(self.stats_label)
         layout.addWidget(self.progress)
-        layout.addWidget(self.chart_view)
+        layout.addLayout(self.charts_layout)
 
         self.tab_stats.setLayout(layout)
 
+    def init_chart(self):
+        """Создание круговой диаграммы (модуль QtCharts загружается только здесь)"""
+        from PyQt6.QtCharts import QChart, QChartView, QPieSeries
+
+        # Диаграмма создаётся один раз, дальше у неё меняются только значения секторов
+        self.pie = QPieSeries()
+        self.slices = {}
+        chart = QChart()
+        chart.addSeries(self.pie)
+        chart.setTitle("Распределение задач по статусам")
+        chart.legend().setVisible(True)
+        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
+
+        self.chart_view = QChartView(chart)
+        self.chart_view.setRenderHint(self.chart_view.renderHints())
+        self.charts_layout.insertWidget(0, self.chart_view, 1)
+
+    def init_perf(self):
+        """Инициализация вкладки с замерами запросов и обновлений интерфейса"""
+        layout = QVBoxLayout()
+
+        info = QLabel(f"Запросы дольше {profiler.SLOW_MS:g} мс с планом выполнения пишутся в {profiler.SLOW_LOG}")
+        info.setWordWrap(True)
+
+        self.perf_table = QTableWidget(0, 8)
+        self.perf_table.setHorizontalHeaderLabels(
+            ["Категория", "Имя", "Кол-во", "p50, мс", "p95, мс", "p99, мс", "Макс, мс", "Всего, мс"])
+        self.perf_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.perf_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.perf_table.horizontalHeader().setSortIndicator(7, Qt.SortOrder.DescendingOrder)
+
+        button_refresh = QPushButton("Обновить")
+        button_reset = QPushButton("Сбросить")
+        button_refresh.clicked.connect(self.update_perf)
+        button_reset.clicked.connect(self.reset_perf)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(button_refresh)
+        buttons_layout.addWidget(button_reset)
+        buttons_layout.addStretch()
+
+        layout.addWidget(info)
+        layout.addWidget(self.perf_table)
+        layout.addLayout(buttons_layout)
+        self.tab_perf.setLayout(layout)
+
+    def update_perf(self):
+        """Заполнение таблицы замеров (по убыванию суммарного времени)"""
+        rows = profiler.profiler.report()
+        self.perf_table.setSortingEnabled(False)
+        self.perf_table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                item = QTableWidgetItem()
+                if isinstance(value, float):
+                    item.setData(Qt.ItemDataRole.DisplayRole, round(value, 2))
+                else:
+                    item.setData(Qt.ItemDataRole.DisplayRole, value)
+                self.perf_table.setItem(i, j, item)
+        self.perf_table.setSortingEnabled(True)
+
+    def reset_perf(self):
+        profiler.profiler.reset()
+        self.update_perf()
+
     def load_tasks(self):
         """Загрузка задач с фильтрацией и поиском"""
-        self.table.setRowCount(0)
-        cur = self.conn.cursor()
-
-        query = "SELECT id, title, task, until, alert, status, priority FROM tasks WHERE 1=1"
-        params = []
-        if self.current_status_filter != "Все":
-            query += " AND status=?"
-            params.append(self.current_status_filter)
-        if self.current_priority_filter != "Все":
-            query += " AND priority=?"
-            params.append(self.current_priority_filter)
-        if self.search_bar.text().strip():
-            query += " AND (title LIKE ? OR task LIKE ?)"
-            text = f"%{self.search_bar.text().strip()}%"
-            params.extend([text, text])
-
-        query += " ORDER BY id"
-        cur.execute(query, params)
-
-        for row_data in cur.fetchall():
-            _id, title, task, until, alert, status, priority = row_data
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            it0 = QTableWidgetItem(title)
-            it0.setData(Qt.ItemDataRole.UserRole, _id)
-            self.table.setItem(row, 0, it0)
-            self.table.setItem(row, 1, QTableWidgetItem(task))
-            self.table.setItem(row, 2, QTableWidgetItem(until or ''))
-            self.table.setItem(row, 3, QTableWidgetItem(alert or ''))
-            self.table.setItem(row, 4, QTableWidgetItem(status or 'В работе'))
-            self.table.setItem(row, 5, QTableWidgetItem(priority or 'Средний'))
-
+        self.model.set_filters(self.current_status_filter, self.current_priority_filter,
+                               self.search_bar.text().strip(), self.search_morph.isChecked(),
+                               self.search_archive.isChecked())
         self.update_stats()
 
     def on_filter_changed(self):
@@ -194,118 +451,238 @@ class SecondWindow(QWidget):
 
     def add_row(self, title, task, date1, date2, status, priority):
         """Создание новой задачи(ряда в таблице) с записью в БД"""
-        cur = self.conn.cursor()
-        cur.execute(
-            """INSERT INTO tasks (title, task, until, alert, status, priority)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (title, task, date1, date2, status, priority)
-        )
-        self.conn.commit()
-        self.load_tasks()
+        self.db.submit_write(TaskStore.add_task, title, task, date1, date2, status, priority,
+                             callback=self.reminders.on_task_saved)
 
-    def check_until_alert_date(self):
-        """Проверка на наличие уведомлений, если есть, вывести на экран, а так же проверка на просроченные задания"""
-        today = datetime.now().date()
-        cur = self.conn.cursor()
-        rows = cur.execute("""SELECT id, title, alert, until, status FROM tasks""").fetchall()
-        changed = False
-
-        for _id, title, alert, until, status in rows:
-            if alert:
-                try:
-                    alert_date = datetime.strptime(alert, '%Y-%m-%d').date()
-                    if alert_date == today and status not in ('Выполнена', 'Отменена'):
-                        QMessageBox.information(self, 'Напоминание', f'Сегодня оповещение по задаче:\n\n«{title}»')
-                        cur.execute("""UPDATE tasks SET alert=? WHERE id=?""", ('', _id))
-                        changed = True
-                except ValueError:
-                    pass
-
-            if until:
-                try:
-                    until_date = datetime.strptime(until, '%Y-%m-%d').date()
-                    if until_date < today and status != 'Просрочена':
-                        cur.execute("""UPDATE tasks SET status=? WHERE id=?""", ('Просрочена', _id))
-                        changed = True
-                except ValueError:
-                    pass
-
-        if changed:
-            self.conn.commit()
-            self.load_tasks()
-
-    def export_csv(self):
-        """Экспорт всех задач в CSV"""
-        path, _ = QFileDialog.getSaveFileName(self, "Сохранить как...", "tasks.csv", "CSV Files (*.csv)")
+    def save_task(self, item_id, title, task, date1, date2, status, priority):
+        """Сохранение изменённой задачи в БД"""
+        self.db.submit_write(TaskStore.update_task, item_id, title, task, date1, date2, status, priority,
+                             callback=self.reminders.on_task_saved)
+
+    def on_task_saved(self, row):
+        """Задача создана или изменена (в том числе из главного окна): обновить её строку"""
+        if row is None:
+            return
+        self.model.patch_task(row[0])
+        self.update_stats()
+
+    def on_task_deleted(self, task_id):
+        self.model.remove_task(task_id)
+        self.update_stats()
+
+    def export_tasks(self):
+        """Экспорт задач с текущими фильтрами и поиском в CSV, JSON Lines или Excel"""
+        import exporter
+        filters = {"CSV (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl"}
+        if 'xlsx' in exporter.FORMATS:
+            filters["Excel (*.xlsx)"] = "xlsx"
+        path, selected = QFileDialog.getSaveFileName(self, "Сохранить как...", "tasks.csv", ";;".join(filters))
+        if not path:
+            return
+        fmt = path.rsplit('.', 1)[-1].lower()
+        if fmt not in exporter.FORMATS:
+            fmt = filters.get(selected, "csv")
+
+        self.export_job = JobThread(self.db_path, exporter.export_tasks, path, fmt, self.model.spec, parent=self)
+        self.export_progress = QProgressDialog("Экспорт задач...", "Отмена", 0, 0, self)
+        self.export_progress.setWindowTitle("Экспорт")
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.canceled.connect(self.export_job.cancel)
+        self.export_job.progress.connect(self.on_export_progress)
+        self.export_job.done.connect(self.on_exported)
+        self.export_job.failed.connect(self.on_export_failed)
+        self.export_job.start()
+
+    def on_export_progress(self, done, total):
+        self.export_progress.setMaximum(total)
+        self.export_progress.setValue(done)
+
+    def on_exported(self, path):
+        self.export_progress.reset()
+        if path:
+            QMessageBox.information(self, "Экспорт завершён", f"Файл сохранён:\n{path}")
+
+    def on_export_failed(self, message):
+        self.export_progress.reset()
+        self.on_db_error(message)
+
+    def import_tasks(self):
+        """Импорт задач из CSV (в формате экспорта) или JSON Lines"""
+        path, _ = QFileDialog.getOpenFileName(self, "Импорт задач", "",
+                                              "CSV или JSON Lines (*.csv *.jsonl);;Все файлы (*)")
         if not path:
             return
-        cur = self.conn.cursor()
-        rows = cur.execute("SELECT title, task, until, alert, status, priority FROM tasks").fetchall()
-        with open(path, "w", newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Заголовок", "Задача", "До", "Оповещение", "Статус", "Приоритет"])
-            writer.writerows(rows)
-        QMessageBox.information(self, "Экспорт завершён", f"Файл сохранён:\n{path}")
+        fmt = 'jsonl' if path.lower().endswith(('.jsonl', '.json')) else 'csv'
+        import importer
+
+        # Незакоммиченные изменения из очереди БД не должны ждать импорт
+        self.db.flush()
+        self.import_job = JobThread(self.db_path, importer.import_tasks, path, fmt, parent=self)
+        self.import_progress = QProgressDialog("Импорт задач...", "Отмена", 0, 0, self)
+        self.import_progress.setWindowTitle("Импорт")
+        self.import_progress.setMinimumDuration(300)
+        self.import_progress.canceled.connect(self.import_job.cancel)
+        self.import_job.progress.connect(self.on_import_progress)
+        self.import_job.done.connect(self.on_imported)
+        self.import_job.failed.connect(self.on_import_failed)
+        self.import_job.start()
+
+    def on_import_progress(self, done, total):
+        self.import_progress.setMaximum(total)
+        self.import_progress.setValue(done)
+
+    def on_imported(self, result):
+        """Одно обновление списка и планировщика после импорта и отчёт об отклонённых строках"""
+        self.import_progress.reset()
+        if result is None:
+            # Импорт отменён, задачи не добавлены
+            return
+        imported, rejected_count, rejected = result
+        self.load_tasks()
+        self.reminders.start()
+
+        text = f"Импортировано задач: {imported}"
+        if rejected_count:
+            text += f"\nОтклонено строк: {rejected_count}\n\n"
+            text += "\n".join(f"Строка {line_no}: {reason}" for line_no, reason in rejected[:20])
+            if rejected_count > 20:
+                text += "\n..."
+        QMessageBox.information(self, "Импорт завершён", text)
+
+    def on_import_failed(self, message):
+        self.import_progress.reset()
+        self.on_db_error(message)
+
+    def jobs_running(self):
+        """Идёт экспорт, импорт или снимок базы (предупреждение)"""
+        jobs = self.findChildren(JobThread) + [self.reminders.backup_job]
+        if any(job is not None and job.isRunning() for job in jobs):
+            QMessageBox.warning(self, "Копии", "Дождитесь окончания экспорта, импорта или создания копии.")
+            return True
+        return False
+
+    def backup_now(self):
+        """Снимок базы и архива в папку backups рядом с tasks.db (в фоне, приложение при этом работает)"""
+        if self.jobs_running():
+            return
+        self.db.flush()
+        self.backup_job = JobThread(self.db_path, backup.take_snapshot, parent=self)
+        self.backup_progress = QProgressDialog("Создание копии...", "Отмена", 0, 0, self)
+        self.backup_progress.setWindowTitle("Копия")
+        self.backup_progress.setMinimumDuration(300)
+        self.backup_progress.canceled.connect(self.backup_job.cancel)
+        self.backup_job.progress.connect(self.on_backup_progress)
+        self.backup_job.done.connect(self.on_backed_up)
+        self.backup_job.failed.connect(self.on_backup_failed)
+        self.backup_job.start()
+
+    def on_backup_progress(self, done, total):
+        self.backup_progress.setMaximum(total)
+        self.backup_progress.setValue(done)
+
+    def on_backed_up(self, path):
+        self.backup_progress.reset()
+        if path:
+            QMessageBox.information(self, "Копия создана", f"Файл копии:\n{path}")
+
+    def on_backup_failed(self, message):
+        self.backup_progress.reset()
+        self.on_db_error(message)
+
+    def restore_backup(self):
+        """Замена всех задач и архива задачами снимка; массовые изменения до этого отменить уже нельзя"""
+        if self.jobs_running():
+            return
+        found = backup.snapshots(self.db_path)
+        if not found:
+            QMessageBox.information(self, "Восстановление", "Копий пока нет.")
+            return
+        labels = [stamp.strftime('%Y-%m-%d %H:%M:%S') for stamp, _ in found]
+        label, ok = QInputDialog.getItem(self, "Восстановление", "Копия от:", labels, 0, False)
+        if not ok:
+            return
+        answer = QMessageBox.question(self, "Восстановление",
+                                      f"Все задачи и архив будут заменены задачами копии от {label}. Продолжить?")
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+        self.db.submit_standalone(backup.restore_snapshot, found[labels.index(label)][1], callback=self.on_restored)
+
+    def on_restored(self, count):
+        self.undo_stack.clear()
+        self.update_undo_button()
+        self.reminders.on_replaced()
+        QMessageBox.information(self, "Восстановление", f"Задачи восстановлены из копии. Всего задач: {count}")
+
+    def on_tab_changed(self):
+        """Пересчёт отложенной статистики при переходе на её вкладку"""
+        if self.tab_perf is not None and self.tabs.currentWidget() is self.tab_perf:
+            self.update_perf()
+        if self.stats_dirty:
+            self.update_stats()
+        if self.series_dirty:
+            self.load_series()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.stats_dirty:
+            self.update_stats()
+        if self.series_dirty:
+            self.load_series()
 
     def update_stats(self):
         """Обновление вкладки статистики"""
-        cur = self.conn.cursor()
-        cur.execute("SELECT status FROM tasks")
-        rows = cur.fetchall()
+        if not self.isVisible() or self.tabs.currentWidget() is not self.tab_stats:
+            self.stats_dirty = True
+            return
+        self.stats_dirty = False
+        self.db.submit(TaskStore.status_counts, callback=self.show_stats, channel='stats')
+
+    def show_stats(self, status_counts):
+        """Обновление секторов диаграммы по счётчикам статусов"""
+        if self.pie is None:
+            self.init_chart()
+        for status in list(self.slices):
+            if status not in status_counts:
+                self.pie.remove(self.slices.pop(status))
+        for status, count in status_counts.items():
+            if status in self.slices:
+                self.slices[status].setValue(count)
+            else:
+                self.slices[status] = self.pie.append(status, count)
 
-        total = len(rows)
+        total = sum(status_counts.values())
         if total == 0:
             self.stats_label.setText("Нет задач для отображения статистики")
-            self.chart_view.setChart(QChart())
             self.progress.setValue(0)
             return
 
-        status_counts = {}
-        for (status,) in rows:
-            status_counts[status] = status_counts.get(status, 0) + 1
-
         done = status_counts.get('Выполнена', 0)
         progress_percent = int(done / total * 100)
         self.progress.setValue(progress_percent)
         self.stats_label.setText(f"Всего задач: {total} | Выполнено: {done} ({progress_percent}%)")
 
-        series = QPieSeries()
-        for status, count in status_counts.items():
-            series.append(status, count)
-
-        chart = QChart()
-        chart.addSeries(series)
-        chart.setTitle("Распределение задач по статусам")
-        chart.legend().setVisible(True)
-        chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
-        self.chart_view.setChart(chart)
-
     def is_valid_date(self, s):
         """Проверка даты на валидность"""
-        if not s:
-            return True
-        try:
-            datetime.strptime(s, "%Y-%m-%d")
-            return True
-        except ValueError:
-            return False
+        return dates.is_valid_date(s)
 
     def edit_selected(self):
         """Инициализация окна для изменения данных в таблице и БД"""
-        row = self.table.currentRow()
+        if self.archive_shown():
+            return
+        row = self.table.currentIndex().row()
         if row < 0:
             QMessageBox.warning(self, "Ошибка", "Выберите задачу.")
             return
-        item_id = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
+        item_id, title, task, until, alert, status, priority = self.model.task_at(row)
         if not item_id:
             return
 
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактировать задачу")
-        le1 = QLineEdit(self.table.item(row, 0).text())
-        le2 = QLineEdit(self.table.item(row, 1).text())
-        le3 = QLineEdit(self.table.item(row, 2).text())
-        le4 = QLineEdit(self.table.item(row, 3).text())
+        le1 = QLineEdit(title)
+        le2 = QLineEdit(task)
+        le3 = QLineEdit(dates.format_day(until))
+        le4 = QLineEdit(dates.format_day(alert))
         le5 = QComboBox()
         statuses = ['Не начата', 'В работе', 'Выполнена', 'Просрочена', 'Отменена']
         le5.addItems(statuses)
@@ -314,11 +691,11 @@ class SecondWindow(QWidget):
         le6.addItems(priorities)
 
         try:
-            le5.setCurrentIndex(statuses.index(self.table.item(row, 4).text()))
+            le5.setCurrentIndex(statuses.index(status or 'В работе'))
         except ValueError:
             le5.setCurrentIndex(1)
         try:
-            le6.setCurrentIndex(priorities.index(self.table.item(row, 5).text()))
+            le6.setCurrentIndex(priorities.index(priority or 'Средний'))
         except ValueError:
             le6.setCurrentIndex(1)
 
@@ -354,29 +731,120 @@ class SecondWindow(QWidget):
         layout.addLayout(buttons)
 
         if dialog.exec():
-            cur = self.conn.cursor()
-            cur.execute("""UPDATE tasks SET title=?, task=?, until=?, alert=?, status=?, priority=? WHERE id=?""",
-                        (le1.text(), le2.text(), le3.text(), le4.text(),
-                         le5.currentText(), le6.currentText(), item_id))
-            self.conn.commit()
-            self.load_tasks()
+            self.save_task(item_id, le1.text(), le2.text(), le3.text(), le4.text(),
+                           le5.currentText(), le6.currentText())
 
     def delete_selected(self):
-        """Удалить выбранную задачу"""
-        row = self.table.currentRow()
-        if row < 0:
-            QMessageBox.warning(self, "Ошибка", "Выберите задачу.")
+        """Удалить выбранные задачи"""
+        if self.archive_shown():
             return
-        item_id = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
-        if not item_id:
+        ids = self.selected_ids()
+        if not ids:
+            return
+        if len(ids) == 1:
+            reply = QMessageBox.question(self, "Удаление", "Удалить задачу?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.Yes:
+                # Как массовое удаление - с точкой отмены, но список не перезагружается
+                self.db.submit_write(TaskStore.bulk_delete, ids, callback=self.on_deleted)
             return
-        reply = QMessageBox.question(self, "Удаление", "Удалить задачу?",
+        reply = QMessageBox.question(self, "Удаление", f"Удалить выбранные задачи ({len(ids)})?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            cur = self.conn.cursor()
-            cur.execute("DELETE FROM tasks WHERE id=?", (item_id,))
-            self.conn.commit()
-            self.load_tasks()
+            self.run_bulk("удаление", TaskStore.bulk_delete, ids)
+
+    def selected_ids(self):
+        """id задач в выделенных строках; без выделения - предупреждение и пустой список"""
+        ids = [self.model.task_at(index.row())[0] for index in self.table.selectionModel().selectedRows()]
+        if not ids:
+            QMessageBox.warning(self, "Ошибка", "Выберите задачу.")
+        return ids
+
+    def bulk_set_status(self):
+        if self.archive_shown():
+            return
+        ids = self.selected_ids()
+        if not ids:
+            return
+        status, ok = QInputDialog.getItem(self, "Статус", f"Новый статус задач ({len(ids)}):", STATUSES, 1, False)
+        if ok:
+            self.run_bulk("смена статуса", TaskStore.bulk_edit, ids, status)
+
+    def bulk_set_priority(self):
+        if self.archive_shown():
+            return
+        ids = self.selected_ids()
+        if not ids:
+            return
+        priority, ok = QInputDialog.getItem(self, "Приоритет", f"Новый приоритет задач ({len(ids)}):",
+                                            PRIORITIES, 1, False)
+        if ok:
+            self.run_bulk("смена приоритета", TaskStore.bulk_edit, ids, None, priority)
+
+    def bulk_shift_until(self):
+        if self.archive_shown():
+            return
+        ids = self.selected_ids()
+        if not ids:
+            return
+        days, ok = QInputDialog.getInt(self, "Сдвиг дедлайна", f"Сдвинуть дедлайн задач ({len(ids)}) на дней:",
+                                       7, -3650, 3650)
+        if ok and days:
+            self.run_bulk("сдвиг дедлайна", TaskStore.bulk_edit, ids, None, None, days)
+
+    def archive_shown(self):
+        """В списке задачи архива: их можно только вернуть из архива (предупреждение)"""
+        if self.search_archive.isChecked():
+            QMessageBox.warning(self, "Архив", "Задачи архива только просматриваются. Сначала верните их из архива.")
+            return True
+        return False
+
+    def restore_selected(self):
+        """Возврат выбранных задач из архива в основной список"""
+        if not self.search_archive.isChecked():
+            QMessageBox.warning(self, "Архив", "Включите «Архив» и выберите задачи архива.")
+            return
+        ids = self.selected_ids()
+        if ids:
+            # Изменяет оба файла БД по очереди, поэтому вне общей транзакции изменений
+            self.db.submit_standalone(TaskStore.unarchive, ids, dates.today_day(),
+                                      callback=lambda count: self.after_bulk())
+
+    def run_bulk(self, label, func, *args):
+        """Массовое изменение func(store, *args) одной транзакцией; его Snapshot - точка отмены"""
+        self.db.submit_write(func, *args, callback=lambda snapshot: self.on_bulk_done(label, snapshot))
+
+    def on_bulk_done(self, label, snapshot):
+        self.push_undo(label, snapshot)
+        self.after_bulk()
+
+    def on_deleted(self, snapshot):
+        """Удалена одна задача: точка отмены и удаление только её строки"""
+        self.push_undo("удаление", snapshot)
+        for row in snapshot.rows:
+            self.reminders.on_task_deleted(row[0])
+
+    def push_undo(self, label, snapshot):
+        self.undo_stack.append((label, snapshot))
+        del self.undo_stack[:-UNDO_LIMIT]
+        self.update_undo_button()
+
+    def undo(self):
+        """Отмена последнего массового изменения"""
+        if not self.undo_stack:
+            return
+        label, snapshot = self.undo_stack.pop()
+        self.update_undo_button()
+        self.db.submit_write(TaskStore.undo, snapshot, callback=lambda count: self.after_bulk())
+
+    def after_bulk(self):
+        """Одно обновление списка после массового изменения, затем перепроверка сроков в фоне"""
+        self.load_tasks()
+        self.reminders.on_tasks_changed()
+
+    def update_undo_button(self):
+        self.button_undo.setEnabled(bool(self.undo_stack))
+        self.button_undo.setToolTip(f"Отменить: {self.undo_stack[-1][0]}" if self.undo_stack else "")
 
     def closeEvent(self, event):
         event.ignore()
@@ -0,0 +1,372 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Колонки задач в памяти потока БД для фильтров по статусу и приоритету, сортировки
+# по датам, статусу и приоритету и подсчёта задач выборки (TaskStore.fetch_page, count).
+# На задачу - 20 байт (id, коды статуса и приоритета, две даты) и 12 байт на каждый
+# использованный порядок сортировки. Тексты задач остаются в БД: страница таблицы -
+# это 200 строк, которые дочитываются по первичному ключу, а поиск идёт по индексам FTS и лемм.
+# Изменения применяются из журнала change_log перед каждым запросом.
+
+# Пустая дата - как IFNULL в task_store.SORT_KEYS: в конец при сортировке по возрастанию
+NO_DAY = 2147483647
+# Код статуса удалённой задачи: её место в массивах освобождается при уплотнении
+DELETED = -1
+# Массивы кэша; места задач в них совпадают
+COLUMNS = ('ids', 'status', 'priority', 'until', 'alert')
+# Порядки сортировки, которые ведёт кэш (остальные поля сортируются в БД)
+ORDER_FIELDS = ('until', 'alert', 'status', 'priority')
+# Сколько задач переставляется в готовом порядке сортировки по одной; при большем числе
+# изменений порядок строится заново при следующем запросе с этой сортировкой
+ORDER_MOVES = 8
+# Ключ сортировки приоритета - как CASE в task_store.SORT_KEYS
+PRIORITY_RANKS = {'Низкий': 1, 'Высокий': 3}
+LOAD_QUERY = ("SELECT id, status, priority, IFNULL(until, 2147483647), IFNULL(alert, 2147483647)"
+              " FROM main.tasks WHERE id > ? ORDER BY id LIMIT ?")
+
+
+class Codes:
+    """Номера значений текстового поля (None - тоже значение): массивы хранят номера, а не строки"""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def code(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def grow(array, capacity):
+    """Копия массива с местом под capacity элементов"""
+    result = np.empty(capacity, array.dtype)
+    result[:len(array)] = array
+    return result
+
+
+class Order:
+    """Порядок сортировки по полю: места задач по возрастанию ключа и сами ключи, с запасом в конце"""
+
+    def __init__(self, perm, keys):
+        self.length = len(perm)
+        self.perm = grow(perm, self.length + self.length // 8)
+        self.keys = grow(keys, self.length + self.length // 8)
+
+    def find(self, key):
+        return int(np.searchsorted(self.keys[:self.length], key))
+
+    def move(self, old_keys, new_keys, slots):
+        """Перенос мест slots с прежних ключей на новые сдвигом ключей между ними (ключи уникальны: в них есть id)"""
+        for old, new, slot in zip(old_keys, new_keys, slots):
+            src = self.find(old)
+            dst = self.find(new)
+            if dst > src:
+                dst -= 1
+                self.perm[src:dst] = self.perm[src + 1:dst + 1]
+                self.keys[src:dst] = self.keys[src + 1:dst + 1]
+            else:
+                self.perm[dst + 1:src + 1] = self.perm[dst:src]
+                self.keys[dst + 1:src + 1] = self.keys[dst:src]
+            self.perm[dst] = slot
+            self.keys[dst] = new
+
+    def add(self, keys, slots):
+        """Вставка мест slots с ключами keys на их позиции"""
+        if self.length + len(slots) > len(self.perm):
+            capacity = max(self.length + len(slots), len(self.perm) * 3 // 2)
+            self.perm = grow(self.perm[:self.length], capacity)
+            self.keys = grow(self.keys[:self.length], capacity)
+        for key, slot in zip(keys, slots):
+            pos = self.find(key)
+            self.perm[pos + 1:self.length + 1] = self.perm[pos:self.length]
+            self.keys[pos + 1:self.length + 1] = self.keys[pos:self.length]
+            self.perm[pos] = slot
+            self.keys[pos] = key
+            self.length += 1
+
+
+class TaskCache:
+    """Поля задач main.tasks, по которым фильтруется и сортируется список, - массивами NumPy.
+
+    Задачи лежат по возрастанию id, номер задачи в массивах - её место (slot). Удалённая задача
+    помечается кодом статуса DELETED, новые дописываются в конец (или вставляются по id).
+    Порядок сортировки по полю - перестановка мест и отсортированные ключи (ключ поля, id)
+    одним числом; строится при первом запросе, затем поправляется по изменённым задачам.
+    """
+
+    def __init__(self):
+        self.status_codes = Codes()
+        self.priority_codes = Codes()
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.ids = np.zeros(0, np.int64)
+        self.status = np.zeros(0, np.int16)
+        self.priority = np.zeros(0, np.int16)
+        self.until = np.zeros(0, np.int32)
+        self.alert = np.zeros(0, np.int32)
+        self.deleted = 0
+        # Последняя применённая запись журнала; None - кэш ещё загружается
+        self.seq = None
+        self.loaded_seq = 0
+        # Отменена транзакция, изменения которой, возможно, уже применены
+        self.stale = False
+        self.orders = {}
+        self.masks = {}
+
+    # Загрузка
+
+    def load(self, conn, limit):
+        """Следующая порция задач по id; возвращает её размер, 0 - кэш загружен.
+
+        Изменения, сделанные во время загрузки, применяются потом из журнала: порции идут
+        отдельными запросами, а журнал с записи, последней перед первой порцией, ещё цел.
+        """
+        if self.seq is not None:
+            return 0
+        if self.size == 0:
+            self.loaded_seq = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+        after = int(self.ids[self.size - 1]) if self.size else 0
+        rows = conn.execute(LOAD_QUERY, (after, limit)).fetchall()
+        if not rows:
+            self.seq = self.loaded_seq
+            return 0
+        ids, statuses, priorities, until, alert = zip(*rows)
+        self.append(np.array(ids, np.int64), self.encode(self.status_codes, statuses),
+                    self.encode(self.priority_codes, priorities), np.array(until, np.int32),
+                    np.array(alert, np.int32))
+        return len(rows)
+
+    def reload(self, conn, limit):
+        """Загрузка заново целиком (журнал изменений прерван или отменена транзакция)"""
+        self.clear()
+        while self.load(conn, limit):
+            pass
+
+    def encode(self, codes, values):
+        return np.array([codes.code(value) for value in values], np.int16)
+
+    def append(self, *arrays):
+        """Добавление задач с id больше всех имеющихся: массивы растут с запасом"""
+        count = len(arrays[0])
+        if self.size + count > len(self.ids):
+            capacity = max(self.size + count, len(self.ids) * 3 // 2, 1024)
+            for name in COLUMNS:
+                setattr(self, name, grow(getattr(self, name)[:self.size], capacity))
+        for name, values in zip(COLUMNS, arrays):
+            getattr(self, name)[self.size:self.size + count] = values
+        self.size += count
+
+    # Изменения
+
+    def sync(self, conn, limit):
+        """Применение записей журнала change_log после seq; False - кэш ещё не загружен"""
+        if self.seq is None:
+            return False
+        last = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+        if last == self.seq and not self.stale:
+            return True
+        first = conn.execute("SELECT MIN(seq) FROM change_log WHERE seq > ?", (self.seq,)).fetchone()[0]
+        # Журнал начат заново или его начало уже удалено (trim_changes, восстановление из снимка),
+        # либо изменена большая часть задач: перечитать всё быстрее, чем по одной
+        if (self.stale or last < self.seq or first != self.seq + 1 or
+                last - self.seq > max(self.size // 4, limit)):
+            self.reload(conn, limit)
+            return True
+        rows = conn.execute("""SELECT c.task_id, t.id, t.status, t.priority, IFNULL(t.until, 2147483647),
+                                      IFNULL(t.alert, 2147483647)
+                               FROM (SELECT DISTINCT task_id FROM change_log WHERE seq > ? AND seq <= ?) c
+                               LEFT JOIN main.tasks t ON t.id = c.task_id
+                               ORDER BY c.task_id""", (self.seq, last)).fetchall()
+        self.apply(rows)
+        self.seq = last
+        return True
+
+    def apply(self, rows):
+        """Новые значения задач (task_id, id или None - задачи нет, status, priority, until, alert)"""
+        self.masks.clear()
+        if not rows:
+            return
+        status_count = len(self.status_codes.values)
+        exists = np.array([row[1] is not None for row in rows])
+        values = {'ids': np.array([row[0] for row in rows], np.int64),
+                  'status': np.array([self.status_codes.code(row[2]) if row[1] is not None else DELETED
+                                      for row in rows], np.int16),
+                  'priority': np.array([self.priority_codes.code(row[3]) if row[1] is not None else 0
+                                        for row in rows], np.int16),
+                  'until': np.array([row[4] or 0 for row in rows], np.int32),
+                  'alert': np.array([row[5] or 0 for row in rows], np.int32)}
+        if len(self.status_codes.values) != status_count:
+            # Новое значение статуса меняет места остальных в порядке строк
+            self.orders.pop('status', None)
+
+        # Места задач, которые уже есть в кэше
+        slots = np.searchsorted(self.ids[:self.size], values['ids'])
+        found = slots < self.size
+        found[found] = self.ids[slots[found]] == values['ids'][found]
+        # У удалённых задач остаются прежние значения, кроме статуса: их места в порядках не двигаются
+        gone = found & ~exists
+        for name in ('priority', 'until', 'alert'):
+            values[name][gone] = getattr(self, name)[slots[gone]]
+        slots = slots[found]
+        self.deleted -= int(np.count_nonzero(self.status[slots] == DELETED))
+        for name in ORDER_FIELDS:
+            column = getattr(self, name)
+            changed = slots[column[slots] != values[name][found]]
+            if len(changed) > ORDER_MOVES:
+                self.orders.pop(name, None)
+            old_keys = self.keys(name, changed) if name in self.orders else None
+            column[slots] = values[name][found]
+            if name in self.orders:
+                self.orders[name].move(old_keys, self.keys(name, changed), changed)
+        self.deleted += int(np.count_nonzero(self.status[slots] == DELETED))
+
+        new = ~found & exists
+        if new.any():
+            arrays = [values[name][new] for name in COLUMNS]
+            if self.size and arrays[0][0] < self.ids[self.size - 1]:
+                # Задача вернулась из архива или после отмены удаления со старым id
+                self.insert(arrays)
+            else:
+                start = self.size
+                self.append(*arrays)
+                added = np.arange(start, self.size)
+                for field, order in list(self.orders.items()):
+                    if len(added) > ORDER_MOVES:
+                        del self.orders[field]
+                    else:
+                        order.add(self.keys(field, added), added)
+        if self.deleted > max(self.size // 4, 1024):
+            self.compact()
+
+    def insert(self, arrays):
+        """Вставка задач с id среди имеющихся; порядки сортировки строятся заново"""
+        positions = np.searchsorted(self.ids[:self.size], arrays[0])
+        for name, values in zip(COLUMNS, arrays):
+            setattr(self, name, np.insert(getattr(self, name)[:self.size], positions, values))
+        self.size = len(self.ids)
+        self.orders.clear()
+
+    def compact(self):
+        """Удаление мест удалённых задач"""
+        keep = self.status[:self.size] != DELETED
+        for name in COLUMNS:
+            setattr(self, name, getattr(self, name)[:self.size][keep])
+        self.size = len(self.ids)
+        self.deleted = 0
+        self.orders.clear()
+
+    def discard(self):
+        """Транзакция отменена: значения из неё, возможно, уже в кэше - при следующем запросе загрузка заново"""
+        self.stale = True
+
+    # Запросы
+
+    def mask(self, status, priority):
+        """Задачи выборки по статусу и приоритету ("Все" - любой) - массив bool по местам"""
+        key = (status, priority)
+        mask = self.masks.get(key)
+        if mask is not None:
+            return mask
+        codes = self.status[:self.size]
+        if status == "Все":
+            mask = codes != DELETED
+        elif status in self.status_codes.index:
+            mask = codes == self.status_codes.index[status]
+        else:
+            mask = np.zeros(self.size, bool)
+        if priority != "Все":
+            mask &= self.priority[:self.size] == self.priority_codes.index.get(priority, DELETED)
+        self.masks[key] = mask
+        return mask
+
+    def count(self, status, priority):
+        return int(np.count_nonzero(self.mask(status, priority)))
+
+    def keys(self, field, slots):
+        """Ключи сортировки мест slots: ключ поля в старших 32 битах, id - в младших"""
+        if field == 'status':
+            ranks = self.status_ranks()
+            key = ranks[self.status[slots]]
+        elif field == 'priority':
+            ranks = np.array([PRIORITY_RANKS.get(value, 2) for value in self.priority_codes.values] + [2], np.int64)
+            key = ranks[self.priority[slots]]
+        else:
+            key = getattr(self, field)[slots]
+        return ((key.astype(np.int64) + 2 ** 31).astype(np.uint64) << np.uint64(32)) | self.ids[slots].astype(np.uint64)
+
+    def status_order(self):
+        """Значения статуса (пустой - 'В работе') по порядку строк, как их сравнивает SQLite"""
+        return sorted({'В работе' if value is None else value for value in self.status_codes.values})
+
+    def status_ranks(self):
+        """Место в status_order для каждого кода статуса; последний элемент - для удалённых задач"""
+        order = self.status_order()
+        return np.array([order.index('В работе' if value is None else value)
+                         for value in self.status_codes.values] + [0], np.int64)
+
+    def key_of(self, field, value, task_id):
+        """Ключ сортировки строки страницы (значение поля из SORT_KEYS, id); None - значение кэшу не известно"""
+        if field == 'status':
+            order = self.status_order()
+            if value not in order:
+                return None
+            value = order.index(value)
+        return np.uint64(((int(value) + 2 ** 31) << 32) | task_id)
+
+    def order(self, field):
+        """Порядок сортировки поля (Order), построенный при первом запросе"""
+        order = self.orders.get(field)
+        if order is None:
+            keys = self.keys(field, np.arange(self.size))
+            perm = np.argsort(keys).astype(np.int32)
+            order = self.orders[field] = Order(perm, keys[perm])
+        return order
+
+    def page(self, status, priority, field, descending, after, limit):
+        """id задач следующей страницы выборки после ключа after (как в TaskStore.fetch_page) или None,
+        если ключ after кэшу не известен"""
+        mask = self.mask(status, priority)
+        if field is None:
+            if after is None:
+                start = self.size if descending else 0
+            else:
+                start = int(np.searchsorted(self.ids[:self.size], after[0], 'left' if descending else 'right'))
+            return self.ids[self.scan(mask, None, start, -1 if descending else 1, limit)].tolist()
+        order = self.order(field)
+        perm = order.perm[:order.length]
+        if after is None:
+            start = len(perm) if descending else 0
+        else:
+            key = self.key_of(field, after[0], after[1])
+            if key is None:
+                return None
+            start = int(np.searchsorted(order.keys[:order.length], key, 'left' if descending else 'right'))
+        return self.ids[self.scan(mask, perm, start, -1 if descending else 1, limit)].tolist()
+
+    def scan(self, mask, perm, start, step, limit):
+        """Первые limit мест выборки mask от start в порядке perm (None - по местам), step -1 - назад.
+        Просмотр порциями растущей длины: частый фильтр заканчивается в первой же"""
+        found = []
+        total = 0
+        chunk = limit * 4
+        end = len(perm) if perm is not None else self.size
+        while total < limit and (0 <= start < end if step > 0 else start > 0):
+            if step > 0:
+                part = np.arange(start, min(start + chunk, end))
+                start += chunk
+            else:
+                part = np.arange(start - 1, max(start - chunk, 0) - 1, -1)
+                start -= chunk
+            slots = perm[part] if perm is not None else part
+            slots = slots[mask[slots]]
+            found.append(slots[:limit - total])
+            total += len(found[-1])
+            chunk *= 4
+        return np.concatenate(found) if found else np.zeros(0, np.int64)
@@ -0,0 +1,298 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+import task_store
+from task_store import TaskStore
+from dates import format_day
+
+COLUMNS = ['Заголовок', 'Задача', 'До', 'Оповещение', 'Статус', 'Приоритет']
+# Поле task_store.SORT_KEYS для сортировки по каждой колонке
+SORT_FIELDS = ['title', 'task', 'until', 'alert', 'status', 'priority']
+
+
+class TaskTableModel(QAbstractTableModel):
+    """Модель таблицы задач с постраничной подгрузкой строк из БД.
+
+    Страницы запрашиваются через Database в потоке БД и добавляются в модель,
+    когда приходит результат. Сортировка по заголовку колонки тоже выполняется в БД.
+    """
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.rows = []
+        # Ключ сортировки загруженной строки по id задачи: строка находится двоичным поиском по ключу
+        self.row_keys = {}
+        self.filters = ("Все", "Все", "")
+        self.morph = False
+        self.archive = False
+        self.sort_field = None
+        self.descending = False
+        self.spec = task_store.filter_spec(*self.filters)
+        self.has_more = False
+        self.loading = False
+        self.cache_requested = False
+
+    def set_filters(self, status, priority, search, morph=False, archive=False):
+        """Установка фильтров и перезагрузка первой страницы; morph - поиск по словоформам, archive - задачи архива"""
+        self.filters = (status, priority, search)
+        self.morph = morph
+        self.archive = archive
+        self.update_spec()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Сортировка по колонке запросом к БД; column < 0 - исходный порядок"""
+        self.sort_field = SORT_FIELDS[column] if 0 <= column < len(SORT_FIELDS) else None
+        self.descending = order == Qt.SortOrder.DescendingOrder
+        self.update_spec()
+
+    def update_spec(self):
+        self.spec = task_store.filter_spec(*self.filters, sort=self.sort_field, descending=self.descending,
+                                           morph=self.morph, archive=self.archive)
+        self.reload()
+        if not self.cache_requested and self.spec.get("cached", task_store.CACHE_ALL) != task_store.CACHE_ALL:
+            # Первый фильтр или сортировка без поиска: поля задач большого списка загружаются в память
+            # потока БД по шагам (TaskStore.load_cache), следующие такие выборки отдаёт кэш
+            self.cache_requested = True
+            self.db.submit_batches(TaskStore.load_cache, task_store.CACHE_BATCH)
+
+    def reload(self):
+        """Запрос первой страницы; старые строки видны, пока она не придёт"""
+        self.loading = True
+        self.db.submit(TaskStore.fetch_page, self.spec, None,
+                       callback=self.on_first_page, channel='tasks_page')
+
+    def on_first_page(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.row_keys = {row[0]: row[7:] for row in rows}
+        self.has_more = len(rows) == task_store.PAGE_SIZE
+        self.loading = False
+        self.endResetModel()
+
+    def patch_task(self, task_id):
+        """Задача создана или изменена: обновление только её строки, без перезагрузки списка"""
+        spec = self.spec
+        if spec["order"][0] == task_store.RANK_KEY:
+            self.db.submit(TaskStore.locate, spec, task_id,
+                           callback=lambda row: self.on_ranked(spec, task_id, row))
+            return
+        self.db.submit(TaskStore.locate, spec, task_id,
+                       callback=lambda row: self.on_located(spec, task_id, row))
+
+    def on_ranked(self, spec, task_id, row):
+        """Изменённая задача при поиске по релевантности: перезагрузка, если она найдена или была в списке"""
+        if spec is not self.spec:
+            return
+        if row is None and task_id not in self.row_keys:
+            # Задача не находится и не показана - найденные остаются на своих местах
+            # (сдвиг bm25 от размера коллекции не стоит повторного поиска по всей базе)
+            return
+        # Релевантность (bm25) зависит от всей коллекции и меняется у всех найденных задач
+        self.reload()
+
+    def on_located(self, spec, task_id, row):
+        """Вставка, замена или удаление строки задачи по её новой версии (None - в выборку не входит)"""
+        if spec is not self.spec:
+            # Фильтры сменились, новая первая страница уже запрошена
+            return
+        old = self.index_of(task_id)
+        old_row = self.rows.pop(old) if old is not None else None
+        pos = self.position(row[7:]) if row is not None else None
+        if pos == len(self.rows) and self.has_more:
+            # Место задачи за последней загруженной строкой: она придёт со следующей страницей
+            pos = None
+        if pos is not None:
+            self.row_keys[task_id] = row[7:]
+        else:
+            self.row_keys.pop(task_id, None)
+        if old is not None and pos == old:
+            self.rows.insert(pos, row)
+            self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(COLUMNS) - 1))
+            return
+        if old is not None:
+            self.rows.insert(old, old_row)
+            self.beginRemoveRows(QModelIndex(), old, old)
+            del self.rows[old]
+            self.endRemoveRows()
+        if pos is not None:
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self.rows.insert(pos, row)
+            self.endInsertRows()
+
+    def remove_task(self, task_id):
+        """Задача удалена: убрать её строку"""
+        row = self.index_of(task_id)
+        if row is None:
+            return
+        del self.row_keys[task_id]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.endRemoveRows()
+
+    def index_of(self, task_id):
+        """Номер загруженной строки задачи или None: двоичный поиск по её ключу (в ключе есть id, он уникален)"""
+        key = self.row_keys.get(task_id)
+        if key is None:
+            return None
+        # position - место сразу после строк с ключом не больше key, строка задачи - перед ним
+        pos = self.position(key) - 1
+        return pos if pos >= 0 and self.rows[pos][0] == task_id else None
+
+    def position(self, key):
+        """Место для строки с ключом key среди загруженных (двоичный поиск, строки упорядочены по ключу).
+
+        Ключи сравниваются так же, как в SQLite: числа - по значению, строки - побайтово
+        в UTF-8, что совпадает с порядком символов в Python.
+        """
+        descending = self.spec.get("desc")
+        lo, hi = 0, len(self.rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self.rows[mid][7:]
+            if (other < key) if descending else (other > key):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def task_at(self, row):
+        """Данные задачи по номеру строки"""
+        return self.rows[row][:7]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            col = index.column()
+            value = row[col + 1]
+            if col in (2, 3):
+                return format_day(value)
+            if col == 4:
+                return value or 'В работе'
+            if col == 5:
+                return value or 'Средний'
+            return value or ''
+        if role == Qt.ItemDataRole.UserRole:
+            return row[0]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.has_more and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Запрос следующей страницы при прокрутке"""
+        if parent.isValid() or not self.rows:
+            return
+        self.loading = True
+        # Ключ сортировки хранится в конце строки, после полей задачи
+        self.db.submit(TaskStore.fetch_page, self.spec, self.rows[-1][7:],
+                       callback=self.on_page, channel='tasks_page')
+
+    def on_page(self, page):
+        self.has_more = len(page) == task_store.PAGE_SIZE
+        self.loading = False
+        if not page:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.rows.extend(page)
+        self.row_keys.update((row[0], row[7:]) for row in page)
+        self.endInsertRows()
+
+
+class OccurrenceTableModel(QAbstractTableModel):
+    """Повторения серий за видимые дни (строки task_store.Occurrence); ячейки формируются при отрисовке"""
+    COLUMNS = ['Дата', 'Заголовок', 'Задача', 'Повтор', 'Статус', 'Приоритет']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        row = self.rows[index.row()]
+        col = index.column()
+        if col == 0:
+            return format_day(row.day)
+        if col == 5:
+            return row.priority or 'Средний'
+        return (row.title, row.task, row.rule, row.status)[col - 1]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+
+class TimelineModel(QAbstractTableModel):
+    """Лента событий по дням: строки (day, kind, title, status, priority); kind None - строка «ещё N»"""
+    COLUMNS = ['Дата', 'Событие', 'Заголовок', 'Статус', 'Приоритет']
+    KINDS = {'until': 'Дедлайн', 'alert': 'Оповещение', 'series': 'Повтор'}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        day, kind, title, status, priority = self.rows[index.row()]
+        col = index.column()
+        if col == 0:
+            return format_day(day)
+        if col == 1:
+            return self.KINDS.get(kind, '')
+        return (title, status, priority)[col - 2]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
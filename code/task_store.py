@@ -0,0 +1,887 @@
+import os
+import re
+import heapq
+import sqlite3
+from collections import namedtuple
+from operator import attrgetter
+from contextlib import contextmanager
+from migrations import migrate, ARCHIVE_MIGRATIONS
+from dates import parse_day
+from recurrence import Series, SERIES_COLUMNS, occurrences, describe
+import morphology
+import profiler
+import task_cache
+
+# Доступ к задачам без Qt: им пользуются оба окна (через поток DbWorker),
+# фоновые задачи экспорта/импорта и консольная утилита cli.py.
+
+Task = namedtuple('Task', 'id title task until alert status priority')
+# Прежние значения задач до массового изменения: поля, строки (id, значения полей...), удалены ли задачи
+Snapshot = namedtuple('Snapshot', 'columns rows deleted')
+# Повторение серии: день (дедлайн), день оповещения, статус (отметка или вычисленный) и правило для показа
+Occurrence = namedtuple('Occurrence', 'series_id day title task alert status priority rule')
+# Строка истории для графиков: создано и выполнено за день, открытых и просроченных задач в конце дня
+DayStats = namedtuple('DayStats', 'day created done open overdue')
+
+STATUSES = ['Не начата', 'В работе', 'Выполнена', 'Просрочена', 'Отменена']
+PRIORITIES = ['Низкий', 'Средний', 'Высокий']
+TASK_COLUMNS = "t.id, t.title, t.task, t.until, t.alert, t.status, t.priority"
+# Дни создания, смены статуса и закрытия: их ставят триггеры, при переносе задачи копируются как есть
+HISTORY_COLUMNS = ['created', 'changed', 'closed']
+# RETURNING (SQLite 3.35+) отдаёт изменённую задачу тем же запросом, без повторного чтения
+RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+RETURNING_COLUMNS = " RETURNING id, title, task, until, alert, status, priority"
+# Сколько строк подгружается из БД за один раз
+PAGE_SIZE = 200
+# Ключи сортировки по полям задачи; для всех, кроме task, есть индексы (миграция sort_indexes).
+# Пустые значения сортируются как в интерфейсе: даты в конец, статус и приоритет по умолчанию.
+SORT_KEYS = {
+    "title": "t.title",
+    "task": "t.task",
+    "until": "IFNULL(t.until, 2147483647)",
+    "alert": "IFNULL(t.alert, 2147483647)",
+    "status": "IFNULL(t.status, 'В работе')",
+    "priority": "CASE t.priority WHEN 'Низкий' THEN 1 WHEN 'Высокий' THEN 3 ELSE 2 END",
+}
+# Ключ порядка результатов поиска (релевантность)
+RANK_KEY = "bm25(tasks_fts)"
+# На сколько дней вперёд оповещения повторений ставятся в планировщик; дальше - при пересчёте в полночь
+SERIES_HORIZON_DAYS = 2
+CLOSED_STATUSES = ('Выполнена', 'Отменена')
+# Уровень надёжности записи (PRAGMA synchronous): OFF, NORMAL или FULL.
+# В режиме WAL уровень NORMAL не теряет целостность БД, но последние транзакции
+# могут пропасть при отключении питания.
+DURABILITY = os.environ.get('TASKPLANNER_DURABILITY', 'NORMAL').upper()
+# Через сколько дней после закрытия задача переносится в архив (0 - не переносить)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TASKPLANNER_ARCHIVE_DAYS', '90'))
+# Сколько задач переносится в архив за один шаг фоновой обработки (одна пара транзакций)
+ARCHIVE_BATCH = 200
+# Сколько свободных страниц файла БД отдаётся системе за один шаг сжатия
+COMPACT_PAGES = 1000
+# Сколько задач, изменённых другими соединениями, обновляется по одной; при большем числе - перезагрузка списка
+CHANGES_LIMIT = 100
+# Сколько последних записей журнала изменений остаётся после обслуживания БД
+CHANGES_KEEP = 1000
+# С какого числа задач поля для фильтров и сортировки держатся в памяти потока БД (task_cache);
+# 0 - не держать. Без NumPy кэша нет, выборки идут через SQLite
+CACHE_MIN_TASKS = int(os.environ.get('TASKPLANNER_CACHE_MIN_TASKS', '50000'))
+# Сколько задач загружается в кэш за один шаг фоновой загрузки
+CACHE_BATCH = 20000
+# Поля сортировки, которые кэш ведёт сам (None - по id)
+CACHE_SORTS = (None, 'until', 'alert', 'status', 'priority')
+# Выборка всех задач по id: её SQLite отдаёт и без кэша
+CACHE_ALL = ("Все", "Все", None)
+
+
+def fts_query(text):
+    """Запрос для FTS5: каждое слово ищется по префиксу, все слова обязательны"""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def prefix_end(word):
+    """Верхняя граница строк, начинающихся с word: условие lemma >= word AND lemma < prefix_end(word)"""
+    return word[:-1] + chr(ord(word[-1]) + 1)
+
+
+def archive_path(db_path):
+    """Файл архива закрытых задач рядом с файлом БД: tasks.db - tasks_archive.db"""
+    base, ext = os.path.splitext(db_path)
+    return base + '_archive' + (ext or '.db')
+
+
+def filter_spec(status="Все", priority="Все", search="", sort=None, descending=False, morph=False,
+                archive=False):
+    """Описание выборки задач по фильтрам: источник, условия, параметры и ключ сортировки.
+
+    sort - поле из SORT_KEYS; без него задачи идут по id, а при поиске - по релевантности.
+    morph - поиск по словоформам (индекс лемм) вместо полнотекстового; порядок - как без поиска.
+    archive - выборка из архива закрытых задач вместо основной таблицы.
+    """
+    schema = "archive." if archive else ""
+    spec = {"source": schema + "tasks t", "where": "", "params": [], "order": ["t.id"], "desc": False}
+    match = "" if morph else fts_query(search)
+    words = morphology.query_words(search) if morph else []
+    for word in words:
+        # Слово ищется по всем своим леммам и как начало леммы (пока его дописывают);
+        # леммы слова вычисляет SQL-функция word_lemmas в потоке запроса, с кэшем
+        spec["where"] += (" AND t.id IN (SELECT task_id FROM " + schema + "task_lemmas WHERE lemma IN"
+                          " (SELECT value FROM json_each(word_lemmas(?))) OR (lemma >= ? AND lemma < ?))")
+        spec["params"] += [word, word, prefix_end(word)]
+    if match:
+        # Полнотекстовый поиск, самые релевантные задачи выше
+        spec["source"] = schema + "tasks_fts f JOIN " + schema + "tasks t ON t.id = f.rowid"
+        # bm25() вместо f.rank: условие на rank FTS5 принимает за настройку ранжирования
+        spec["order"] = [RANK_KEY, "t.id"]
+        spec["where"] += " AND tasks_fts MATCH ?"
+        spec["params"].append(match)
+    if (sort == "status" and status != "Все") or (sort == "priority" and priority != "Все"):
+        # Все задачи выборки с одним значением ключа: остаётся второй ключ, id в выбранном направлении
+        sort = None
+        spec["order"] = ["t.id"]
+        spec["desc"] = descending
+    if sort is not None:
+        # id - второй ключ: делает порядок однозначным для постраничной загрузки
+        spec["order"] = [SORT_KEYS[sort], "t.id"]
+        spec["desc"] = descending
+    # При сортировке по индексу фильтр проверяется по ходу его обхода ("+" отключает индекс
+    # фильтра): страница читается с нужного места, а не сортируется вся выборка заново
+    column = "+t." if sort is not None and sort != "task" and not match else "t."
+    if status != "Все":
+        spec["where"] += " AND " + column + "status=?"
+        spec["params"].append(status)
+    if priority != "Все":
+        spec["where"] += " AND " + column + "priority=?"
+        spec["params"].append(priority)
+    if not match and not words and not archive and sort in CACHE_SORTS:
+        # Выборку может отдать кэш колонок (TaskStore.cached), условия выше - для SQLite без него
+        spec["cached"] = (status, priority, sort)
+    return spec
+
+
+def event_key(series_id, day):
+    """Ключ повторения серии в планировщике (у задач ключ - их id)"""
+    return ('series', series_id, day)
+
+
+def assignments(status=None, priority=None, shift_days=0):
+    """SET-часть массового изменения: присваивания, их параметры и изменяемые поля"""
+    sets = []
+    params = []
+    columns = []
+    if status is not None:
+        sets.append("status=?")
+        params.append(status)
+        columns.append("status")
+    if priority is not None:
+        sets.append("priority=?")
+        params.append(priority)
+        columns.append("priority")
+    if shift_days:
+        # Даты - номера дней, сдвиг - сложение; задачи без дедлайна не меняются
+        sets.append("until=until+?")
+        params.append(shift_days)
+        columns.append("until")
+    return sets, params, columns
+
+
+def order_by(spec):
+    direction = " DESC" if spec.get("desc") else ""
+    return ", ".join(key + direction for key in spec["order"])
+
+
+def prepare_file(conn):
+    """Режим WAL; новый файл создаётся с постраничным сжатием (см. TaskStore.compact)"""
+    # auto_vacuum меняется только до создания первой таблицы, для готового файла - через VACUUM
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+class TaskStore:
+    """Хранилище задач поверх одного соединения с tasks.db.
+
+    Соединение работает в режиме автокоммита: одиночный запрос - своя транзакция,
+    несколько изменений объединяются через transaction() (или DbWorker).
+    Архив закрытых задач подключён к тому же соединению как схема archive.
+    """
+
+    def __init__(self, db_path, durability=DURABILITY):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, isolation_level=None, factory=profiler.connection_factory())
+        prepare_file(self.conn)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # Для поиска по словоформам (filter_spec с morph=True)
+        self.conn.create_function('word_lemmas', 1, morphology.lemmas_json, deterministic=True)
+        # Кэш колонок задач (load_cache): только у хранилища потока БД
+        self.cache = None
+        # Схема main - до подключения архива: транзакции её миграций записали бы заголовок в новый пустой
+        # файл архива раньше, чем migrate_archive переведёт его в WAL с постраничным сжатием
+        migrate(self.conn)
+        self.attach_archive()
+        self.migrate_archive()
+        if durability in ('OFF', 'NORMAL', 'FULL'):
+            self.conn.execute(f"PRAGMA main.synchronous={durability}")
+            self.conn.execute(f"PRAGMA archive.synchronous={durability}")
+
+    def attach_archive(self):
+        """Подключение архива как схемы archive"""
+        self.conn.execute("ATTACH DATABASE ? AS archive", (archive_path(self.db_path),))
+
+    def migrate(self):
+        """Миграции базы и подключённого архива (например, после восстановления из снимка)"""
+        migrate(self.conn)
+        self.migrate_archive()
+
+    def migrate_archive(self):
+        """Миграции архива своим соединением (migrate обновляет схему main); оно открывается,
+        только если версия подключённого архива отстала, и на это время архив отключается"""
+        if self.conn.execute("PRAGMA archive.user_version").fetchone()[0] >= len(ARCHIVE_MIGRATIONS):
+            return
+        self.conn.execute("DETACH DATABASE archive")
+        conn = sqlite3.connect(archive_path(self.db_path), isolation_level=None)
+        try:
+            prepare_file(conn)
+            conn.execute("PRAGMA busy_timeout=5000")
+            migrate(conn, ARCHIVE_MIGRATIONS)
+        finally:
+            conn.close()
+            self.attach_archive()
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Несколько изменений одной транзакцией.
+
+        Блокировка записи берётся сразу (IMMEDIATE): транзакция, начатая с чтения, не смогла бы
+        перейти к записи после чужого коммита и упала бы с «database is locked» без ожидания.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            self.discard_cache()
+            raise
+        self.conn.commit()
+
+    # Кэш колонок задач (task_cache) для выборок без поиска
+
+    def load_cache(self, limit=CACHE_BATCH):
+        """Шаг фоновой загрузки кэша (Database.submit_batches): число загруженных задач, 0 - загружен или не нужен"""
+        if self.cache is None:
+            if task_cache.np is None or not CACHE_MIN_TASKS:
+                return 0
+            count = self.conn.execute("SELECT IFNULL(SUM(count), 0) FROM main.task_stats").fetchone()[0]
+            if count < CACHE_MIN_TASKS:
+                return 0
+            self.cache = task_cache.TaskCache()
+        return self.cache.load(self.conn, limit)
+
+    def cached(self, spec):
+        """Кэш, обновлённый по журналу изменений, если выборку spec может отдать он, иначе None"""
+        if self.cache is None or "cached" not in spec or not self.cache.sync(self.conn, CACHE_BATCH):
+            return None
+        return self.cache
+
+    def discard_cache(self):
+        """Транзакция отменена: кэш перечитывается при следующем запросе"""
+        if self.cache is not None:
+            self.cache.discard()
+
+    # Чтение
+
+    def fetch_page(self, spec, after):
+        """Следующая страница задач после ключа after (без OFFSET).
+
+        Строки - поля задачи, за которыми идут значения ключа сортировки (ключ, id).
+        Продолжение читается в два шага, каждый - поиском по индексу сортировки:
+        остаток задач с тем же значением ключа (дальше по id), затем задачи
+        со следующими значениями ключа.
+        """
+        cache = self.cached(spec)
+        if cache is not None:
+            ids = cache.page(*spec["cached"], spec["desc"], after, PAGE_SIZE)
+            if ids is not None:
+                return self.rows_by_id(spec, ids)
+        if after is None:
+            return self.page(spec, "", [], PAGE_SIZE)
+        op = " < " if spec.get("desc") else " > "
+        if len(after) == 1:
+            return self.page(spec, " AND t.id" + op + "?", list(after), PAGE_SIZE)
+        key, last_id = after
+        # Ключ здесь постоянный, порядок только по id: иначе SQLite сортирует во временном B-дереве
+        rows = self.page(spec, " AND " + spec["order"][0] + "=? AND t.id" + op + "?", [key, last_id], PAGE_SIZE,
+                         order="t.id" + (" DESC" if spec.get("desc") else ""))
+        if len(rows) < PAGE_SIZE:
+            rows += self.page(spec, " AND " + spec["order"][0] + op + "?", [key], PAGE_SIZE - len(rows))
+        return rows
+
+    def page(self, spec, where, params, limit, order=None):
+        keys = ", ".join(spec["order"])
+        query = ("SELECT " + TASK_COLUMNS + ", " + keys +
+                 " FROM " + spec["source"] + " WHERE 1=1" + spec["where"] + where +
+                 " ORDER BY " + (order or order_by(spec)) + " LIMIT ?")
+        return self.conn.execute(query, spec["params"] + params + [limit]).fetchall()
+
+    def rows_by_id(self, spec, ids):
+        """Строки задач ids в формате fetch_page и в том же порядке"""
+        if not ids:
+            return []
+        rows = {row[0]: row for row in self.conn.execute(
+            "SELECT " + TASK_COLUMNS + ", " + ", ".join(spec["order"]) + " FROM tasks t WHERE t.id IN (" +
+            ", ".join("?" * len(ids)) + ")", ids)}
+        return [rows[task_id] for task_id in ids if task_id in rows]
+
+    def locate(self, spec, task_id):
+        """Строка задачи в формате fetch_page (с ключом сортировки) или None, если задача не входит в выборку"""
+        rows = self.page(spec, " AND t.id=?", [task_id], 1, order="t.id")
+        return rows[0] if rows else None
+
+    def select(self, spec, columns=TASK_COLUMNS):
+        """Курсор по всем задачам выборки spec в порядке её ключа"""
+        query = ("SELECT " + columns + " FROM " + spec["source"] + " WHERE 1=1" + spec["where"] +
+                 " ORDER BY " + order_by(spec))
+        return self.conn.execute(query, spec["params"])
+
+    def count(self, spec):
+        """Количество задач в выборке spec"""
+        cache = self.cached(spec)
+        if cache is not None:
+            return cache.count(*spec["cached"][:2])
+        query = "SELECT COUNT(*) FROM " + spec["source"] + " WHERE 1=1" + spec["where"]
+        return self.conn.execute(query, spec["params"]).fetchone()[0]
+
+    def get_task(self, task_id):
+        """Задача по id или None"""
+        row = self.conn.execute("SELECT " + TASK_COLUMNS + " FROM tasks t WHERE t.id=?", (task_id,)).fetchone()
+        return Task._make(row) if row else None
+
+    # Изменения
+
+    def add_task(self, title, task, until, alert, status, priority):
+        """Создание задачи (даты строками YYYY-MM-DD), возвращает её"""
+        query = """INSERT INTO tasks (title, task, until, alert, status, priority)
+                   VALUES (?, ?, ?, ?, ?, ?)"""
+        params = (title, task, parse_day(until), parse_day(alert), status, priority)
+        if RETURNING:
+            row = self.returning(query, params)
+        else:
+            row = self.get_task(self.conn.execute(query, params).lastrowid)
+        self.lemmatize([row.id])
+        return row
+
+    def add_many(self, rows):
+        """Вставка готовых строк (title, task, until, alert, status, priority), даты - номера дней.
+
+        Возвращает id первой и последней вставленной задачи: внутри транзакции они идут подряд
+        (AUTOINCREMENT, блокировка записи у этого соединения).
+        """
+        count = self.conn.executemany("""INSERT INTO tasks (title, task, until, alert, status, priority)
+                                         VALUES (?, ?, ?, ?, ?, ?)""", rows).rowcount
+        last = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return last - count + 1, last
+
+    def discard_added(self, first, last):
+        """Удаление задач first..last, вставленных отменённой операцией (импорт): в сводке daily_stats
+        они не остаются ни созданными, ни открытыми"""
+        self.conn.execute("""UPDATE daily_stats SET created = created - (
+                                 SELECT COUNT(*) FROM tasks WHERE id BETWEEN ? AND ? AND created = daily_stats.day)
+                             WHERE day IN (SELECT created FROM tasks WHERE id BETWEEN ? AND ?)""",
+                          (first, last, first, last))
+        self.conn.execute("DELETE FROM tasks WHERE id BETWEEN ? AND ?", (first, last))
+
+    def update_task(self, task_id, title, task, until, alert, status, priority):
+        """Изменение задачи (даты строками YYYY-MM-DD), возвращает её новую версию или None, если её нет"""
+        query = """UPDATE tasks SET title=?, task=?, until=?, alert=?, status=?, priority=? WHERE id=?"""
+        params = (title, task, parse_day(until), parse_day(alert), status, priority, task_id)
+        if RETURNING:
+            row = self.returning(query, params)
+        else:
+            self.conn.execute(query, params)
+            row = self.get_task(task_id)
+        if row is not None:
+            self.lemmatize([row.id])
+        return row
+
+    def returning(self, query, params):
+        """Изменение одной задачи с RETURNING: её новая версия или None"""
+        # fetchall, а не fetchone: запрос должен дойти до конца, иначе он остаётся незавершённым
+        rows = self.conn.execute(query + RETURNING_COLUMNS, params).fetchall()
+        return Task._make(rows[0]) if rows else None
+
+    def delete_task(self, task_id):
+        """Удаление задачи, возвращает её id"""
+        self.conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
+        return task_id
+
+    def bulk_update(self, spec, status=None, priority=None, shift_days=0):
+        """Смена статуса, приоритета и/или сдвиг дедлайна всех задач выборки одним запросом, возвращает их число"""
+        sets, params, _ = assignments(status, priority, shift_days)
+        if not sets:
+            return 0
+        query = ("UPDATE tasks SET " + ", ".join(sets) +
+                 " WHERE id IN (SELECT t.id FROM " + spec["source"] + " WHERE 1=1" + spec["where"] + ")")
+        return self.conn.execute(query, params + spec["params"]).rowcount
+
+    # Массовые изменения выбранных задач: одним запросом по временной таблице id,
+    # с возвратом прежних значений для отмены (undo)
+
+    def mark(self, ids):
+        """Заполнение временной таблицы selected_ids (своя у каждого соединения)"""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS selected_ids (id INTEGER PRIMARY KEY)")
+        self.conn.execute("DELETE FROM selected_ids")
+        self.conn.executemany("INSERT OR IGNORE INTO selected_ids (id) VALUES (?)", ((i,) for i in ids))
+
+    def bulk_edit(self, ids, status=None, priority=None, shift_days=0):
+        """Смена статуса, приоритета и/или сдвиг дедлайна задач ids, возвращает Snapshot для undo"""
+        sets, params, columns = assignments(status, priority, shift_days)
+        if not sets:
+            return Snapshot(columns, [], False)
+        self.mark(ids)
+        old = self.conn.execute("SELECT id, " + ", ".join(columns) +
+                                " FROM tasks WHERE id IN (SELECT id FROM selected_ids)").fetchall()
+        self.conn.execute("UPDATE tasks SET " + ", ".join(sets) +
+                          " WHERE id IN (SELECT id FROM selected_ids)", params)
+        return Snapshot(columns, old, False)
+
+    def bulk_delete(self, ids):
+        """Удаление задач ids, возвращает Snapshot для undo"""
+        self.mark(ids)
+        # С днями истории: возвращённые задачи не считаются новыми (migrations.task_history)
+        old = self.conn.execute("SELECT " + TASK_COLUMNS + "".join(", t." + c for c in HISTORY_COLUMNS) +
+                                " FROM tasks t WHERE t.id IN (SELECT id FROM selected_ids)").fetchall()
+        self.conn.execute("DELETE FROM tasks WHERE id IN (SELECT id FROM selected_ids)")
+        return Snapshot(list(Task._fields[1:]) + HISTORY_COLUMNS, old, True)
+
+    def undo(self, snapshot):
+        """Возврат прежних значений из Snapshot, возвращает число задач"""
+        if snapshot.deleted:
+            self.conn.executemany("INSERT INTO tasks (id, " + ", ".join(snapshot.columns) + ") VALUES (?" +
+                                  ", ?" * len(snapshot.columns) + ")", snapshot.rows)
+            self.lemmatize([row[0] for row in snapshot.rows])
+        elif snapshot.columns:
+            # Только изменённые поля: триггеры полнотекстового индекса не срабатывают зря
+            self.conn.executemany("UPDATE tasks SET " + ", ".join(c + "=?" for c in snapshot.columns) +
+                                  " WHERE id=?", [row[1:] + row[:1] for row in snapshot.rows])
+        return len(snapshot.rows)
+
+    # Индекс словоформ (morphology.py): леммы задач пишутся вместе с самими задачами,
+    # а задачи из очереди lemma_queue (до миграции, импорт, изменения вне приложения) - пачками
+
+    def lemmatize(self, ids, batch=500):
+        """Леммы задач ids в task_lemmas вместо прежних; задачи снимаются с очереди. Возвращает их число"""
+        count = 0
+        for start in range(0, len(ids), batch):
+            chunk = ids[start:start + batch]
+            # Сначала запись: транзакция, начатая с чтения, может не получить блокировку записи
+            self.conn.executemany("DELETE FROM task_lemmas WHERE task_id=?", ((i,) for i in chunk))
+            rows = self.conn.execute("SELECT id, title, task FROM tasks WHERE id IN (" +
+                                     ", ".join("?" * len(chunk)) + ")", chunk).fetchall()
+            self.conn.executemany("INSERT INTO task_lemmas (lemma, task_id) VALUES (?, ?)",
+                                  ((lemma, _id) for _id, title, task in rows
+                                   for lemma in morphology.text_lemmas(title, task)))
+            self.conn.executemany("DELETE FROM lemma_queue WHERE id=?", ((i,) for i in chunk))
+            count += len(rows)
+        return count
+
+    def lemmatize_queued(self, limit):
+        """Лемматизация следующих limit задач очереди, возвращает их число (0 - очередь пуста).
+
+        Своя транзакция или точка сохранения внутри уже открытой транзакции (импорт).
+        """
+        ids = [row[0] for row in self.conn.execute("SELECT id FROM lemma_queue ORDER BY id LIMIT ?", (limit,))]
+        if not ids:
+            return 0
+        self.conn.execute("SAVEPOINT lemmas")
+        try:
+            self.lemmatize(ids)
+        except BaseException:
+            self.conn.execute("ROLLBACK TO lemmas")
+            self.conn.execute("RELEASE lemmas")
+            raise
+        self.conn.execute("RELEASE lemmas")
+        return len(ids)
+
+    def lemma_backlog(self):
+        """Сколько задач ждёт лемматизации: пока их больше нуля, поиск по словоформам находит не всё"""
+        return self.conn.execute("SELECT COUNT(*) FROM lemma_queue").fetchone()[0]
+
+    # Архив: закрытые задачи переносятся в отдельный файл (схема archive) через ARCHIVE_AFTER_DAYS
+    # дней после закрытия, поэтому список, проверка сроков и календарь работают с небольшой tasks.
+    # Изменения затрагивают оба файла, а транзакция на два файла в режиме WAL атомарна только
+    # для каждого файла по отдельности. Поэтому сначала фиксируется копия задач, затем удаление
+    # оригиналов: после сбоя задача может оказаться в обоих файлах, но не пропасть. Переносимые
+    # задачи записываются в archive.moving вместе с копией, следующий перенос начинается с settle_moves.
+
+    def settle_moves(self):
+        """Завершение прошлого переноса: задача из archive.moving, оставшаяся в обоих файлах, остаётся в tasks
+        (перенос в архив прерван, а её успели открыть заново, или прерван возврат из архива).
+        Вызывается внутри транзакции, читает не больше одной пачки задач"""
+        self.conn.execute("""DELETE FROM archive.tasks WHERE id IN (SELECT id FROM archive.moving)
+                             AND id IN (SELECT id FROM main.tasks)""")
+        self.conn.execute("DELETE FROM archive.moving")
+
+    def archive_closed(self, before, limit=ARCHIVE_BATCH):
+        """Перенос в архив следующих limit задач, закрытых раньше дня before; возвращает их число (0 - больше нет).
+
+        Сам открывает транзакции: вызывается вне общей транзакции потока БД (Database.submit_standalone).
+        """
+        # Задачи по порядку id: соседние строки лежат рядом, удаление пачки меняет меньше страниц.
+        # Кандидаты - из индекса по дню закрытия (без него планировщик обходит всю таблицу по id)
+        ids = [row[0] for row in self.conn.execute(
+            "SELECT id FROM main.tasks INDEXED BY idx_tasks_closed WHERE closed < ? ORDER BY id LIMIT ?",
+            (before, limit))]
+        if not ids:
+            if self.conn.execute("SELECT 1 FROM archive.moving LIMIT 1").fetchone():
+                with self.transaction():
+                    self.settle_moves()
+            return 0
+        self.mark(ids)
+        # Задачи без лемм лемматизируются до переноса: очереди лемм в архиве нет
+        queued = [row[0] for row in self.conn.execute(
+            "SELECT id FROM lemma_queue WHERE id IN (SELECT id FROM selected_ids)")]
+        with self.transaction():
+            self.settle_moves()
+            self.lemmatize(queued)
+            # Копии, оставшиеся от прерванного переноса, заменяются
+            self.conn.execute("DELETE FROM archive.tasks WHERE id IN (SELECT id FROM selected_ids)")
+            self.conn.execute("INSERT INTO archive.moving (id) SELECT id FROM selected_ids")
+            self.conn.execute("""INSERT INTO archive.tasks
+                                     (id, title, task, until, alert, status, priority, created, changed, closed)
+                                 SELECT id, title, task, until, alert, status, priority, created, changed, closed
+                                 FROM main.tasks WHERE id IN (SELECT id FROM selected_ids)""")
+            self.conn.execute("""INSERT INTO archive.task_lemmas (lemma, task_id)
+                                 SELECT lemma, task_id FROM main.task_lemmas
+                                 WHERE task_id IN (SELECT id FROM selected_ids)""")
+        with self.transaction():
+            self.conn.execute("DELETE FROM main.tasks WHERE id IN (SELECT id FROM selected_ids) AND closed < ?",
+                              (before,))
+            # Задачу успели открыть заново (например, из cli.py): она остаётся в tasks, копия не нужна
+            self.conn.execute("""DELETE FROM archive.tasks WHERE id IN (SELECT id FROM selected_ids)
+                                 AND id IN (SELECT id FROM main.tasks)""")
+        return len(ids)
+
+    def unarchive(self, ids, today):
+        """Возврат задач ids из архива, возвращает их число.
+
+        Задача остаётся закрытой, днём закрытия становится today: иначе следующий перенос
+        сразу вернёт её в архив. Транзакции - как у archive_closed.
+        """
+        self.mark(ids)
+        with self.transaction():
+            self.settle_moves()
+            self.conn.execute("""INSERT INTO archive.moving (id)
+                                 SELECT id FROM archive.tasks WHERE id IN (SELECT id FROM selected_ids)""")
+            count = self.conn.execute("""INSERT OR IGNORE INTO main.tasks
+                                             (id, title, task, until, alert, status, priority, created, changed,
+                                              closed)
+                                         SELECT id, title, task, until, alert, status, priority, created, changed, ?
+                                         FROM archive.tasks WHERE id IN (SELECT id FROM selected_ids)""",
+                                      (today,)).rowcount
+            self.lemmatize(list(ids))
+        with self.transaction():
+            self.conn.execute("""DELETE FROM archive.tasks WHERE id IN (SELECT id FROM selected_ids)
+                                 AND id IN (SELECT id FROM main.tasks)""")
+        return count
+
+    def compact(self, pages=COMPACT_PAGES):
+        """Шаг сжатия: до pages свободных страниц основного файла и архива отдаётся системе.
+
+        Возвращает число освобождённых страниц (0 - сжимать нечего). Действует на файлы
+        с auto_vacuum=INCREMENTAL (созданные этой версией или после vacuum); в остальных
+        свободные страницы только занимаются заново новыми задачами.
+        """
+        freed = 0
+        for schema in ('main', 'archive'):
+            if self.conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0] != 2:
+                continue
+            free = self.conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]
+            if free:
+                # executescript выполняет прагму до конца; execute освободил бы одну страницу
+                self.conn.executescript(f"PRAGMA {schema}.incremental_vacuum({min(free, pages)})")
+                freed += free - self.conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]
+        return freed
+
+    def vacuum(self):
+        """Полное сжатие обоих файлов (VACUUM) с переводом на постраничное сжатие; всё это время БД занята"""
+        for schema in ('main', 'archive'):
+            self.conn.execute(f"PRAGMA {schema}.auto_vacuum=INCREMENTAL")
+            self.conn.execute(f"VACUUM {schema}")
+
+    # Изменения из других соединений (второй экземпляр приложения, cli.py, импорт): триггеры пишут
+    # id изменённых задач в журнал change_log, каждый экземпляр помнит номер последней прочитанной записи
+
+    def changes_since(self, seen, limit=CHANGES_LIMIT):
+        """Задачи, изменённые другими соединениями после seen: (новое seen, изменения).
+
+        seen - (номер последней прочитанной записи журнала, PRAGMA data_version при чтении),
+        None - первый вызов, изменения отсчитываются от него. Изменения - список (id, строка
+        задачи или None, если её больше нет в tasks); None вместо списка - изменений больше limit
+        или нужные записи журнала уже удалены, список надо перезагрузить целиком. Пока другие
+        соединения ничего не коммитили (data_version прежняя), журнал не читается: seen только
+        сдвигается за свои же изменения.
+        """
+        # Конец журнала - до data_version: коммит между ними изменит версию и попадёт в этот же вызов
+        last = self.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if seen is None or seen[1] == version or seen[0] == last:
+            return (last, version), []
+        rows = self.conn.execute("SELECT seq, task_id FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                                 (seen[0], limit + 1)).fetchall()
+        # Записи идут подряд, пропуск в начале - их уже удалило обслуживание (trim_changes)
+        if not rows or rows[0][0] > seen[0] + 1 or len(rows) > limit:
+            return (max(last, rows[-1][0] if rows else 0), version), None
+        ids = list(dict.fromkeys(task_id for _, task_id in rows))
+        tasks = {row[0]: row for row in self.conn.execute(
+            "SELECT id, title, task, until, alert, status, priority FROM tasks WHERE id IN (" +
+            ", ".join("?" * len(ids)) + ")", ids)}
+        return (rows[-1][0], version), [(task_id, tasks.get(task_id)) for task_id in ids]
+
+    def changed_days(self, seen, limit=CHANGES_LIMIT):
+        """Дни дедлайнов и оповещений задач, изменённых после записи журнала seen (своих и чужих):
+        (новое seen, множество дней). None вместо множества - изменений больше limit или нужные
+        записи журнала уже удалены; seen None - первый вызов, дни отсчитываются от него.
+        """
+        last = self.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM change_log").fetchone()[0]
+        if seen is None or seen == last:
+            return last, set()
+        rows = self.conn.execute("SELECT seq, until, alert, old_until, old_alert FROM change_log"
+                                 " WHERE seq > ? ORDER BY seq LIMIT ?", (seen, limit + 1)).fetchall()
+        if not rows or rows[0][0] > seen + 1 or len(rows) > limit:
+            return last, None
+        return rows[-1][0], {day for row in rows for day in row[1:] if day is not None}
+
+    def trim_changes(self, keep=CHANGES_KEEP):
+        """Удаление старых записей журнала изменений, кроме последних keep; возвращает их число"""
+        if self.cache is not None:
+            # Иначе кэш, отставший больше чем на keep записей, пришлось бы загружать заново
+            self.cache.sync(self.conn, CACHE_BATCH)
+        return self.conn.execute("DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?",
+                                 (keep,)).rowcount
+
+    def day_range(self, first, last, per_day, today):
+        """События дней [first, last] для календаря и ленты: дедлайны, оповещения и повторения серий.
+
+        Возвращает {day: [count, items]}: count - все события дня, items - не больше per_day событий
+        каждого вида, строки (kind, id, title, status, priority). Объём работы зависит от числа дней
+        и задач в диапазоне, а не от размера таблицы: на каждый день - поиск по индексу ключа даты
+        (миграция sort_indexes), количества - один проход по диапазону того же индекса.
+        """
+        days = {}
+        for kind in ('until', 'alert'):
+            key = SORT_KEYS[kind]
+            for day, count in self.conn.execute("SELECT " + key + ", COUNT(*) FROM tasks t WHERE " + key +
+                                                " BETWEEN ? AND ? GROUP BY 1", (first, last)):
+                days.setdefault(day, [0, []])[0] += count
+            rows = self.conn.execute("""WITH RECURSIVE range(day) AS (
+                                            SELECT ? UNION ALL SELECT day + 1 FROM range WHERE day < ?)
+                                        SELECT range.day, x.id, x.title, x.status, x.priority
+                                        FROM range JOIN tasks x ON x.id IN (
+                                            SELECT t.id FROM tasks t WHERE """ + key + """ = range.day LIMIT ?)""",
+                                     (first, last, per_day))
+            for day, _id, title, status, priority in rows:
+                days[day][1].append((kind, _id, title, status, priority))
+        # Повторения серий: в дне считаются все, а строки (и статусы) - только первых per_day
+        # по названию, в том же порядке, что у occurrences
+        series_days = {day: [] for day in range(first, last + 1)}
+        for series in self.all_series():
+            for day in occurrences(series, first, last):
+                series_days[day].append(series)
+        marks = self.overrides(first, last)
+        for day, found in series_days.items():
+            if not found:
+                continue
+            entry = days.setdefault(day, [0, []])
+            entry[0] += len(found)
+            for series in heapq.nsmallest(per_day, found, key=attrgetter('title')):
+                status = marks.get((series.id, day)) or ('Просрочена' if day < today else 'В работе')
+                entry[1].append(('series', series.id, series.title, status, series.priority))
+        return days
+
+    # Агрегаты
+
+    def status_counts(self):
+        """Количество задач по статусам вместе с архивом (счётчики ведутся триггерами в обоих файлах)"""
+        return dict(self.conn.execute("""SELECT status, SUM(count) FROM (
+                                             SELECT status, count FROM main.task_stats
+                                             UNION ALL
+                                             SELECT status, count FROM archive.task_stats)
+                                         GROUP BY status HAVING SUM(count) > 0"""))
+
+    def daily_history(self, first, last):
+        """История по дням [first, last] для графиков: список DayStats по порядку дней.
+
+        Число открытых и просроченных задач на прошедший день восстанавливается от сегодняшнего
+        (счётчики task_stats) вычитанием изменений из сводки daily_stats за последующие дни:
+        читаются только строки сводки с first по сегодня, по одной на день, сами задачи - нет.
+        Дни до начала истории (миграция task_history) не возвращаются.
+        """
+        start = self.conn.execute("SELECT MIN(day) FROM daily_stats").fetchone()[0]
+        if start is None:
+            return []
+        first = max(first, start)
+        counts = dict(self.conn.execute("SELECT status, count FROM main.task_stats"))
+        open_count = sum(count for status, count in counts.items() if status not in CLOSED_STATUSES)
+        overdue = counts.get('Просрочена', 0)
+        deltas = {row[0]: row[1:] for row in self.conn.execute(
+            "SELECT day, created, done, open_delta, overdue_delta FROM daily_stats WHERE day >= ?", (first,))}
+        history = []
+        for day in range(max(last, max(deltas, default=last)), first - 1, -1):
+            created, done, open_delta, overdue_delta = deltas.get(day, (0, 0, 0, 0))
+            if day <= last:
+                history.append(DayStats(day, created, done, open_count, overdue))
+            open_count -= open_delta
+            overdue -= overdue_delta
+        history.reverse()
+        return history
+
+    # Оповещения и дедлайны (today - номер дня)
+
+    def check_due(self, today):
+        """Сегодняшние оповещения и просроченные задачи.
+
+        Оба шага - по одному запросу по частичным индексам, без разбора дат в Python.
+        Оповещения сбрасываются, просроченные задачи помечаются. Возвращает
+        заголовки задач для напоминаний и число изменённых задач.
+        """
+        cur = self.conn.cursor()
+        alerts = cur.execute("""SELECT id, title FROM tasks
+                                WHERE alert=? AND status NOT IN ('Выполнена', 'Отменена')""",
+                             (today,)).fetchall()
+        changed = cur.execute("""UPDATE tasks SET alert=NULL
+                                 WHERE alert=? AND status NOT IN ('Выполнена', 'Отменена')""", (today,)).rowcount
+        changed += cur.execute("""UPDATE tasks SET status=?
+                                  WHERE until < ? AND status NOT IN ('Выполнена', 'Отменена')
+                                  AND status != ?""", ('Просрочена', today, 'Просрочена')).rowcount
+        keys = [event_key(series.id, today + series.alert_offset) for series in self.all_series()
+                if series.alert_offset is not None]
+        return [title for _, title in alerts] + self.fire_series_alerts(keys, today), changed
+
+    def scheduled_events(self, today):
+        """Будущие оповещения и дедлайны открытых задач: строки (id, alert, until, status).
+
+        Вместе с ними - ближайшие оповещения повторяющихся задач (см. series_events).
+        """
+        # UNION вместо OR, чтобы каждая половина шла по своему частичному индексу
+        rows = self.conn.execute("""SELECT id, alert, until, status FROM tasks
+                                    WHERE status NOT IN ('Выполнена', 'Отменена') AND alert >= ?
+                                    UNION
+                                    SELECT id, alert, until, status FROM tasks
+                                    WHERE status NOT IN ('Выполнена', 'Отменена') AND until >= ?""",
+                                 (today, today)).fetchall()
+        return rows + self.series_events(today)
+
+    def apply_fired(self, alerts, overdue, today):
+        """Обработка наступивших событий планировщика, только для указанных задач (результат - как у check_due)"""
+        cur = self.conn.cursor()
+        titles = self.fire_series_alerts([key for key in alerts if isinstance(key, tuple)], today)
+        for _id in alerts:
+            if isinstance(_id, tuple):
+                continue
+            row = cur.execute("""SELECT title FROM tasks
+                                 WHERE id=? AND alert=? AND status NOT IN ('Выполнена', 'Отменена')""",
+                              (_id, today)).fetchone()
+            if row:
+                cur.execute("""UPDATE tasks SET alert=NULL WHERE id=?""", (_id,))
+                titles.append(row[0])
+        cur.executemany("""UPDATE tasks SET status=?
+                           WHERE id=? AND until < ?
+                           AND status NOT IN ('Выполнена', 'Отменена', 'Просрочена')""",
+                        [('Просрочена', _id, today) for _id in overdue])
+        return titles, len(titles) + max(cur.rowcount, 0)
+
+    # Повторяющиеся задачи (recurrence.py): повторения не хранятся, а вычисляются для диапазона дней
+
+    def add_series(self, title, task, start, freq, interval=1, end_day='', count=None, alert_offset=None,
+                   priority='Средний'):
+        """Создание серии (start и end_day строками YYYY-MM-DD), возвращает её"""
+        cur = self.conn.execute(
+            """INSERT INTO series (title, task, start, freq, interval, end_day, count, alert_offset, priority)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (title, task, parse_day(start), freq, interval, parse_day(end_day), count or None, alert_offset, priority)
+        )
+        return self.get_series(cur.lastrowid)
+
+    def update_series(self, series_id, title, task, start, freq, interval=1, end_day='', count=None,
+                      alert_offset=None, priority='Средний'):
+        """Изменение серии (start и end_day строками YYYY-MM-DD), возвращает её новую версию или None.
+
+        Отметки остаются у дней, которые и по новому правилу - повторения серии; отметки
+        выпавших из правила дней удаляются.
+        """
+        self.conn.execute(
+            """UPDATE series SET title=?, task=?, start=?, freq=?, interval=?, end_day=?, count=?, alert_offset=?,
+               priority=? WHERE id=?""",
+            (title, task, parse_day(start), freq, interval, parse_day(end_day), count or None, alert_offset, priority,
+             series_id)
+        )
+        series = self.get_series(series_id)
+        if series is not None:
+            days = [day for (day,) in self.conn.execute("SELECT day FROM series_overrides WHERE series_id=?",
+                                                        (series_id,))]
+            self.set_occurrences([(series_id, day) for day in days if day not in occurrences(series, day, day)], None)
+        return series
+
+    def get_series(self, series_id):
+        row = self.conn.execute("SELECT " + SERIES_COLUMNS + " FROM series WHERE id=?", (series_id,)).fetchone()
+        return Series._make(row) if row else None
+
+    def all_series(self):
+        """Все серии (их немного: одна строка на правило, а не на повторение)"""
+        return [Series._make(row) for row in self.conn.execute("SELECT " + SERIES_COLUMNS + " FROM series")]
+
+    def delete_series(self, series_ids):
+        """Удаление серий вместе с отметками их повторений, возвращает их число"""
+        params = [(series_id,) for series_id in series_ids]
+        self.conn.executemany("DELETE FROM series_overrides WHERE series_id=?", params)
+        self.conn.executemany("DELETE FROM series WHERE id=?", params)
+        return len(params)
+
+    def set_occurrences(self, keys, status):
+        """Отметка повторений keys - пар (series_id, day) - статусом; None - снять отметку"""
+        if status is None:
+            self.conn.executemany("DELETE FROM series_overrides WHERE series_id=? AND day=?", keys)
+        else:
+            self.conn.executemany("""INSERT INTO series_overrides (series_id, day, status) VALUES (?, ?, ?)
+                                     ON CONFLICT(series_id, day) DO UPDATE SET status=excluded.status""",
+                                  [(series_id, day, status) for series_id, day in keys])
+        return len(keys)
+
+    def overrides(self, first, last):
+        """Отметки повторений в диапазоне дней: {(series_id, day): status}"""
+        return {(series_id, day): status for series_id, day, status in self.conn.execute(
+            "SELECT series_id, day, status FROM series_overrides WHERE day BETWEEN ? AND ?", (first, last))}
+
+    def occurrences(self, first, last, today):
+        """Повторения всех серий в диапазоне дней [first, last] по дате (Occurrence).
+
+        Без отметки повторение в работе, а после своего дня - просрочено.
+        """
+        marks = self.overrides(first, last)
+        rows = []
+        for series in self.all_series():
+            rule = describe(series)
+            for day in occurrences(series, first, last):
+                status = marks.get((series.id, day)) or ('Просрочена' if day < today else 'В работе')
+                alert = day - series.alert_offset if series.alert_offset is not None else None
+                rows.append(Occurrence(series.id, day, series.title, series.task, alert, status,
+                                       series.priority, rule))
+        rows.sort(key=lambda row: (row.day, row.title))
+        return rows
+
+    def series_events(self, today, horizon=SERIES_HORIZON_DAYS):
+        """Оповещения повторений на ближайшие horizon дней: строки планировщика (ключ, alert, None, status)"""
+        rows = []
+        for series in self.all_series():
+            if series.alert_offset is None:
+                continue
+            # День повторения = день оповещения + alert_offset; уже оповещённые повторения пропускаются
+            first = today + series.alert_offset
+            if series.alerted_through is not None:
+                first = max(first, series.alerted_through + 1)
+            last = today + horizon + series.alert_offset
+            marks = self.overrides(first, last)
+            for day in occurrences(series, first, last):
+                status = marks.get((series.id, day))
+                if status not in CLOSED_STATUSES:
+                    rows.append((event_key(series.id, day), day - series.alert_offset, None, status))
+        return rows
+
+    def fire_series_alerts(self, keys, today):
+        """Оповещения повторений, наступившие сегодня (ключи event_key): заголовки для напоминаний.
+
+        Каждое оповещение показывается один раз: у серии запоминается день последнего оповещённого повторения.
+        """
+        titles = []
+        for _, series_id, day in keys:
+            series = self.get_series(series_id)
+            if (series is None or series.alert_offset is None or day - series.alert_offset != today
+                    or (series.alerted_through is not None and day <= series.alerted_through)
+                    or day not in occurrences(series, day, day)
+                    or self.overrides(day, day).get((series_id, day)) in CLOSED_STATUSES):
+                continue
+            self.conn.execute("UPDATE series SET alerted_through=? WHERE id=?", (day, series_id))
+            titles.append(series.title)
+        return titles
@@ -0,0 +1,75 @@
+from task_store import filter_spec
+
+
+def today_stats(store):
+    """Сегодняшняя строка сводки daily_stats: создано, выполнено, изменение открытых и просроченных"""
+    return store.conn.execute("SELECT created, done, open_delta, overdue_delta FROM daily_stats"
+                              " ORDER BY day DESC LIMIT 1").fetchone()
+
+
+def snapshot_of(store):
+    return store.conn.execute("SELECT id, title, task, until, alert, status, priority, created, changed, closed"
+                              " FROM tasks ORDER BY id").fetchall()
+
+
+def add(store, count):
+    return [store.add_task(f"задача {i}", "описание", "2025-01-10", "", "В работе", "Средний").id
+            for i in range(count)]
+
+
+def test_edit_undo(store):
+    ids = add(store, 5)
+    before = snapshot_of(store)
+    with store.transaction():
+        snapshot = store.bulk_edit(ids[:3], status="Выполнена", priority="Высокий", shift_days=2)
+    assert store.count(filter_spec("Выполнена", "Высокий")) == 3
+    assert store.get_task(ids[0]).until == before[0][3] + 2
+
+    with store.transaction():
+        assert store.undo(snapshot) == 3
+    assert snapshot_of(store) == before
+    assert store.status_counts() == {"В работе": 5}
+
+
+def test_delete_undo(store):
+    ids = add(store, 4)
+    before = snapshot_of(store)
+    stats = today_stats(store)
+    with store.transaction():
+        snapshot = store.bulk_delete(ids[1:3])
+    assert [store.get_task(i) for i in ids[1:3]] == [None, None]
+    assert store.count(filter_spec()) == 2
+
+    with store.transaction():
+        assert store.undo(snapshot) == 2
+    # Задачи возвращаются с прежними id и днями истории, новыми не считаются
+    assert snapshot_of(store) == before
+    assert today_stats(store) == stats
+    assert [row[0] for row in store.fetch_page(filter_spec(search="задача"), None)] == ids
+
+
+def test_single_delete_undo(store):
+    # Одиночное удаление из окна - тот же bulk_delete с одним id
+    task_id = add(store, 2)[0]
+    before = snapshot_of(store)
+    with store.transaction():
+        snapshot = store.bulk_delete([task_id])
+    assert [row[0] for row in snapshot.rows] == [task_id]
+    with store.transaction():
+        store.undo(snapshot)
+    assert snapshot_of(store) == before
+
+
+def test_reopened_task_is_not_done(store):
+    ids = add(store, 3)
+    created = today_stats(store)
+    with store.transaction():
+        snapshot = store.bulk_edit(ids, status="Выполнена")
+    assert today_stats(store) == (created[0], 3, created[2] - 3, created[3])
+    with store.transaction():
+        store.undo(snapshot)
+    assert today_stats(store) == created
+
+    store.update_task(ids[0], "задача 0", "", "", "", "Выполнена", None)
+    store.update_task(ids[0], "задача 0", "", "", "", "В работе", None)
+    assert today_stats(store) == created
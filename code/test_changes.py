@@ -0,0 +1,81 @@
+import pytest
+import backup
+from task_store import TaskStore
+
+
+@pytest.fixture
+def other(store):
+    """Второе соединение с той же БД - как второй экземпляр приложения или cli.py"""
+    other = TaskStore(store.db_path)
+    yield other
+    other.close()
+
+
+def add(store, title):
+    return store.add_task(title, "", "", "", "В работе", "Средний")
+
+
+def test_no_changes(store, other):
+    add(store, "своя")
+    seen, changes = store.changes_since(None)
+    assert changes == []
+    assert store.changes_since(seen) == (seen, [])
+    # Свои изменения не возвращаются: другие соединения ничего не коммитили
+    add(store, "ещё своя")
+    seen, changes = store.changes_since(seen)
+    assert changes == []
+    assert store.changes_since(seen) == (seen, [])
+
+
+def test_incremental(store, other):
+    first = add(store, "первая")
+    second = add(store, "вторая")
+    seen, _ = store.changes_since(None)
+
+    changed = other.update_task(first.id, "первая извне", "", "", "", "Выполнена", "Высокий")
+    seen, changes = store.changes_since(seen)
+    assert changes == [(first.id, tuple(changed))]
+
+    # Несколько изменений одной задачи - одна строка, удалённая задача - None
+    third = add(other, "третья")
+    other.update_task(third.id, "третья извне", "", "", "", "В работе", "Низкий")
+    other.delete_task(second.id)
+    seen, changes = store.changes_since(seen)
+    assert [(task_id, row and row[1]) for task_id, row in changes] == [(third.id, "третья извне"), (second.id, None)]
+    assert store.changes_since(seen) == (seen, [])
+
+
+def test_too_many_changes(store, other):
+    seen, _ = store.changes_since(None)
+    with other.transaction():
+        for i in range(6):
+            add(other, f"задача {i}")
+    assert store.changes_since(seen, limit=5)[1] is None
+    assert len(store.changes_since(seen, limit=6)[1]) == 6
+
+
+def test_gap_after_trim(store, other):
+    add(store, "первая")
+    seen, _ = store.changes_since(None)
+    with other.transaction():
+        for i in range(10):
+            add(other, f"задача {i}")
+        other.trim_changes(keep=3)
+    seen, changes = store.changes_since(seen)
+    assert changes is None
+    # После перезагрузки списка изменения снова приходят по одной
+    task = add(other, "после разрыва")
+    assert store.changes_since(seen)[1] == [(task.id, tuple(task))]
+
+
+def test_gap_after_restore(store, other):
+    kept = add(store, "в снимке")
+    path = backup.take_snapshot(store)
+    add(store, "после снимка")
+    seen, _ = store.changes_since(None)
+    backup.restore_snapshot(other, path)
+    seen, changes = store.changes_since(seen)
+    assert changes is None
+    assert [row[0] for row in store.conn.execute("SELECT id FROM tasks")] == [kept.id]
+    task = add(other, "после восстановления")
+    assert store.changes_since(seen)[1] == [(task.id, tuple(task))]
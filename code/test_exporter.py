@@ -0,0 +1,49 @@
+import csv
+import json
+import exporter
+from task_store import filter_spec, STATUSES, PRIORITIES
+from dates import format_day
+
+
+def fill(store, count):
+    store.add_many([(f"задача {i}", f"описание {i % 5}", 20000 + i % 9 if i % 4 else None,
+                     20000 + i % 3 if i % 6 else None, STATUSES[i % len(STATUSES)], PRIORITIES[i % 3])
+                    for i in range(count)])
+
+
+def test_csv_export_matches_fetch_page(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "CHUNK_SIZE", 4)
+    fill(store, 60)
+    spec = filter_spec(priority="Высокий", search="описание 2", sort="until", descending=True)
+    progress = []
+    path = exporter.export_tasks(store, str(tmp_path / 'tasks.csv'), 'csv', spec,
+                                 progress=lambda done, total: progress.append((done, total)))
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    expected = [[title, task, format_day(until), format_day(alert), status, priority]
+                for _, title, task, until, alert, status, priority, *_ in store.fetch_page(spec, None)]
+    assert 4 < len(expected) < 50
+    assert rows == [exporter.HEADER] + expected
+    assert progress == [(min(done, len(expected)), len(expected)) for done in range(4, len(expected) + 4, 4)]
+
+
+def test_jsonl_export_fields(store, tmp_path):
+    store.add_task("Отчёт", "годовой", "2025-03-31", "", "В работе", "Высокий")
+    path = exporter.export_tasks(store, str(tmp_path / 'tasks.jsonl'), 'jsonl', filter_spec())
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [{"title": "Отчёт", "task": "годовой", "until": "2025-03-31",
+                                                    "alert": "", "status": "В работе", "priority": "Высокий"}]
+
+
+def test_cancelled_export(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "CHUNK_SIZE", 5)
+    fill(store, 30)
+    path = tmp_path / 'tasks.csv'
+    progress = []
+    # Отмена после второй порции: недописанный файл удаляется
+    result = exporter.export_tasks(store, str(path), 'csv', filter_spec(),
+                                   progress=lambda done, total: progress.append(done),
+                                   cancelled=lambda: len(progress) == 2)
+    assert result is None
+    assert not path.exists()
+    assert progress == [5, 10]
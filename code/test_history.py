@@ -0,0 +1,100 @@
+import sqlite3
+from migrations import create_tasks
+from task_store import TaskStore, DayStats
+from dates import today_day
+
+
+def next_day(store):
+    """Сдвиг всей истории на день назад: дальше - как будто наступил следующий день"""
+    # Через отрицательные дни: иначе сдвинутая строка сводки натыкается на ключ соседней
+    store.conn.execute("UPDATE daily_stats SET day = -day")
+    store.conn.execute("UPDATE daily_stats SET day = -day - 1")
+    store.conn.execute("UPDATE tasks SET created = created - 1, changed = changed - 1, closed = closed - 1")
+
+
+def set_status(store, task_id, status):
+    task = store.get_task(task_id)
+    store.update_task(task_id, task.title, task.task, "", "", status, task.priority)
+
+
+def now_counts(store):
+    """Открытые и просроченные задачи по самим задачам"""
+    return store.conn.execute("""SELECT SUM(IFNULL(status, '') NOT IN ('Выполнена', 'Отменена')),
+                                        SUM(IFNULL(status, '') = 'Просрочена') FROM tasks""").fetchone()
+
+
+def raw_day(store, day):
+    """Созданные в день day задачи и выполненные в этот день, так и оставшиеся выполненными"""
+    return store.conn.execute("""SELECT SUM(created = ?), SUM(status = 'Выполнена' AND changed = ?)
+                                 FROM tasks""", (day, day)).fetchone()
+
+
+def test_rollup_matches_raw_history(store):
+    today = today_day()
+    ids = [store.add_task(f"задача {i}", "", "", "", "В работе", "Средний").id for i in range(6)]
+    for task_id in ids[:3]:
+        set_status(store, task_id, "Выполнена")
+    # Выполнена и открыта заново в тот же день
+    set_status(store, ids[2], "В работе")
+    set_status(store, ids[3], "Просрочена")
+    ends = [now_counts(store)]
+    next_day(store)
+
+    ids += [store.add_task(f"задача {i}", "", "", "", None, None).id for i in range(6, 8)]
+    # Открыта заново задача, выполненная вчера: вчерашних выполненных становится меньше
+    set_status(store, ids[0], "Не начата")
+    set_status(store, ids[6], "Выполнена")
+    set_status(store, ids[4], "Отменена")
+    set_status(store, ids[3], "Выполнена")
+    ends.append(now_counts(store))
+    next_day(store)
+
+    store.add_task("задача 8", "", "", "", "Просрочена", "Низкий")
+    set_status(store, ids[7], "Выполнена")
+    set_status(store, ids[6], "В работе")
+    set_status(store, ids[1], "Отменена")
+    ends.append(now_counts(store))
+
+    expected = [DayStats(day, *raw_day(store, day), *end) for day, end in zip(range(today - 2, today + 1), ends)]
+    assert [day[1:3] for day in expected] == [(6, 0), (2, 1), (1, 1)]
+    assert store.daily_history(today - 2, today) == expected
+    # Дни до начала истории не возвращаются, дни после сегодняшнего - без изменений
+    assert store.daily_history(today - 30, today + 1) == expected + [DayStats(today + 1, 0, 0, *ends[-1])]
+    assert store.daily_history(today - 1, today - 1) == expected[1:2]
+
+
+def test_bulk_status_and_delete(store):
+    today = today_day()
+    ids = [store.add_task(f"задача {i}", "", "", "", "В работе", "Средний").id for i in range(5)]
+    with store.transaction():
+        store.bulk_edit(ids[:3], status="Выполнена")
+    next_day(store)
+    with store.transaction():
+        store.bulk_edit(ids[1:4], status="Просрочена")
+        # Удалённая открытая задача уменьшает число открытых, созданные за её день не меняются
+        store.bulk_delete(ids[4:])
+    assert store.daily_history(today - 1, today) == [DayStats(today - 1, 5, 1, 2, 0),
+                                                     DayStats(today, 0, 0, 3, 3)]
+    assert now_counts(store) == (3, 3)
+
+
+def test_history_starts_at_migration(tmp_path):
+    # База до миграции task_history: прошлое задач неизвестно
+    path = str(tmp_path / 'tasks.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    create_tasks(conn.cursor())
+    conn.execute("PRAGMA user_version = 1")
+    conn.executemany("INSERT INTO tasks (title, task, status) VALUES (?, ?, ?)",
+                     [("a", "", "В работе"), ("b", "", "Выполнена"), ("c", "", "Просрочена")])
+    conn.close()
+
+    store = TaskStore(path)
+    try:
+        today = today_day()
+        assert store.daily_history(today - 30, today) == [DayStats(today, 0, 0, 2, 1)]
+        # Задача, выполненная до начала истории: открыть её заново - не минус выполненная
+        set_status(store, 2, "В работе")
+        set_status(store, 1, "Выполнена")
+        assert store.daily_history(today, today) == [DayStats(today, 0, 1, 2, 1)]
+    finally:
+        store.close()
@@ -0,0 +1,101 @@
+import pytest
+import exporter
+import importer
+from task_store import TaskStore, filter_spec, STATUSES, PRIORITIES
+
+
+def fill(store, count):
+    store.add_many([(f"задача {i}", f"описание {i % 5}", 20000 + i % 9 if i % 4 else None,
+                     20000 + i % 3 if i % 6 else None, STATUSES[i % len(STATUSES)], PRIORITIES[i % 3])
+                    for i in range(count)])
+
+
+def tasks_of(store):
+    """Задачи без id по порядку создания"""
+    return store.conn.execute("SELECT title, task, until, alert, status, priority FROM tasks ORDER BY id").fetchall()
+
+
+def state_of(store):
+    """Всё, что меняет вставка задач: сами задачи, индексы поиска, счётчики и сводка по дням"""
+    return (tasks_of(store), store.conn.execute("SELECT COUNT(*) FROM tasks_fts").fetchone(),
+            store.conn.execute("SELECT COUNT(*) FROM task_lemmas").fetchone(), store.status_counts(),
+            store.conn.execute("SELECT * FROM daily_stats ORDER BY day").fetchall())
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_import_rejects_bad_rows(store, tmp_path):
+    path = write(tmp_path / 'tasks.csv',
+                 "Заголовок,Задача,До,Оповещение,Статус,Приоритет\n"
+                 "Отчёт,квартальный,2025-03-31,2025-03-30,В работе,Высокий\n"
+                 "Отчёт,годовой,2025-13-01,,В работе,Высокий\n"
+                 ",без заголовка,,,,\n"
+                 "\"Письмо\",\"в две\nстроки\",,,Готово,\n"
+                 "Звонок,клиенту,,31.12.2025,,Низкий\n"
+                 "Счёт,оплатить,,,,\n")
+    imported, rejected_count, rejected = importer.import_tasks(store, path, 'csv')
+    assert (imported, rejected_count) == (2, 4)
+    # Номер строки записи из нескольких строк файла - последней из них
+    assert rejected == [(3, "неверная дата в поле until: 2025-13-01"), (4, "пустой заголовок или описание"),
+                        (6, "неизвестный статус: Готово"), (7, "неверная дата в поле alert: 31.12.2025")]
+    assert tasks_of(store) == [("Отчёт", "квартальный", 20178, 20177, "В работе", "Высокий"),
+                               ("Счёт", "оплатить", None, None, "В работе", "Средний")]
+
+
+def test_import_jsonl_line_numbers(store, tmp_path):
+    path = write(tmp_path / 'tasks.jsonl',
+                 '{"title": "Отчёт", "task": "годовой", "priority": "Низкий"}\n'
+                 '\n'
+                 '{"title": "Отчёт", "task": \n'
+                 '[1, 2]\n'
+                 '{"title": "Отчёт", "task": "месячный", "priority": "Срочный"}\n')
+    imported, rejected_count, rejected = importer.import_tasks(store, path, 'jsonl')
+    assert (imported, rejected_count) == (1, 3)
+    assert rejected == [(3, "строка не разобрана"), (4, "строка не разобрана"), (5, "неизвестный приоритет: Срочный")]
+
+
+def test_import_limits_rejected_report(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "MAX_REJECTED", 2)
+    path = write(tmp_path / 'tasks.csv', "".join(f"задача {i},,,,,\n" for i in range(5)))
+    assert importer.import_tasks(store, path, 'csv') == (0, 5, [(1, "пустой заголовок или описание"),
+                                                                (2, "пустой заголовок или описание")])
+
+
+@pytest.mark.parametrize("batches", [0, 2, 4])
+def test_cancelled_import_leaves_nothing(store, tmp_path, monkeypatch, batches):
+    monkeypatch.setattr(importer, "BATCH_SIZE", 3)
+    fill(store, 5)
+    # Очередь лемм разбирается и при импорте, к нему не относится
+    store.lemmatize_queued(100)
+    path = write(tmp_path / 'tasks.csv', "".join(f"Задача {i},описание,2025-01-0{i % 9 + 1},,В работе,Низкий\n"
+                                                 for i in range(13)))
+    before = state_of(store)
+    # Отмена перед пачкой номер batches + 1 (4 - после чтения всего файла, перед последней пачкой)
+    calls = []
+
+    def cancelled():
+        calls.append(None)
+        return len(calls) > batches
+
+    assert importer.import_tasks(store, path, 'csv', cancelled=cancelled) is None
+    assert state_of(store) == before
+    # Следующие задачи получают новые id, а не id удалённых
+    assert store.add_task("новая", "", "", "", "В работе", None).id == 6 + 3 * batches
+
+
+def test_export_reimports_to_same_tasks(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "CHUNK_SIZE", 7)
+    monkeypatch.setattr(importer, "BATCH_SIZE", 10)
+    fill(store, 40)
+    other = TaskStore(str(tmp_path / 'other.db'))
+    try:
+        for fmt in ('csv', 'jsonl'):
+            path = str(tmp_path / ('tasks.' + fmt))
+            assert exporter.export_tasks(store, path, fmt, filter_spec()) == path
+            assert importer.import_tasks(other, path, fmt) == (40, 0, [])
+        assert tasks_of(other) == tasks_of(store) * 2
+    finally:
+        other.close()
@@ -0,0 +1,45 @@
+import sqlite3
+from migrations import migrate, MIGRATIONS, create_tasks
+from task_store import TaskStore, filter_spec
+from dates import parse_day
+
+
+def version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_fresh_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'tasks.db'), isolation_level=None)
+    migrate(conn)
+    assert version(conn) == len(MIGRATIONS)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {'tasks', 'tasks_fts', 'task_stats', 'change_log', 'daily_stats', 'series'} <= tables
+    # Повторный запуск ничего не делает
+    migrate(conn)
+    assert version(conn) == len(MIGRATIONS)
+    conn.close()
+
+
+def test_old_database(tmp_path):
+    # Файл первой версии приложения: только таблица задач, даты - строками
+    path = str(tmp_path / 'tasks.db')
+    conn = sqlite3.connect(path, isolation_level=None)
+    create_tasks(conn.cursor())
+    conn.execute("PRAGMA user_version = 1")
+    conn.executemany("INSERT INTO tasks (title, task, until, alert, status, priority) VALUES (?, ?, ?, ?, ?, ?)",
+                     [("Отчёт", "квартальный отчёт", "2025-03-31", "", "В работе", "Высокий"),
+                      ("Покупки", "хлеб", "не дата", None, "Выполнена", None)])
+    conn.close()
+
+    store = TaskStore(path)
+    try:
+        assert version(store.conn) == len(MIGRATIONS)
+        report, shopping = store.get_task(1), store.get_task(2)
+        assert report.until == parse_day("2025-03-31") and report.alert is None
+        assert shopping.until is None
+        # Индексы и счётчики построены и по задачам, которые были до миграций
+        assert [row[0] for row in store.fetch_page(filter_spec(search="квартальн"), None)] == [1]
+        assert store.status_counts() == {"В работе": 1, "Выполнена": 1}
+        assert store.add_task("Новая", "", "", "", None, None).id == 3
+    finally:
+        store.close()
@@ -0,0 +1,98 @@
+import random
+import pytest
+import cli
+from recurrence import Series, occurrences, nth, first_index
+from dates import parse_day, format_day
+
+
+def series(start, freq, interval=1, end_day=None, count=None):
+    return Series(1, "серия", "", parse_day(start), freq, interval, end_day and parse_day(end_day), count,
+                  None, None, None)
+
+
+def days(rule, first, last):
+    return [format_day(day) for day in occurrences(rule, parse_day(first), parse_day(last))]
+
+
+def brute(rule, first, last):
+    """Повторения перебором всех номеров с нуля - для сравнения с occurrences"""
+    found = []
+    n = 0
+    while rule.count is None or n < rule.count:
+        day = nth(rule, n)
+        if day > last or (rule.end_day is not None and day > rule.end_day):
+            break
+        if day >= first:
+            found.append(day)
+        n += 1
+    return found
+
+
+def test_month_end():
+    # 31-е число в коротких месяцах - их последний день, следующий месяц снова 31-го
+    assert days(series("2024-01-31", "monthly"), "2024-01-01", "2024-05-31") == [
+        "2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31"]
+    assert days(series("2025-01-31", "monthly"), "2025-02-01", "2025-03-31") == ["2025-02-28", "2025-03-31"]
+    # Начало диапазона посреди серии: первый номер без перебора предыдущих
+    assert days(series("2023-08-31", "monthly", 6), "2024-02-01", "2025-03-01") == ["2024-02-29", "2024-08-31",
+                                                                                     "2025-02-28"]
+
+
+def test_dst_and_day_boundaries():
+    # Дни - номера дней без времени: переход на летнее/зимнее время не сдвигает повторения
+    assert days(series("2025-03-24", "weekly"), "2025-03-24", "2025-04-07") == ["2025-03-24", "2025-03-31",
+                                                                               "2025-04-07"]
+    assert days(series("2025-10-25", "daily"), "2025-10-25", "2025-10-27") == ["2025-10-25", "2025-10-26",
+                                                                              "2025-10-27"]
+    # Границы диапазона, end_day и count включаются
+    rule = series("2025-01-01", "daily", 3, end_day="2025-01-10")
+    assert days(rule, "2025-01-04", "2025-01-07") == ["2025-01-04", "2025-01-07"]
+    assert days(rule, "2025-01-01", "2025-12-31")[-1] == "2025-01-10"
+    assert days(series("2025-01-01", "weekly", count=3), "2024-12-01", "2025-12-31") == [
+        "2025-01-01", "2025-01-08", "2025-01-15"]
+    assert days(rule, "2025-01-02", "2025-01-03") == []
+
+
+@pytest.mark.parametrize("freq", ["daily", "weekly", "monthly"])
+def test_occurrences_match_brute_force(freq):
+    rng = random.Random(freq)
+    for _ in range(300):
+        start = 19000 + rng.randrange(400)
+        rule = Series(1, "", "", start, freq, rng.randint(1, 4),
+                      start + rng.randrange(800) if rng.random() < 0.5 else None,
+                      rng.randint(1, 30) if rng.random() < 0.5 else None, None, None, None)
+        first = start + rng.randrange(-50, 500)
+        last = first + rng.randrange(200)
+        assert list(occurrences(rule, first, last)) == brute(rule, first, last)
+        assert nth(rule, first_index(rule, first)) >= first
+
+
+def test_marks_survive_series_edit(store):
+    today = parse_day("2025-06-01")
+    with store.transaction():
+        rule = store.add_series("Полив", "", "2025-06-01", "daily")
+        store.set_occurrences([(rule.id, today + 2)], "Выполнена")
+        store.set_occurrences([(rule.id, today + 3)], "Отменена")
+
+    # Шаг в два дня: выполненное повторение остаётся в правиле, отменённое выпадает вместе с отметкой
+    with store.transaction():
+        edited = store.update_series(rule.id, "Полив цветов", "", "2025-06-01", "daily", 2)
+    assert edited.interval == 2 and edited.title == "Полив цветов"
+    assert store.overrides(today, today + 10) == {(rule.id, today + 2): "Выполнена"}
+    rows = store.occurrences(today, today + 4, today + 3)
+    assert [(row.day - today, row.status, row.title) for row in rows] == [
+        (0, "Просрочена", "Полив цветов"), (2, "Выполнена", "Полив цветов"), (4, "В работе", "Полив цветов")]
+    assert store.update_series(rule.id + 1, "нет", "", "2025-06-01", "daily") is None
+
+
+def test_cli_edit_series(tmp_path, capsys):
+    db = str(tmp_path / 'tasks.db')
+    cli.main(['--db', db, 'add', 'Отчёт', 'месячный', '--until', '2025-01-31', '--repeat', 'monthly', '--count', '3'])
+    cli.main(['--db', db, 'mark-occurrence', '1', '2025-03-31', 'Выполнена'])
+    cli.main(['--db', db, 'edit-series', '1', '--count', '0', '--every', '2'])
+    capsys.readouterr()
+    cli.main(['--db', db, 'occurrences', '--from', '2025-01-01', '--to', '2025-07-31'])
+    lines = [line.split('\t') for line in capsys.readouterr().out.splitlines()]
+    assert [(line[1], line[5]) for line in lines] == [
+        ("2025-01-31", "Просрочена"), ("2025-03-31", "Выполнена"), ("2025-05-31", "Просрочена"),
+        ("2025-07-31", "Просрочена")]
@@ -0,0 +1,125 @@
+from datetime import datetime, time
+import pytest
+from PyQt6.QtCore import QCoreApplication
+import scheduler
+from scheduler import DeadlineScheduler
+from dates import EPOCH, parse_day, day_to_date
+
+# Номер дня и полночь "сегодня" в тестах
+TODAY = parse_day("2025-06-10")
+MIDNIGHT = datetime(2025, 6, 10)
+
+
+class Clock(datetime):
+    """Часы планировщика, которые двигает тест"""
+    current = MIDNIGHT
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def sched(monkeypatch):
+    """Планировщик без окна: нужен только цикл событий Qt для таймера, сам он не запускается"""
+    app = QCoreApplication.instance() or QCoreApplication([])
+    monkeypatch.setattr(Clock, "current", MIDNIGHT.replace(hour=9))
+    monkeypatch.setattr(scheduler, "datetime", Clock)
+    monkeypatch.setattr(scheduler, "today_day", lambda: (Clock.current.date() - EPOCH).days)
+    sched = DeadlineScheduler()
+    sched.events = []
+    sched.fired.connect(lambda alerts, overdue: sched.events.append((alerts, overdue)))
+    yield sched
+    sched.timer.stop()
+    del app
+
+
+def at(sched, day, hour=0):
+    """Часы на day (номер дня) в hour часов и срабатывание таймера"""
+    Clock.current = datetime.combine(day_to_date(day), time(hour))
+    sched.on_timeout()
+    return sched.events.pop() if sched.events else None
+
+
+def wait_ms(sched):
+    """Интервал взведённого таймера или None, если он остановлен"""
+    return sched.timer.interval() if sched.timer.isActive() else None
+
+
+def test_events_fire_in_order(sched):
+    sched.schedule_many([(1, TODAY + 3, TODAY + 5, "В работе"),
+                         (2, TODAY + 1, None, "Не начата"),
+                         (3, None, TODAY + 1, None),
+                         (4, TODAY + 1, TODAY, "В работе")])
+    # Ближайшее событие - дедлайн задачи 4 (полночь после сегодняшнего дня) и оповещения на завтра
+    assert wait_ms(sched) == 15 * 3600 * 1000
+    assert at(sched, TODAY) is None
+    assert at(sched, TODAY + 1) == ([2, 4], [4])
+    assert at(sched, TODAY + 2) == ([], [3])
+    assert at(sched, TODAY + 3) == ([1], [])
+    # Дольше суток таймер не ждёт
+    assert wait_ms(sched) == scheduler.MAX_WAIT_MS
+    assert at(sched, TODAY + 6) == ([], [1])
+    assert sched.heap == [] and sched.planned == {} and sched.live == 0
+    assert wait_ms(sched) is None
+
+
+def test_only_due_events_fire(sched):
+    sched.schedule_many([(1, TODAY, TODAY + 2, "В работе"),
+                         (2, TODAY - 1, None, "В работе"),
+                         (3, TODAY + 1, TODAY + 1, "Выполнена"),
+                         (4, TODAY + 1, TODAY + 1, "Отменена"),
+                         (5, None, TODAY - 3, "Просрочена"),
+                         (6, TODAY + 4, TODAY + 9, "В работе")])
+    # Прошедшие оповещения, закрытые задачи и дедлайны уже просроченных задач не ставятся
+    assert sorted(sched.planned) == [1, 6]
+    # Сегодняшнее оповещение наступило в полночь: таймер срабатывает сразу
+    assert wait_ms(sched) == 0
+    assert at(sched, TODAY, hour=9) == ([1], [])
+    assert at(sched, TODAY + 2, hour=23) is None
+    assert at(sched, TODAY + 5) == ([6], [1])
+    assert list(sched.planned) == [6]
+
+
+def test_rearm_after_edit_and_delete(sched):
+    sched.schedule(1, TODAY + 1, None, "В работе")
+    sched.schedule(2, TODAY + 3, None, "В работе")
+    assert wait_ms(sched) == 15 * 3600 * 1000
+
+    # Оповещение перенесено на потом: таймер - до следующего события, старая запись не срабатывает
+    sched.schedule(1, TODAY + 2, None, "В работе")
+    assert at(sched, TODAY + 1, hour=9) is None
+    assert wait_ms(sched) == 15 * 3600 * 1000
+
+    # Задача выполнена: её событий больше нет
+    sched.schedule(1, TODAY + 2, None, "Выполнена")
+    assert wait_ms(sched) == scheduler.MAX_WAIT_MS
+    assert at(sched, TODAY + 2) is None
+
+    sched.unschedule(2)
+    assert wait_ms(sched) is None
+    assert at(sched, TODAY + 4) is None
+    assert sched.live == 0
+
+
+def test_long_wait_is_capped(sched):
+    sched.schedule(1, TODAY + 400, None, "В работе")
+    assert wait_ms(sched) == scheduler.MAX_WAIT_MS
+    # Таймер сработал раньше события: событие остаётся, таймер взводится снова
+    assert at(sched, TODAY + 1) is None
+    assert wait_ms(sched) == scheduler.MAX_WAIT_MS
+    assert at(sched, TODAY + 400) == ([1], [])
+
+
+def test_stale_entries_are_compacted(sched):
+    sched.schedule_many([(task_id, TODAY + 5, TODAY + 9, "В работе") for task_id in range(1, 11)])
+    # Каждое изменение оставляет в куче устаревшие записи (в том числе на прежнее время задачи),
+    # куча не растёт больше 2 * live + 64
+    for n in range(500):
+        sched.schedule(1 + n % 10, TODAY + 5 + n // 10 % 2, TODAY + 9, "В работе")
+        assert len(sched.heap) <= 2 * sched.live + 64
+    assert sched.live == 20
+    assert sum(sched.is_live(entry) for entry in sched.heap) == 20
+    fired = at(sched, TODAY + 10)
+    assert sorted(fired[0]) == list(range(1, 11)) and sorted(fired[1]) == list(range(1, 11))
+    assert sched.heap == []
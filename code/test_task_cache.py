@@ -0,0 +1,98 @@
+import pytest
+import task_store
+from task_store import filter_spec, CACHE_SORTS, PRIORITIES
+
+pytest.importorskip("numpy")
+
+STATUSES = ['Не начата', 'В работе', 'Выполнена', None]
+FILTERS = [("Все", "Все"), ("В работе", "Все"), ("Все", "Высокий"), ("Выполнена", "Низкий"), ("Отменена", "Все")]
+
+
+@pytest.fixture
+def cached_store(store, monkeypatch):
+    """Хранилище с загруженным кэшем колонок (маленькие порции и страницы)"""
+    monkeypatch.setattr(task_store, "CACHE_MIN_TASKS", 1)
+    monkeypatch.setattr(task_store, "CACHE_BATCH", 50)
+    monkeypatch.setattr(task_store, "PAGE_SIZE", 9)
+    store.add_many([(f"задача {i}", "", 20000 + i % 6 if i % 4 else None, 20000 + i % 3 if i % 5 else None,
+                     STATUSES[i % 4], (PRIORITIES + [None])[i // 4 % 4]) for i in range(200)])
+    while store.load_cache():
+        pass
+    return store
+
+
+def all_pages(store, spec):
+    rows = store.fetch_page(spec, None)
+    while len(rows) % task_store.PAGE_SIZE == 0 and rows:
+        page = store.fetch_page(spec, rows[-1][7:])
+        if not page:
+            break
+        rows += page
+    return rows
+
+
+def assert_same(store):
+    """Кэш и SQL отдают одни и те же страницы и количества для всех сортировок, направлений и фильтров"""
+    for status, priority in FILTERS:
+        for sort in CACHE_SORTS:
+            for descending in (False, True):
+                spec = filter_spec(status, priority, sort=sort, descending=descending)
+                assert "cached" in spec
+                sql = dict(spec)
+                del sql["cached"]
+                assert all_pages(store, spec) == all_pages(store, sql), (status, priority, sort, descending)
+                assert store.count(spec) == store.count(sql)
+    assert store.cached(filter_spec()) is not None
+
+
+def test_loaded(cached_store):
+    assert cached_store.cache.size == 200
+    assert_same(cached_store)
+
+
+def test_inserts(cached_store):
+    assert_same(cached_store)
+    # Несколько задач переставляются в готовых порядках, много - порядки строятся заново
+    for count in (2, 30):
+        with cached_store.transaction():
+            for i in range(count):
+                cached_store.add_task(f"новая {i}", "", "2024-10-0" + str(i % 9 + 1), "", STATUSES[i % 4],
+                                      PRIORITIES[i % 3])
+        assert_same(cached_store)
+
+
+def test_edits(cached_store):
+    assert_same(cached_store)
+    with cached_store.transaction():
+        cached_store.update_task(5, "задача 5", "", "2030-01-01", "", "Выполнена", "Высокий")
+        cached_store.update_task(6, "задача 6", "", "", "1990-01-01", None, None)
+    assert_same(cached_store)
+    with cached_store.transaction():
+        cached_store.bulk_edit(range(10, 60), status="Отменена", shift_days=3)
+    assert_same(cached_store)
+
+
+def test_deletes_and_undo(cached_store):
+    assert_same(cached_store)
+    with cached_store.transaction():
+        cached_store.delete_task(7)
+        snapshot = cached_store.bulk_delete(range(20, 80))
+    assert_same(cached_store)
+    # Отмена удаления возвращает задачи с прежними id - посреди имеющихся
+    with cached_store.transaction():
+        cached_store.undo(snapshot)
+    assert_same(cached_store)
+
+
+def test_rolled_back_write(cached_store):
+    assert_same(cached_store)
+    with pytest.raises(RuntimeError):
+        with cached_store.transaction():
+            cached_store.update_task(3, "задача 3", "", "2001-01-01", "", "Отменена", "Низкий")
+            cached_store.add_task("пропадёт", "", "", "", "В работе", "Высокий")
+            # Кэш успевает применить изменения отменяемой транзакции
+            assert cached_store.count(filter_spec("Отменена", "Низкий")) == 1
+            raise RuntimeError
+    assert cached_store.cache.stale
+    assert_same(cached_store)
+    assert cached_store.count(filter_spec("Отменена", "Низкий")) == 0
@@ -0,0 +1,278 @@
+from contextlib import contextmanager
+import pytest
+import task_store
+from task_store import Task, filter_spec, PRIORITIES
+from dates import parse_day
+
+
+def fill(store, count):
+    """count задач с повторяющимися статусами, приоритетами и датами: у ключей сортировки много равных значений"""
+    statuses = ['Не начата', 'В работе', 'Выполнена', None]
+    priorities = PRIORITIES + [None]
+    store.add_many([(f"задача {i % 7}", f"описание {i}", 20000 + i % 5 if i % 3 else None, None,
+                     statuses[i % 4], priorities[i // 3 % 4]) for i in range(count)])
+
+
+def all_pages(store, spec):
+    """Все задачи выборки постранично: продолжение - после ключа последней строки"""
+    rows = store.fetch_page(spec, None)
+    pages = 1
+    while len(rows) == pages * task_store.PAGE_SIZE:
+        rows += store.fetch_page(spec, rows[-1][7:])
+        pages += 1
+    return rows
+
+
+def test_crud(store):
+    task = store.add_task("Отчёт", "квартальный", "2025-03-31", "2025-03-30", "В работе", "Высокий")
+    assert task == Task(task.id, "Отчёт", "квартальный", parse_day("2025-03-31"), parse_day("2025-03-30"),
+                        "В работе", "Высокий")
+    assert store.get_task(task.id) == task
+
+    changed = store.update_task(task.id, "Отчёт", "годовой", "", "", "Выполнена", "Низкий")
+    assert changed == Task(task.id, "Отчёт", "годовой", None, None, "Выполнена", "Низкий")
+    assert store.get_task(task.id) == changed
+
+    assert store.delete_task(task.id) == task.id
+    assert store.get_task(task.id) is None
+    assert store.update_task(task.id, "x", "y", "", "", None, None) is None
+
+
+def test_status_counts_follow_changes(store):
+    first = store.add_task("a", "", "", "", "В работе", None)
+    store.add_task("b", "", "", "", "В работе", None)
+    store.update_task(first.id, "a", "", "", "", "Выполнена", None)
+    assert store.status_counts() == {"В работе": 1, "Выполнена": 1}
+
+
+def test_filter_spec(store):
+    fill(store, 60)
+    tasks = [store.get_task(i) for i in range(1, 61)]
+
+    spec = filter_spec("В работе", "Высокий")
+    expected = [t.id for t in tasks if t.status == "В работе" and t.priority == "Высокий"]
+    assert [row[0] for row in all_pages(store, spec)] == expected
+    assert store.count(spec) == len(expected)
+
+    # Поиск - по началу слова, найденные задачи - по релевантности
+    spec = filter_spec(search="описан 1")
+    assert spec["order"][0] == task_store.RANK_KEY
+    found = {row[0] for row in all_pages(store, spec)}
+    assert found == {t.id for t in tasks if any(w.startswith("1") for w in (t.title + " " + t.task).split())}
+
+    # Сортировка по статусу при фильтре по статусу - по id, направление сохраняется
+    assert filter_spec("Выполнена", sort="status")["order"] == ["t.id"]
+    spec = filter_spec("Выполнена", search="описание", sort="status", descending=True)
+    assert (spec["order"], spec["desc"]) == (["t.id"], True)
+    expected = [t.id for t in tasks if t.status == "Выполнена"]
+    assert [row[0] for row in all_pages(store, spec)] == expected[::-1]
+
+
+@pytest.mark.parametrize("sort", list(task_store.SORT_KEYS) + [None])
+@pytest.mark.parametrize("descending", [False, True])
+def test_fetch_page_ties(store, monkeypatch, sort, descending):
+    # Маленькие страницы: группы равных ключей разрываются границами страниц
+    monkeypatch.setattr(task_store, "PAGE_SIZE", 7)
+    fill(store, 100)
+    spec = filter_spec(sort=sort, descending=descending)
+    rows = all_pages(store, spec)
+    assert [row[0] for row in rows] == [row[0] for row in store.select(spec, "t.id")]
+    assert sorted(row[0] for row in rows) == list(range(1, 101))
+    keys = [row[7:] for row in rows]
+    # Без поля сортировки задачи идут по id, направление не учитывается
+    assert keys == sorted(keys, reverse=descending and sort is not None)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_collapsed_sort_keeps_direction(store, monkeypatch, descending):
+    monkeypatch.setattr(task_store, "PAGE_SIZE", 4)
+    fill(store, 50)
+    spec = filter_spec(priority="Высокий", sort="priority", descending=descending)
+    ids = [row[0] for row in all_pages(store, spec)]
+    assert len(ids) > 8
+    assert ids == sorted(ids, reverse=descending)
+    assert ids == [row[0] for row in store.select(spec, "t.id")]
+    for task_id in ids:
+        assert store.locate(spec, task_id)[0] == task_id
+
+
+def test_fetch_page_filtered_descending(store, monkeypatch):
+    monkeypatch.setattr(task_store, "PAGE_SIZE", 5)
+    fill(store, 80)
+    spec = filter_spec(priority="Низкий", sort="until", descending=True)
+    rows = all_pages(store, spec)
+    assert [row[0] for row in rows] == [row[0] for row in store.select(spec, "t.id")]
+    assert {row[6] for row in rows} == {"Низкий"}
+
+
+def test_locate(store):
+    fill(store, 30)
+    spec = filter_spec(status="Выполнена", sort="priority")
+    for row in all_pages(store, spec):
+        assert store.locate(spec, row[0]) == row
+    outside = next(i for i in range(1, 31) if store.get_task(i).status != "Выполнена")
+    assert store.locate(spec, outside) is None
+    assert store.locate(spec, 1000) is None
+
+
+def closed_tasks(store):
+    """Шесть задач: закрытые давно (1, 2, 4), недавно (3) и открытые (5, 6)"""
+    store.add_many([("Полить цветы", "на балконе", 20000, None, "Выполнена", "Низкий"),
+                    ("Отчёт", "квартальный отчёт", None, None, "Отменена", "Высокий"),
+                    ("Отчёт", "годовой отчёт", None, None, "Выполнена", "Средний"),
+                    ("Купить хлеб", "", 20001, 20000, "Выполнена", None),
+                    ("Отчёт", "месячный отчёт", 20010, None, "В работе", "Высокий"),
+                    ("Позвонить", "", None, None, None, None)])
+    store.conn.execute("UPDATE tasks SET closed = CASE WHEN id = 3 THEN 20090 ELSE 20000 END WHERE closed IS NOT NULL")
+    store.lemmatize_queued(100)
+
+
+def ids_in(store, schema):
+    return [row[0] for row in store.conn.execute(f"SELECT id FROM {schema}.tasks ORDER BY id")]
+
+
+def lemma_ids(store, schema):
+    return sorted({row[0] for row in store.conn.execute(f"SELECT task_id FROM {schema}.task_lemmas")})
+
+
+def found(store, search, archive, morph=False):
+    return sorted(row[0] for row in store.select(filter_spec(search=search, morph=morph, archive=archive)))
+
+
+def assert_indexes(store):
+    """Полнотекстовые индексы обоих файлов совпадают с таблицами, леммы есть ровно у их задач"""
+    for schema in ("main", "archive"):
+        store.conn.execute(f"INSERT INTO {schema}.tasks_fts(tasks_fts) VALUES ('integrity-check')")
+        assert lemma_ids(store, schema) == ids_in(store, schema)
+
+
+def test_archive_closed(store):
+    closed_tasks(store)
+    rows = store.conn.execute("SELECT * FROM tasks WHERE id IN (1, 2, 4) ORDER BY id").fetchall()
+    counts = store.status_counts()
+    assert store.archive_closed(20050, limit=2) == 2
+    assert store.archive_closed(20050, limit=2) == 1
+    assert store.archive_closed(20050) == 0
+
+    assert ids_in(store, "main") == [3, 5, 6]
+    assert ids_in(store, "archive") == [1, 2, 4]
+    assert store.conn.execute("SELECT * FROM archive.tasks ORDER BY id").fetchall() == rows
+    assert store.status_counts() == counts
+    assert_indexes(store)
+    assert found(store, "отчёт", archive=False) == [3, 5]
+    assert found(store, "отчёт", archive=True) == [2]
+    # Поиск по словоформам в архиве - по перенесённым леммам
+    assert found(store, "отчёты", archive=True, morph=True) == [2]
+    assert found(store, "цветок", archive=True, morph=True) == [1]
+    assert found(store, "цветок", archive=False, morph=True) == []
+
+
+def test_archive_search(store):
+    closed_tasks(store)
+    store.archive_closed(20050)
+    spec = filter_spec(status="Выполнена", search="хлеб", archive=True)
+    assert [row[:7] for row in store.fetch_page(spec, None)] == [
+        (4, "Купить хлеб", "", 20001, 20000, "Выполнена", None)]
+    assert store.count(spec) == 1
+    assert "cached" not in filter_spec(archive=True)
+    assert store.fetch_page(filter_spec(search="хлеб"), None) == []
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_in_transaction(store, monkeypatch, number):
+    """Сбой в транзакции номер number: её изменения откатываются, как после падения процесса"""
+    transaction = store.transaction
+    calls = []
+
+    @contextmanager
+    def crashing():
+        calls.append(None)
+        with transaction():
+            yield store
+            if len(calls) == number:
+                raise Crash
+
+    monkeypatch.setattr(store, "transaction", crashing)
+
+
+def test_archive_rerun_after_crash(store, monkeypatch):
+    closed_tasks(store)
+    rows = store.conn.execute("SELECT * FROM tasks WHERE id IN (1, 2, 4) ORDER BY id").fetchall()
+    crash_in_transaction(store, monkeypatch, 2)
+    with pytest.raises(Crash):
+        store.archive_closed(20050)
+    # Копии зафиксированы, оригиналы не удалены: задачи в обоих файлах
+    assert ids_in(store, "main") == [1, 2, 3, 4, 5, 6]
+    assert ids_in(store, "archive") == [1, 2, 4]
+
+    monkeypatch.undo()
+    assert store.archive_closed(20050) == 3
+    assert store.archive_closed(20050) == 0
+    assert ids_in(store, "main") == [3, 5, 6]
+    assert store.conn.execute("SELECT * FROM archive.tasks ORDER BY id").fetchall() == rows
+    assert_indexes(store)
+    assert found(store, "отчёт", archive=True) == [2]
+
+
+def test_archive_keeps_reopened_copy_out(store, monkeypatch):
+    closed_tasks(store)
+    crash_in_transaction(store, monkeypatch, 2)
+    with pytest.raises(Crash):
+        store.archive_closed(20050)
+    monkeypatch.undo()
+    # Между сбоем и повторным переносом задачу открыли заново: она остаётся только в tasks
+    store.update_task(1, "Полить цветы", "на балконе", "", "", "В работе", "Низкий")
+    assert store.archive_closed(20050) == 2
+    assert ids_in(store, "main") == [1, 3, 5, 6]
+    assert ids_in(store, "archive") == [2, 4]
+    assert_indexes(store)
+
+
+def test_archive_rerun_with_nothing_to_move(store, monkeypatch):
+    closed_tasks(store)
+    store.conn.execute("UPDATE tasks SET closed = 20090 WHERE id IN (2, 4)")
+    crash_in_transaction(store, monkeypatch, 2)
+    with pytest.raises(Crash):
+        store.archive_closed(20050)
+    monkeypatch.undo()
+    store.update_task(1, "Полить цветы", "на балконе", "", "", "В работе", "Низкий")
+    assert store.archive_closed(20050) == 0
+    assert ids_in(store, "archive") == []
+    assert store.status_counts()["В работе"] == 2
+
+
+def test_unarchive(store):
+    closed_tasks(store)
+    before = store.conn.execute("SELECT * FROM tasks WHERE id = 2").fetchone()
+    store.archive_closed(20050)
+    assert store.unarchive([2, 99], 20100) == 1
+    assert ids_in(store, "main") == [2, 3, 5, 6]
+    assert ids_in(store, "archive") == [1, 4]
+    # Задача возвращается с прежними полями, днём закрытия становится today
+    after = store.conn.execute("SELECT * FROM tasks WHERE id = 2").fetchone()
+    assert after == before[:-3] + (20100,) + before[-2:]
+    assert_indexes(store)
+    assert found(store, "квартальный", archive=False) == [2]
+    assert found(store, "квартальный", archive=True) == []
+    assert found(store, "отчёты", archive=False, morph=True) == [2, 3, 5]
+    # Следующий перенос её не трогает, пока не пройдёт срок от нового дня закрытия
+    assert store.archive_closed(20050) == 0
+    assert store.archive_closed(20101) == 2
+    assert ids_in(store, "archive") == [1, 2, 3, 4]
+
+
+def test_unarchive_rerun_after_crash(store, monkeypatch):
+    closed_tasks(store)
+    store.archive_closed(20050)
+    crash_in_transaction(store, monkeypatch, 2)
+    with pytest.raises(Crash):
+        store.unarchive([1, 4], 20100)
+    monkeypatch.undo()
+    assert ids_in(store, "archive") == [1, 2, 4]
+    assert store.unarchive([1, 4], 20100) == 0
+    assert ids_in(store, "main") == [1, 3, 4, 5, 6]
+    assert ids_in(store, "archive") == [2]
+    assert_indexes(store)
@@ -0,0 +1,188 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QToolTip
+from PyQt6.QtCore import Qt, QDateTime, QDate, QTime, QPointF
+from PyQt6.QtGui import QCursor
+from task_store import TaskStore
+import dates
+
+# Графики истории задач на вкладке статистики. Данные - только сводка по дням daily_stats
+# (TaskStore.daily_history): за год это не больше 366 строк при любом числе задач.
+# QtCharts, как и для круговой диаграммы, загружается при первом показе.
+
+
+def by_day(day):
+    return dates.day_to_date(day).strftime('%d.%m')
+
+
+def by_week(day):
+    """Неделя дня - по её понедельнику"""
+    return by_day(day - dates.day_to_date(day).weekday())
+
+
+def by_month(day):
+    return dates.day_to_date(day).strftime('%m.%y')
+
+
+# Периоды графиков: (название, дней, подпись столбца созданных/выполненных по дню - дни с одной подписью
+# складываются в один столбец, как столбцы разбиты)
+PERIODS = [("30 дней", 30, by_day, "по дням"), ("90 дней", 91, by_week, "по неделям"),
+           ("Год", 365, by_month, "по месяцам")]
+
+
+def buckets(history, key):
+    """Суммы созданных и выполненных по столбцам: [(подпись, создано, выполнено)]"""
+    result = []
+    for row in history:
+        label = key(row.day)
+        if result and result[-1][0] == label:
+            result[-1][1] += row.created
+            result[-1][2] += row.done
+        else:
+            result.append([label, row.created, row.done])
+    return result
+
+
+DAY_MSECS = 24 * 3600 * 1000
+
+
+def day_points(history, field):
+    """Точки линии для оси дат QtCharts: полдень каждого дня и значение поля field.
+
+    Местное время вычисляется один раз, для первого дня (QDateTime с часовым поясом дорог
+    на каждой точке), дальше - шагом в сутки: переход на летнее время сдвигает точку
+    на час, но не на другой день.
+    """
+    date = dates.day_to_date(history[0].day)
+    noon = QDateTime(QDate(date.year, date.month, date.day), QTime(12, 0)).toMSecsSinceEpoch()
+    first = history[0].day
+    return [QPointF(noon + (row.day - first) * DAY_MSECS, getattr(row, field)) for row in history]
+
+
+class TrendView(QWidget):
+    """Созданные и выполненные задачи (столбцы), открытые и просроченные на конец дня (линии)"""
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.dirty = True
+        self.charts = None
+        self.columns = []
+
+        self.period = QComboBox()
+        self.period.addItems([period[0] for period in PERIODS])
+        self.period.currentIndexChanged.connect(self.refresh)
+        self.info = QLabel()
+        top = QHBoxLayout()
+        top.addWidget(QLabel("История за"))
+        top.addWidget(self.period)
+        top.addWidget(self.info)
+        top.addStretch()
+
+        # Графики рядом: окно задач широкое и невысокое
+        self.charts_layout = QHBoxLayout()
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(top)
+        layout.addLayout(self.charts_layout)
+
+    def init_charts(self):
+        """Создание графиков; дальше у них меняются только значения"""
+        from PyQt6.QtCharts import (QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis, QLineSeries,
+                                    QValueAxis, QDateTimeAxis)
+
+        self.bars = QBarSeries()
+        self.bar_sets = [QBarSet("Создано"), QBarSet("Выполнено")]
+        for bar_set in self.bar_sets:
+            self.bars.append(bar_set)
+            bar_set.hovered.connect(self.on_bar_hovered)
+        # Подписи столбцов за год или 30 дней не помещаются под ними: даты - в подсказке и на графике рядом
+        self.bar_axis = QBarCategoryAxis()
+        self.bar_axis.setLabelsVisible(False)
+        self.bar_values = QValueAxis()
+        self.bar_values.setLabelFormat("%d")
+        self.throughput = throughput = QChart()
+        throughput.addSeries(self.bars)
+        throughput.addAxis(self.bar_axis, Qt.AlignmentFlag.AlignBottom)
+        throughput.addAxis(self.bar_values, Qt.AlignmentFlag.AlignLeft)
+        self.bars.attachAxis(self.bar_axis)
+        self.bars.attachAxis(self.bar_values)
+
+        self.open_line = QLineSeries()
+        self.open_line.setName("Открытые")
+        self.overdue_line = QLineSeries()
+        self.overdue_line.setName("Просроченные")
+        self.day_axis = QDateTimeAxis()
+        self.day_axis.setFormat("dd.MM")
+        self.line_values = QValueAxis()
+        self.line_values.setLabelFormat("%d")
+        backlog = QChart()
+        backlog.setTitle("Открытые и просроченные задачи на конец дня")
+        backlog.addAxis(self.day_axis, Qt.AlignmentFlag.AlignBottom)
+        backlog.addAxis(self.line_values, Qt.AlignmentFlag.AlignLeft)
+        for line in (self.open_line, self.overdue_line):
+            backlog.addSeries(line)
+            line.attachAxis(self.day_axis)
+            line.attachAxis(self.line_values)
+
+        self.charts = []
+        for chart in (throughput, backlog):
+            chart.legend().setAlignment(Qt.AlignmentFlag.AlignBottom)
+            view = QChartView(chart)
+            self.charts_layout.addWidget(view, 1)
+            self.charts.append(view)
+
+    def refresh(self):
+        """Запрос истории за выбранный период; на скрытой вкладке - при следующем показе"""
+        if not self.isVisible():
+            self.dirty = True
+            return
+        self.dirty = False
+        days = PERIODS[self.period.currentIndex()][1]
+        today = dates.today_day()
+        self.db.submit(TaskStore.daily_history, today - days + 1, today, callback=self.show_history,
+                       channel='trends')
+
+    def show_history(self, history):
+        if self.charts is None:
+            self.init_charts()
+        if not history:
+            self.info.setText("(история пока не накоплена)")
+            return
+        self.info.setText(f"с {dates.format_day(history[0].day)}" if len(history) > 1 else "")
+        _name, _days, key, unit = PERIODS[self.period.currentIndex()]
+        self.throughput.setTitle(f"Создано и выполнено задач {unit}")
+
+        # Столбцы: значения наборов заменяются целиком, двумя вызовами на набор
+        self.columns = columns = buckets(history, key)
+        for index, bar_set in enumerate(self.bar_sets, 1):
+            bar_set.remove(0, bar_set.count())
+            bar_set.append([float(column[index]) for column in columns])
+        self.bar_axis.clear()
+        self.bar_axis.append([column[0] for column in columns])
+        self.bar_values.setRange(0, max([max(column[1], column[2]) for column in columns] + [1]))
+        self.bar_values.applyNiceNumbers()
+
+        # Линии: replace заменяет все точки одним вызовом, без перерисовки на каждую
+        points = day_points(history, 'open')
+        self.open_line.replace(points)
+        self.overdue_line.replace(day_points(history, 'overdue'))
+        first = points[0].x()
+        self.day_axis.setRange(QDateTime.fromMSecsSinceEpoch(int(first)),
+                               QDateTime.fromMSecsSinceEpoch(int(max(points[-1].x(), first + DAY_MSECS))))
+        self.line_values.setRange(0, max([row.open for row in history] + [1]))
+        self.line_values.applyNiceNumbers()
+
+    def on_bar_hovered(self, status, index):
+        if status and index < len(self.columns):
+            label, created, done = self.columns[index]
+            QToolTip.showText(QCursor.pos(), f"{label}: создано {created}, выполнено {done}")
+        else:
+            QToolTip.hideText()
+
+    def invalidate(self):
+        """Задачи изменились: история перечитывается (сразу, если вкладка видна)"""
+        self.refresh()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.dirty:
+            self.refresh()